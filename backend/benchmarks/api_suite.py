@@ -0,0 +1,309 @@
+"""
+End-to-end latency of the ``/api/operations/`` endpoints as the data grows.
+
+For each of ``--sizes`` (service vouchers; default 1k, 100k and 1M) seeds a
+database of its own (``benchmarks/api_suite-<size>.sqlite3``, reused once
+seeded) with that many service vouchers, each with two room types and
+``--days`` itinerary days of two activities, as many hotel vouchers, and
+the search index and occupancy table built from them. Then it sends
+``--requests`` requests to each endpoint through Django's test client, so
+through the whole middleware stack with a real JWT:
+
+* ``service-voucher-list``, ``hotel-voucher-list``, ``itinerary-list``: a
+  random page among the first 50.
+* ``service-voucher-detail``: a different random service voucher every
+  time, so never from the detail cache.
+* ``service-voucher-create``: POST of a voucher with rooms and two days of
+  activities. The vouchers created are deleted afterwards.
+* ``service-voucher-update``: PATCH of a random voucher's full detail with
+  one room quantity and one activity time changed.
+* ``itinerary-detail``: a random itinerary day with its activities.
+
+Every endpoint reports p50/p95/p99 and mean latency (ms), the queries per
+request and its status codes. A second, shorter pass under ``tracemalloc``
+gives the peak memory allocated by one request. Each size runs in a fresh
+process (seeding in another one), so ``max_rss_kb`` is the measuring
+process's own peak, SQLite's memory-mapped pages included.
+
+Results go to ``--output`` as JSON, with the commit measured. Pass an
+earlier result as ``--compare`` to print the p50, p99 and query changes
+per endpoint:
+
+    python -m benchmarks.api_suite [--sizes 1000,100000,1000000] [--requests 200] [--output path]
+                                   [--compare earlier.json]
+"""
+import argparse
+import json
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from .common import BACKEND_DIR, analyze, seed_hotel_vouchers, seed_service_vouchers, seed_voucher_details, setup
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+PAGES = 50
+MEMORY_REQUESTS = 20
+WARMUP = 10
+
+
+def database(size):
+    return str(BENCHMARKS_DIR / f'api_suite-{size}.sqlite3')
+
+
+def seed(size, days, rng_seed):
+    """Seed (or top up) the ``size`` database; returns the seconds it took."""
+    setup('api_suite', database(size))
+    from django.db import transaction
+    from operations import occupancy, search
+
+    started = time.perf_counter()
+    if seed_service_vouchers(size, rng_seed):
+        seed_voucher_details(rng_seed, days=days)
+        seed_hotel_vouchers(size, rng_seed)
+        with transaction.atomic():
+            search.rebuild()
+            occupancy.rebuild()
+        analyze()
+    return time.perf_counter() - started
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Endpoint:
+    """
+    ``prepare(rng, client)`` runs untimed before each request and returns
+    the arguments of ``send(client, *arguments)``, the timed part.
+    """
+
+    def __init__(self, name, prepare, send):
+        self.name = name
+        self.prepare = prepare
+        self.send = send
+
+
+def endpoints(size, requests, run, rng_seed):
+    from django.urls import reverse
+    from operations.models import Itinerary
+
+    days = Itinerary.objects.order_by('-id').values_list('id', flat=True).first() or 1
+    # Detail and update each take a voucher per request, never the same one twice.
+    voucher_ids = iter(random.Random(rng_seed).sample(
+        range(1, size + 1), min(size, 2 * (WARMUP + requests + MEMORY_REQUESTS))))
+    created = iter(range(10 ** 9))
+
+    def page(name):
+        return Endpoint(
+            f'{name}-list',
+            lambda rng, client: [reverse(f'{name}-list'), {'page': rng.randint(1, PAGES)}],
+            lambda client, url, params: client.get(url, params, secure=True),
+        )
+
+    def create_payload(rng, client):
+        start = date(2026, 1, 1) + timedelta(days=rng.randrange(365))
+        number = next(created)
+        return [reverse('service-voucher-list'), {
+            'traveler': {'name': f'Suite Guest {number}', 'num_adults': 2, 'num_infants': 0},
+            'reservation_number': f'SUITE-{run}-{number:06d}',
+            'hotel_confirmation_number': f'SUITE-{number:06d}',
+            'travel_start_date': start.isoformat(),
+            'travel_end_date': (start + timedelta(days=2)).isoformat(),
+            'hotel_name': f'Hotel {rng.randrange(200):03d}',
+            'transfer_type': 'PRIVATE',
+            'meal_plan': 'HB',
+            'room_allocations': [{'room_type': 'DBL', 'quantity': 2}, {'room_type': 'SGL', 'quantity': 1}],
+            'itinerary_items': [
+                {'day': day, 'date': (start + timedelta(days=day - 1)).isoformat(), 'activities': [
+                    {'time': f'{9 + 3 * hour:02d}:00', 'activity_type': 'TOUR', 'description': f'Stop {hour}'}
+                    for hour in range(2)
+                ]}
+                for day in (1, 2)
+            ],
+        }]
+
+    def update_payload(rng, client):
+        url = reverse('service-voucher-detail', args=[next(voucher_ids)])
+        payload = client.get(url, secure=True).json()
+        payload['room_allocations'][0]['quantity'] = payload['room_allocations'][0]['quantity'] % 3 + 1
+        activity = rng.choice([activity for day in payload['itinerary_items'] for activity in day['activities']])
+        activity['time'] = f'{rng.randint(6, 21):02d}:{rng.choice((0, 15, 30, 45)):02d}:00'
+        return [url, payload]
+
+    return [
+        page('service-voucher'),
+        Endpoint(
+            'service-voucher-detail',
+            lambda rng, client: [reverse('service-voucher-detail', args=[next(voucher_ids)])],
+            lambda client, url: client.get(url, secure=True),
+        ),
+        Endpoint(
+            'service-voucher-create', create_payload,
+            lambda client, url, payload: client.post(url, payload, content_type='application/json', secure=True),
+        ),
+        Endpoint(
+            'service-voucher-update', update_payload,
+            lambda client, url, payload: client.patch(url, payload, content_type='application/json', secure=True),
+        ),
+        page('hotel-voucher'),
+        page('itinerary'),
+        Endpoint(
+            'itinerary-detail',
+            lambda rng, client: [reverse('itinerary-detail', args=[rng.randint(1, days)])],
+            lambda client, url: client.get(url, secure=True),
+        ),
+    ]
+
+
+def measure(size, requests, rng_seed):
+    """Run every endpoint against the seeded ``size`` database; returns its results."""
+    setup('api_suite', database(size))
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from operations.models import ServiceVoucher, Traveler
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    user = get_user_model().objects.get_or_create(username='benchmark', defaults={'role': 'STAFF'})[0]
+    client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    run = int(time.time())
+    results = {}
+    for endpoint in endpoints(size, requests, run, rng_seed):
+        rng = random.Random(f'{rng_seed}:{endpoint.name}')
+        cache.clear()
+
+        def call():
+            arguments = endpoint.prepare(rng, client)
+            # The log holds 9000 queries; once full, CaptureQueriesContext counts none.
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = endpoint.send(client, *arguments)
+                elapsed = (time.perf_counter() - started) * 1000
+            return elapsed, len(queries), response.status_code
+
+        for _ in range(WARMUP):
+            call()
+        latencies, query_counts, statuses = [], [], {}
+        for _ in range(requests):
+            elapsed, queries, status = call()
+            latencies.append(elapsed)
+            query_counts.append(queries)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+        peak = 0
+        tracemalloc.start()
+        for _ in range(MEMORY_REQUESTS):
+            tracemalloc.reset_peak()
+            call()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        latencies.sort()
+        results[endpoint.name] = {
+            'requests': requests,
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'mean_ms': round(statistics.fmean(latencies), 2),
+            'queries': {'min': min(query_counts), 'max': max(query_counts),
+                        'mean': round(statistics.fmean(query_counts), 2)},
+            'peak_alloc_kb': round(peak / 1024),
+            'status': statuses,
+        }
+        print(f'{size:>9} {endpoint.name:<24} {results[endpoint.name]["p50_ms"]:>8.1f} '
+              f'{results[endpoint.name]["p95_ms"]:>8.1f} {results[endpoint.name]["p99_ms"]:>8.1f} '
+              f'{results[endpoint.name]["queries"]["mean"]:>8.1f} {round(peak / 1024):>9}', file=sys.stderr)
+
+    Traveler.objects.filter(bookings__reservation_number__startswith=f'SUITE-{run}-').delete()
+    return {
+        'service_vouchers': ServiceVoucher.objects.count(),
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'endpoints': results,
+    }
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current, earlier):
+    print(f'\n{"size":>9} {"endpoint":<24} {"p50":>16} {"p99":>16} {"queries":>12}')
+    for size, result in current['sizes'].items():
+        before = earlier['sizes'].get(size, {}).get('endpoints', {})
+        for name, now in result['endpoints'].items():
+            if name not in before:
+                continue
+            then = before[name]
+            print(f'{size:>9} {name:<24} '
+                  f'{then["p50_ms"]:>7.1f}->{now["p50_ms"]:<7.1f} {then["p99_ms"]:>7.1f}->{now["p99_ms"]:<7.1f} '
+                  f'{then["queries"]["mean"]:>5g}->{now["queries"]["mean"]:<5g}')
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    argument_parser.add_argument('--seed', type=int, default=1)
+    argument_parser.add_argument('--sizes', default='1000,100000,1000000',
+                                 type=lambda value: [int(size) for size in value.split(',')])
+    argument_parser.add_argument('--requests', type=int, default=200)
+    argument_parser.add_argument('--days', type=int, default=3)
+    argument_parser.add_argument('--output', help='JSON file to write (default: benchmarks/api_suite-<commit>.json)')
+    argument_parser.add_argument('--compare', help='Earlier JSON result to compare with')
+    # Internal: one size, one phase, in a process of its own.
+    argument_parser.add_argument('--phase', choices=['seed', 'measure'], help=argparse.SUPPRESS)
+    argument_parser.add_argument('--rows', type=int, help=argparse.SUPPRESS)
+    args = argument_parser.parse_args()
+
+    if args.phase == 'seed':
+        print(json.dumps({'seconds': seed(args.rows, args.days, args.seed)}))
+        return
+    if args.phase == 'measure':
+        print(json.dumps(measure(args.rows, args.requests, args.seed)))
+        return
+
+    revision = commit()
+    report = {
+        'commit': revision,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'requests': args.requests,
+        'sizes': {},
+    }
+    print(f'{"size":>9} {"endpoint":<24} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>8} {"peak KiB":>9}',
+          file=sys.stderr)
+    for size in args.sizes:
+        def phase(name):
+            completed = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.api_suite', '--phase', name, '--rows', str(size),
+                 '--requests', str(args.requests), '--days', str(args.days), '--seed', str(args.seed)],
+                cwd=BACKEND_DIR, stdout=subprocess.PIPE, text=True, check=True,
+            )
+            return json.loads(completed.stdout.strip().splitlines()[-1])
+
+        seeded = phase('seed')
+        report['sizes'][str(size)] = {'seed_seconds': round(seeded['seconds'], 1), **phase('measure')}
+
+    output = Path(args.output or BENCHMARKS_DIR / f'api_suite-{revision}.json')
+    output.write_text(json.dumps(report, indent=2) + '\n')
+    print(f'\nwrote {output}', file=sys.stderr)
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Read throughput under concurrency: sync views under WSGI vs async views under ASGI.
+
+Seeds ``--rows`` service vouchers (with rooms and itinerary days) and hotel
+vouchers, then has ``--concurrency`` clients send ``--requests`` requests
+in total, each client sending its next request as soon as the previous
+one is answered. A request is a voucher list page, a voucher detail, a
+hotel-voucher list page or an itinerary list page. All of them carry a
+real JWT and go through the full middleware stack, in process.
+
+* ``wsgi``: ``core.wsgi`` with ``--workers`` requests served at a time,
+  like a WSGI server with that many workers. Clients beyond that wait for
+  a free worker, and the wait counts towards their latency. Serves the
+  sync endpoints with persistent connections.
+* ``asgi``: ``core.asgi`` on one event loop, serving every client at once.
+  Serves the ``/api/async/operations/`` endpoints with ``CONN_MAX_AGE=0``
+  (see ``core.asgi``).
+
+``--db-latency`` adds a delay (ms) to every query, for the network round
+trip to a database server that a local SQLite file does not have.
+
+    python -m benchmarks.async_concurrency [--rows 20000] [--requests 2000] [--concurrency 64] [--workers 4]
+                                           [--db-latency 2]
+"""
+import asyncio
+import io
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from .common import analyze, parser, seed_hotel_vouchers, seed_service_vouchers, seed_voucher_details, setup
+
+HOST = 'localhost'
+
+
+def request_mix(count, rows, seed):
+    """``count`` (path, query string) pairs relative to the API root, in a fixed random mix."""
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        kind = rng.randrange(4)
+        if kind == 0:
+            paths.append(('service-vouchers/', urlencode({'page': rng.randint(1, 50)})))
+        elif kind == 1:
+            paths.append((f'service-vouchers/{rng.randint(1, rows)}/', ''))
+        elif kind == 2:
+            paths.append(('hotel-vouchers/', urlencode({'page': rng.randint(1, 50)})))
+        else:
+            paths.append(('itinerary/', urlencode({'page': rng.randint(1, 50)})))
+    return paths
+
+
+def run_wsgi(paths, token, workers, concurrency):
+    """Returns (elapsed seconds, [(latency ms, status)])."""
+    from core.wsgi import application
+
+    def call(path, query):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': f'/api/operations/{path}', 'QUERY_STRING': query,
+            'SERVER_NAME': HOST, 'SERVER_PORT': '443', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': HOST,
+            'HTTP_AUTHORIZATION': f'Bearer {token}', 'wsgi.url_scheme': 'https', 'wsgi.input': io.BytesIO(),
+            'wsgi.errors': sys.stderr, 'wsgi.version': (1, 0), 'wsgi.multithread': True,
+            'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        status = []
+        response = application(environ, lambda code, headers: status.append(int(code.split()[0])))
+        b''.join(response)
+        response.close()
+        return status[0]
+
+    pending = list(reversed(paths))
+    lock = threading.Lock()
+    results = []
+
+    def client(workers):
+        while True:
+            with lock:
+                if not pending:
+                    return
+                path, query = pending.pop()
+            started = time.perf_counter()
+            # The pool queues requests first come, first served, like a server's listen queue.
+            code = workers.submit(call, path, query).result()
+            with lock:
+                results.append(((time.perf_counter() - started) * 1000, code))
+
+    with ThreadPoolExecutor(workers) as pool:
+        clients = [threading.Thread(target=client, args=(pool,)) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        return time.perf_counter() - started, results
+
+
+def run_asgi(paths, token, concurrency):
+    """Returns (elapsed seconds, [(latency ms, status)])."""
+    from core.asgi import application
+
+    pending = list(reversed(paths))
+    results = []
+
+    async def call(path, query):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'https', 'path': f'/api/async/operations/{path}', 'raw_path': b'',
+            'query_string': query.encode(), 'root_path': '', 'server': (HOST, 443), 'client': ('127.0.0.1', 50000),
+            'headers': [(b'host', HOST.encode()), (b'authorization', f'Bearer {token}'.encode())],
+        }
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        status = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.Event().wait()  # the client never disconnects
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await application(scope, receive, send)
+        return status[0]
+
+    async def client():
+        while pending:
+            path, query = pending.pop()
+            started = time.perf_counter()
+            code = await call(path, query)
+            results.append(((time.perf_counter() - started) * 1000, code))
+
+    async def main():
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return time.perf_counter() - started, results
+
+
+def report(name, elapsed, results):
+    latencies = sorted(latency for latency, _ in results)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    errors = sum(1 for _, code in results if code != 200)
+    print(f'{name:<6} {len(results) / elapsed:>8.0f} {statistics.median(latencies):>8.1f} {p99:>8.1f} {errors:>7}')
+
+
+def main():
+    argument_parser = parser(__doc__.strip().splitlines()[0], 20_000)
+    argument_parser.add_argument('--requests', type=int, default=2000)
+    argument_parser.add_argument('--concurrency', type=int, default=64)
+    argument_parser.add_argument('--workers', type=int, default=4)
+    argument_parser.add_argument('--db-latency', type=float, default=2.0)
+    args = argument_parser.parse_args()
+    setup('async_concurrency', args.database)
+
+    from django.contrib.auth import get_user_model
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    started = time.perf_counter()
+    seed_service_vouchers(args.rows, args.seed)
+    seed_voucher_details(args.seed, days=2)
+    seed_hotel_vouchers(args.rows, args.seed)
+    analyze()
+    print(f'seeded in {time.perf_counter() - started:.1f}s')
+
+    user = get_user_model().objects.get_or_create(username='benchmark', defaults={'role': 'STAFF'})[0]
+    token = str(AccessToken.for_user(user))
+    connections.close_all()
+
+    def round_trip(execute, sql, params, many, context):
+        time.sleep(args.db_latency / 1000)
+        return execute(sql, params, many, context)
+
+    def add_latency(sender, connection, **kwargs):
+        connection.execute_wrappers.append(round_trip)
+
+    if args.db_latency:
+        connection_created.connect(add_latency)
+
+    paths = request_mix(args.requests, args.rows, args.seed)
+    print(f'\n{args.requests} requests from {args.concurrency} clients, {args.workers} WSGI workers, '
+          f'{args.db_latency:g} ms per query\n')
+    print(f'{"server":<6} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"errors":>7}')
+    run_wsgi(paths[:50], token, args.workers, args.workers)  # warm up
+    report('wsgi', *run_wsgi(paths, token, args.workers, args.concurrency))
+
+    connections.settings['default']['CONN_MAX_AGE'] = 0
+    run_asgi(paths[:50], token, args.workers)
+    report('asgi', *run_asgi(paths, token, args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Cost of JWT authentication per request, with and without the user cache.
+
+Creates ``--rows`` users (the benchmark one among them), then measures
+``users.authentication.JWTAuthentication.authenticate`` on its own, over
+``--requests`` calls, and a dashboard page load: ``--requests`` rounds of
+dashboard stats, service voucher list and hotel voucher list calls
+through the full middleware stack. Each is measured with the cache off
+(``AUTH_USER_CACHE_TTL=0``, one users lookup per call, as with plain
+simplejwt) and on.
+
+    python -m benchmarks.auth_overhead [--rows 10000] [--requests 2000]
+"""
+import statistics
+import time
+
+from .common import _insert, analyze, parser, seed_hotel_vouchers, seed_service_vouchers, setup
+
+
+def main():
+    argument_parser = parser(__doc__.strip().splitlines()[0], 10_000)
+    argument_parser.add_argument('--requests', type=int, default=2000)
+    args = argument_parser.parse_args()
+    setup('auth_overhead', args.database)
+
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.core.cache import cache
+    from django.db import connection, transaction
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.request import Request
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from users.authentication import JWTAuthentication
+
+    User = get_user_model()
+    existing = User.objects.count()
+    if existing < args.rows:
+        with transaction.atomic(), connection.cursor() as cursor:
+            _insert(cursor, User._meta.db_table, [
+                'username', 'password', 'is_superuser', 'first_name', 'last_name', 'email', 'is_staff',
+                'is_active', 'date_joined', 'role', 'department', 'phone',
+            ], [
+                (f'user{number}', '!', False, '', '', '', False, True, '2025-01-01 00:00:00', 'STAFF', 'Ops', '')
+                for number in range(existing, args.rows)
+            ])
+    seed_service_vouchers(1000, args.seed)
+    seed_hotel_vouchers(1000, args.seed)
+    analyze()
+
+    user = User.objects.get_or_create(username='benchmark', defaults={'role': 'STAFF', 'department': 'Ops'})[0]
+    token = f'Bearer {AccessToken.for_user(user)}'
+    request = APIRequestFactory().get('/api/operations/service-vouchers/', HTTP_AUTHORIZATION=token)
+    authenticator = JWTAuthentication()
+    client = Client(HTTP_AUTHORIZATION=token)
+    page = [reverse('dashboard-stats-list'), reverse('service-voucher-list'), reverse('hotel-voucher-list')]
+
+    def authenticate():
+        return authenticator.authenticate(Request(request))
+
+    def page_load():
+        for url in page:
+            client.get(url, secure=True)
+
+    print(f'{"":<20} {"cache":<6} {"us/call":>9} {"p50 ms":>8} {"queries":>8}')
+    for name, call in (('authenticate', authenticate), ('dashboard page', page_load)):
+        for ttl in (0, 30):
+            settings.AUTH_USER_CACHE_TTL = ttl
+            cache.clear()
+            call()
+            latencies = []
+            # Only to turn query logging on; the log is read after each call.
+            with CaptureQueriesContext(connection):
+                for _ in range(args.requests):
+                    connection.queries_log.clear()
+                    started = time.perf_counter()
+                    call()
+                    latencies.append(time.perf_counter() - started)
+                    queries = len(connection.queries_log)
+            print(f'{name:<20} {"on" if ttl else "off":<6} {statistics.fmean(latencies) * 1e6:>9.0f} '
+                  f'{statistics.median(latencies) * 1000:>8.2f} {queries:>8}')
+
+
+if __name__ == '__main__':
+    main()
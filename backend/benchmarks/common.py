@@ -0,0 +1,165 @@
+"""
+Shared setup for the scripts in this package.
+
+Benchmarks run against their own SQLite file (``benchmarks/<name>.sqlite3``
+unless ``--database`` says otherwise), never the development database, and
+seed it with raw ``executemany`` batches so a million rows take seconds
+rather than the minutes the ORM would need.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+HOTELS = [f'Hotel {number:03d}' for number in range(200)]
+TRANSFER_TYPES = ['PRIVATE', 'SHARED', 'GROUP']
+MEAL_PLANS = ['BB', 'HB', 'FB', 'AI']
+FIRST_DATE = date(2024, 1, 1)
+DATE_SPAN = 3 * 365
+
+
+def parser(description, default_rows):
+    argument_parser = argparse.ArgumentParser(description=description)
+    argument_parser.add_argument('--rows', type=int, default=default_rows)
+    argument_parser.add_argument('--database', help='SQLite file to use (reused if already seeded)')
+    argument_parser.add_argument('--seed', type=int, default=1)
+    return argument_parser
+
+
+def setup(name, database=None):
+    """Configure Django against a benchmark database and migrate it."""
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    os.environ.setdefault('CORS_ALLOWED_ORIGINS', 'http://localhost')
+    os.environ.setdefault('ALLOWED_HOSTS', 'testserver,localhost')
+
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = database or str(Path(__file__).resolve().parent / f'{name}.sqlite3')
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def timed(function, *args, repeat=5):
+    """Best wall-clock time of ``repeat`` calls, in milliseconds, and the last result."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _insert(cursor, table, columns, rows, batch_size=50000):
+    sql = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))})'
+    for offset in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[offset:offset + batch_size])
+
+
+def seed_service_vouchers(count, seed=1):
+    """Add ``count`` travelers and service vouchers (no nested rows) unless already present."""
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from operations.models import ServiceVoucher, Traveler
+
+    existing = ServiceVoucher.objects.count()
+    if existing >= count:
+        return 0
+    rng = random.Random(seed)
+    now = timezone.now()
+    start_id = (Traveler.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+    travelers = []
+    vouchers = []
+    for offset in range(count - existing):
+        pk = start_id + offset
+        start = FIRST_DATE + timedelta(days=rng.randrange(DATE_SPAN))
+        travelers.append((pk, f'Guest {pk}', rng.randint(1, 4), rng.choice((0, 0, 0, 1))))
+        vouchers.append((
+            pk, pk, f'BENCH-{pk:08d}', f'CONF-{pk:08d}', start, start + timedelta(days=rng.randint(1, 14)),
+            rng.choice(HOTELS), rng.choice(TRANSFER_TYPES), rng.choice(MEAL_PLANS), '', '', '', '', 1, now,
+        ))
+    table = ServiceVoucher._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        _insert(cursor, Traveler._meta.db_table, ['id', 'name', 'num_adults', 'num_infants'], travelers)
+        _insert(cursor, table, [
+            'id', 'traveler_id', 'reservation_number', 'hotel_confirmation_number', 'travel_start_date',
+            'travel_end_date', 'hotel_name', 'transfer_type', 'meal_plan', 'inclusions', 'arrival_details',
+            'departure_details', 'meeting_point', 'version', 'updated_at',
+        ], vouchers)
+    return len(vouchers)
+
+
+def seed_hotel_vouchers(count, seed=1):
+    """Add ``count`` hotel vouchers unless already present."""
+    from django.db import connection, transaction
+    from operations.models import HotelVoucher
+
+    existing = HotelVoucher.objects.count()
+    if existing >= count:
+        return 0
+    rng = random.Random(seed)
+    start_id = (HotelVoucher.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+    rows = []
+    for offset in range(count - existing):
+        pk = start_id + offset
+        check_in = FIRST_DATE + timedelta(days=rng.randrange(DATE_SPAN))
+        nights = rng.randint(1, 14)
+        rows.append((
+            pk, f'Guest {pk}', rng.choice(HOTELS), '', check_in, check_in + timedelta(days=nights),
+            rng.randint(1, 3), nights, f'HCONF-{pk:08d}',
+        ))
+    with transaction.atomic(), connection.cursor() as cursor:
+        _insert(cursor, HotelVoucher._meta.db_table, [
+            'id', 'guest_name', 'hotel_name', 'hotel_address', 'check_in_date', 'check_out_date',
+            'number_of_rooms', 'number_of_nights', 'confirmation_number',
+        ], rows)
+    return len(rows)
+
+
+def seed_voucher_details(seed=1, rooms=2, days=3, activities_per_day=2):
+    """Give every service voucher without rooms ``rooms`` room types and ``days`` itinerary days."""
+    from django.db import connection, transaction
+    from operations.models import Itinerary, ItineraryActivity, RoomAllocation, ServiceVoucher
+
+    vouchers = list(
+        ServiceVoucher.objects.filter(room_allocations__isnull=True).values_list('id', 'travel_start_date')
+    )
+    if not vouchers:
+        return 0
+    rng = random.Random(seed)
+    room_types = [code for code, _ in RoomAllocation.ROOM_TYPES]
+    activity_types = [code for code, _ in ItineraryActivity.ACTIVITY_TYPES]
+    day_id = (Itinerary.objects.order_by('-id').values_list('id', flat=True).first() or 0)
+    allocations, itineraries, activities = [], [], []
+    for pk, start in vouchers:
+        for room_type in rng.sample(room_types, rooms):
+            allocations.append((pk, room_type, rng.randint(1, 3)))
+        for day in range(1, days + 1):
+            day_id += 1
+            itineraries.append((day_id, pk, day, start + timedelta(days=day - 1)))
+            for hour in range(activities_per_day):
+                activities.append((
+                    day_id, f'{9 + 3 * hour:02d}:00:00', rng.choice(activity_types), f'Activity {hour + 1}', '', '',
+                ))
+    with transaction.atomic(), connection.cursor() as cursor:
+        _insert(cursor, RoomAllocation._meta.db_table, ['service_voucher_id', 'room_type', 'quantity'], allocations)
+        _insert(cursor, Itinerary._meta.db_table, ['id', 'service_voucher_id', 'day', 'date'], itineraries)
+        _insert(cursor, ItineraryActivity._meta.db_table, [
+            'itinerary_id', 'time', 'activity_type', 'description', 'location', 'notes',
+        ], activities)
+    return len(vouchers)
+
+
+def analyze():
+    from django.db import connection
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
@@ -0,0 +1,83 @@
+"""
+Query plans and timings for the filtered voucher list endpoints.
+
+Seeds ``--rows`` service vouchers and hotel vouchers (1M by default), runs
+``ANALYZE``, then requests each filtered list through the real viewsets and
+prints every SQL statement it issued with its ``EXPLAIN QUERY PLAN`` and the
+best of five response times. A plan line reading ``SCAN <table>`` without
+``USING ... INDEX`` means the filter fell back to a full table scan.
+
+    python -m benchmarks.filter_query_plans [--rows 1000000] [--database path]
+"""
+import json
+import time
+
+from .common import analyze, parser, seed_hotel_vouchers, seed_service_vouchers, setup, timed
+
+CASES = [
+    ('service-voucher', {'travel_start_date_after': '2025-03-01', 'travel_start_date_before': '2025-03-07'}),
+    ('service-voucher', {'travel_end_date_after': '2025-03-01', 'travel_end_date_before': '2025-03-02'}),
+    ('service-voucher', {'hotel_name': 'Hotel 042', 'travel_start_date_after': '2025-03-01',
+                         'travel_start_date_before': '2025-03-31'}),
+    ('service-voucher', {'transfer_type': 'PRIVATE', 'travel_start_date_after': '2025-03-01',
+                         'travel_start_date_before': '2025-03-07', 'ordering': 'travel_start_date'}),
+    ('service-voucher', {'meal_plan': 'AI,FB', 'travel_start_date_after': '2025-03-01',
+                         'travel_start_date_before': '2025-03-07'}),
+    ('service-voucher', {'hotel_name': 'Hotel 042', 'pagination': 'cursor'}),
+    ('hotel-voucher', {'check_in_date_after': '2025-03-01', 'check_in_date_before': '2025-03-07'}),
+    ('hotel-voucher', {'check_out_date_after': '2025-03-01', 'check_out_date_before': '2025-03-02',
+                       'ordering': '-check_out_date'}),
+    ('hotel-voucher', {'hotel_name': 'Hotel 042', 'check_in_date_after': '2025-01-01'}),
+]
+
+
+def main():
+    args = parser(__doc__.strip().splitlines()[0], 1_000_000).parse_args()
+    setup('filter_query_plans', args.database)
+
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from operations.views import HotelVoucherViewSet, ServiceVoucherViewSet
+
+    started = time.perf_counter()
+    added = seed_service_vouchers(args.rows, args.seed) + seed_hotel_vouchers(args.rows, args.seed)
+    analyze()
+    print(f'seeded {added} rows, analyzed in {time.perf_counter() - started:.1f}s')
+
+    user = get_user_model().objects.get_or_create(username='benchmark')[0]
+    factory = APIRequestFactory()
+    views = {
+        'service-voucher': ServiceVoucherViewSet.as_view({'get': 'list'}),
+        'hotel-voucher': HotelVoucherViewSet.as_view({'get': 'list'}),
+    }
+
+    def fetch(name, params):
+        request = factory.get(f'/api/{name}s/', params, secure=True)
+        force_authenticate(request, user)
+        response = views[name](request)
+        response.render()
+        return response
+
+    for name, params in CASES:
+        with CaptureQueriesContext(connection) as queries:
+            response = fetch(name, params)
+        assert response.status_code == 200, response.content
+        best, _ = timed(fetch, name, params)
+        statements = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                cursor.execute(f'EXPLAIN QUERY PLAN {query["sql"]}')
+                statements.append({'sql': query['sql'], 'plan': [row[-1] for row in cursor.fetchall()]})
+
+        print(f'\n{name} {json.dumps(params)}: {best:.1f} ms, {len(statements)} queries')
+        for statement in statements:
+            print(f'  {statement["sql"][:160]}')
+            for line in statement['plan']:
+                print(f'    {line}')
+
+
+if __name__ == '__main__':
+    main()
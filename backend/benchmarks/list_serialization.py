@@ -0,0 +1,83 @@
+"""
+Rows per second through the service voucher list: serializers vs readers.
+
+Seeds ``--rows`` service vouchers with rooms, itinerary days and activities,
+then builds and renders ``--page`` vouchers at a time (best of five) two
+ways: ``ServiceVoucherSerializer`` over ``for_api()`` rendered with DRF's
+``JSONRenderer``, and ``ServiceVoucherReader`` rendered with
+``FastJSONRenderer``. Both bodies are compared byte for byte. The same
+comparison is then made through the real ``ServiceVoucherViewSet.list``.
+
+    python -m benchmarks.list_serialization [--rows 20000] [--page 100] [--database path]
+"""
+import time
+from unittest import mock
+
+from .common import analyze, parser, seed_service_vouchers, seed_voucher_details, setup, timed
+
+
+def main():
+    argument_parser = parser(__doc__.strip().splitlines()[0], 20_000)
+    argument_parser.add_argument('--page', type=int, default=100)
+    args = argument_parser.parse_args()
+    setup('list_serialization', args.database)
+
+    from django.contrib.auth import get_user_model
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from operations.models import ServiceVoucher
+    from operations.readers import ServiceVoucherReader
+    from operations.renderers import FastJSONRenderer
+    from operations.serializers import ServiceVoucherSerializer
+    from operations.views import ServiceVoucherViewSet
+
+    started = time.perf_counter()
+    seed_service_vouchers(args.rows, args.seed)
+    seed_voucher_details(args.seed)
+    analyze()
+    print(f'seeded in {time.perf_counter() - started:.1f}s')
+
+    queryset = ServiceVoucher.objects.order_by('-id')
+    reader = ServiceVoucherReader()
+
+    def serializer(offset):
+        page = queryset.for_api()[offset:offset + args.page]
+        return JSONRenderer().render(ServiceVoucherSerializer(page, many=True).data)
+
+    def fast(offset):
+        return FastJSONRenderer().render(reader.read(reader.rows(queryset)[offset:offset + args.page]))
+
+    user = get_user_model().objects.get_or_create(username='benchmark')[0]
+    factory = APIRequestFactory()
+    view = ServiceVoucherViewSet.as_view({'get': 'list'})
+
+    def endpoint(_offset):
+        request = factory.get('/api/operations/service-vouchers/', {
+            'pagination': 'cursor', 'page_size': args.page,
+        }, secure=True)
+        force_authenticate(request, user)
+        response = view(request)
+        assert response.status_code == 200, response.data
+        return response.render().content
+
+    def endpoint_serializer(_offset):
+        with mock.patch.object(ServiceVoucherViewSet, 'reader', None), \
+                mock.patch('operations.views.ServiceVoucherViewSet.renderer_classes', [JSONRenderer]):
+            return endpoint(_offset)
+
+    offset = args.rows // 2
+    print(f'\n{"path":<28} {"ms/page":>9} {"rows/s":>10}')
+    results = {}
+    for name, function in [('serializer + JSONRenderer', serializer), ('reader + FastJSONRenderer', fast),
+                           ('endpoint (serializer)', endpoint_serializer), ('endpoint (reader)', endpoint)]:
+        best, body = timed(function, offset)
+        results[name] = body
+        print(f'{name:<28} {best:>9.2f} {args.page / best * 1000:>10.0f}')
+    assert results['serializer + JSONRenderer'] == results['reader + FastJSONRenderer']
+    assert results['endpoint (serializer)'] == results['endpoint (reader)']
+    print('\nbodies identical')
+
+
+if __name__ == '__main__':
+    main()
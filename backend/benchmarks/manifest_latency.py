@@ -0,0 +1,62 @@
+"""
+Daily manifest latency over a seeded itinerary table.
+
+Seeds ``--rows`` service vouchers with three itinerary days of two
+activities each, prints the query plan of the manifest query, then times
+``ManifestViewSet.list`` (rendered) for the busiest dates (best of five).
+
+    python -m benchmarks.manifest_latency [--rows 300000] [--database path]
+"""
+import time
+
+from .common import analyze, parser, seed_service_vouchers, seed_voucher_details, setup, timed
+
+
+def main():
+    args = parser(__doc__.strip().splitlines()[0], 300_000).parse_args()
+    setup('manifest_latency', args.database)
+
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.db.models import Count
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from operations import manifest
+    from operations.models import ItineraryActivity
+    from operations.views import ManifestViewSet
+
+    started = time.perf_counter()
+    seed_service_vouchers(args.rows, args.seed)
+    seed_voucher_details(args.seed)
+    analyze()
+    print(f'seeded in {time.perf_counter() - started:.1f}s')
+
+    busiest = list(
+        ItineraryActivity.objects.order_by().values('itinerary__date').annotate(count=Count('id'))
+        .order_by('-count').values_list('itinerary__date', 'count')[:3]
+    )
+    sql, params = ItineraryActivity.objects.filter(itinerary__date=busiest[0][0]).order_by('time', 'id').values_list(
+        *manifest.FIELDS.values()).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        print('\n'.join(row[-1] for row in cursor.fetchall()))
+
+    user = get_user_model().objects.get_or_create(username='benchmark')[0]
+    factory = APIRequestFactory()
+    view = ManifestViewSet.as_view({'get': 'list'})
+
+    def fetch(day):
+        request = factory.get('/api/operations/manifest/', {'date': day.isoformat()}, secure=True)
+        force_authenticate(request, user)
+        response = view(request)
+        assert response.status_code == 200, response.data
+        return response.render()
+
+    print(f'\n{"date":<12} {"activities":>10} {"ms":>8} {"KiB":>8}')
+    for day, count in busiest:
+        best, response = timed(fetch, day)
+        print(f'{day.isoformat():<12} {count:>10} {best:>8.2f} {len(response.content) / 1024:>8.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Hotel occupancy lookups: the materialized table vs expanding bookings.
+
+Seeds ``--rows`` service vouchers with two room types each, rebuilds the
+occupancy table, then times (best of five) occupancy for one hotel over 30
+nights and for every hotel over 7 nights, read from ``HotelOccupancy`` and
+computed by expanding the overlapping bookings. Also times the
+incremental refresh after one voucher's dates change.
+
+    python -m benchmarks.occupancy_lookup [--rows 200000] [--database path]
+"""
+import time
+from collections import Counter
+from datetime import timedelta
+
+from .common import FIRST_DATE, HOTELS, analyze, parser, seed_service_vouchers, seed_voucher_details, setup, timed
+
+
+def main():
+    args = parser(__doc__.strip().splitlines()[0], 200_000).parse_args()
+    setup('occupancy_lookup', args.database)
+
+    from django.db import transaction
+    from django.db.models import Q
+
+    from operations import occupancy
+    from operations.models import RoomAllocation, ServiceVoucher
+
+    started = time.perf_counter()
+    seed_service_vouchers(args.rows, args.seed)
+    seed_voucher_details(args.seed, days=0)
+    print(f'seeded in {time.perf_counter() - started:.1f}s')
+    started = time.perf_counter()
+    with transaction.atomic():
+        cells = occupancy.rebuild()
+    analyze()
+    print(f'rebuilt {cells} room-nights in {time.perf_counter() - started:.1f}s')
+
+    def expanded(start, end, hotel_name=None):
+        rooms = RoomAllocation.objects.filter(
+            Q(service_voucher__travel_end_date__gt=start), service_voucher__travel_start_date__lte=end,
+        )
+        if hotel_name:
+            rooms = rooms.filter(service_voucher__hotel_name=hotel_name)
+        counts = Counter()
+        for hotel, check_in, check_out, room_type, quantity in rooms.values_list(
+                'service_voucher__hotel_name', 'service_voucher__travel_start_date',
+                'service_voucher__travel_end_date', 'room_type', 'quantity'):
+            night = max(check_in, start)
+            while night < check_out and night <= end:
+                counts[hotel, night, room_type] += quantity
+                night += timedelta(days=1)
+        return counts
+
+    start = FIRST_DATE + timedelta(days=400)
+    print(f'\n{"lookup":<28} {"table ms":>9} {"expand ms":>10}')
+    for label, end, hotel_name in [('one hotel, 30 nights', start + timedelta(days=29), HOTELS[7]),
+                                   ('all hotels, 7 nights', start + timedelta(days=6), None)]:
+        table_ms, hotels = timed(occupancy.occupancy, start, end, hotel_name)
+        expand_ms, counts = timed(expanded, start, end, hotel_name)
+        total = sum(night['total'] for hotel in hotels for night in hotel['nights'])
+        assert total == sum(counts.values()), (total, sum(counts.values()))
+        print(f'{label:<28} {table_ms:>9.2f} {expand_ms:>10.2f}')
+
+    voucher = ServiceVoucher.objects.filter(room_allocations__isnull=False).first()
+
+    def move():
+        voucher.travel_end_date += timedelta(days=1)
+        with transaction.atomic():
+            voucher.save()
+
+    refresh_ms, _ = timed(move)
+    print(f'\nincremental refresh after a date change: {refresh_ms:.2f} ms (save included)')
+
+
+if __name__ == '__main__':
+    main()
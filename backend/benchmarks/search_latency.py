@@ -0,0 +1,67 @@
+"""
+Search endpoint latency over a seeded voucher table.
+
+Seeds ``--rows`` service vouchers and hotel vouchers (1M each by default),
+rebuilds the search index, then times each query through the real
+``SearchViewSet`` (best of five) alongside the ``LIKE '%...%'`` lookup the
+admin's ``search_fields`` compiles to, for comparison.
+
+    python -m benchmarks.search_latency [--rows 1000000] [--database path]
+"""
+import time
+
+from .common import analyze, parser, seed_hotel_vouchers, seed_service_vouchers, setup, timed
+
+QUERIES = ['BENCH-00042', '0004217', 'Guest 77123', 'hotel 042', 'hotel 042 guest 99', 'HCONF-0031']
+
+
+def main():
+    args = parser(__doc__.strip().splitlines()[0], 1_000_000).parse_args()
+    setup('search_latency', args.database)
+
+    from django.contrib.auth import get_user_model
+    from django.db import transaction
+    from django.db.models import Q
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from operations import search
+    from operations.models import ServiceVoucher
+    from operations.views import SearchViewSet
+
+    started = time.perf_counter()
+    seed_service_vouchers(args.rows, args.seed)
+    seed_hotel_vouchers(args.rows, args.seed)
+    print(f'seeded in {time.perf_counter() - started:.1f}s')
+    started = time.perf_counter()
+    with transaction.atomic():
+        indexed = search.rebuild()
+    analyze()
+    print(f'indexed {indexed} vouchers in {time.perf_counter() - started:.1f}s')
+
+    user = get_user_model().objects.get_or_create(username='benchmark')[0]
+    factory = APIRequestFactory()
+    view = SearchViewSet.as_view({'get': 'list'})
+
+    def fetch(query):
+        request = factory.get('/api/operations/search/', {'q': query}, secure=True)
+        force_authenticate(request, user)
+        response = view(request)
+        assert response.status_code == 200, response.data
+        return response.data['results']
+
+    def like(query):
+        return list(ServiceVoucher.objects.filter(
+            Q(reservation_number__icontains=query) | Q(hotel_name__icontains=query)
+            | Q(traveler__name__icontains=query)
+        ).values_list('id', flat=True)[:search.DEFAULT_LIMIT])
+
+    print(f'\n{"query":<22} {"results":>7} {"search ms":>10} {"LIKE ms":>10}  top match')
+    for query in QUERIES:
+        best, results = timed(fetch, query)
+        like_best, _ = timed(like, query, repeat=1)
+        top = results[0]['reference'] if results else '-'
+        print(f'{query:<22} {len(results):>7} {best:>10.2f} {like_best:>10.2f}  {top}')
+
+
+if __name__ == '__main__':
+    main()
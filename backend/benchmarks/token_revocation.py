@@ -0,0 +1,78 @@
+"""
+Cost of the revoked-token check, and the memory it holds, as revocations pile up.
+
+For each size up to ``--rows`` revoked tokens, half of them already expired,
+reports the time of ``DatabaseRevocationStore.is_revoked`` for a revoked and
+a clean ``jti`` (mean over ``--checks`` calls), the time of a full sync, the
+memory of the in-process set before and after pruning, and the table rows
+left once pruned.
+
+    python -m benchmarks.token_revocation [--rows 1000000] [--checks 100000]
+"""
+import statistics
+import sys
+import time
+import uuid
+from datetime import timedelta
+
+from .common import _insert, analyze, parser, setup
+
+
+def main():
+    argument_parser = parser(__doc__.strip().splitlines()[0], 1_000_000)
+    argument_parser.add_argument('--checks', type=int, default=100_000)
+    args = argument_parser.parse_args()
+    setup('token_revocation', args.database)
+
+    from django.db import connection, transaction
+    from django.utils import timezone
+
+    from users.models import RevokedToken
+    from users.revocation import DatabaseRevocationStore
+
+    def size_of(revoked):
+        return sys.getsizeof(revoked) + sum(sys.getsizeof(key) + sys.getsizeof(expiry)
+                                            for key, expiry in revoked.items())
+
+    adapt = connection.ops.adapt_datetimefield_value
+    print(f'{"revoked":>9} {"hit ns":>8} {"miss ns":>8} {"sync ms":>8} {"KiB":>9} {"pruned KiB":>11} {"rows left":>10}')
+    size = 1000
+    while size <= args.rows:
+        RevokedToken.objects.all().delete()
+        now = timezone.now()
+        jtis = [uuid.uuid4().hex for _ in range(size)]
+        with transaction.atomic(), connection.cursor() as cursor:
+            _insert(cursor, RevokedToken._meta.db_table, ['jti', 'expires_at', 'revoked_at'], [
+                (jti, adapt(now + timedelta(hours=1 if number % 2 else -1)), adapt(now))
+                for number, jti in enumerate(jtis)
+            ])
+        analyze()
+
+        store = DatabaseRevocationStore(sync_seconds=3600, prune_seconds=3600)
+        started = time.perf_counter()
+        store.sync()
+        sync_ms = (time.perf_counter() - started) * 1000
+        # Expired rows are skipped by the sync; load them as a process that saw them revoked would have.
+        store._revoked.update({number: 0.0 for number in range(size // 2)})
+        before = size_of(store._revoked)
+        hit, miss = jtis[1], uuid.uuid4().hex
+
+        timings = {}
+        for name, jti in (('hit', hit), ('miss', miss)):
+            rounds = []
+            for _ in range(5):
+                started = time.perf_counter()
+                for _ in range(args.checks):
+                    store.is_revoked(jti)
+                rounds.append((time.perf_counter() - started) / args.checks * 1e9)
+            timings[name] = statistics.median(rounds)
+        assert store.is_revoked(hit) and not store.is_revoked(miss)
+
+        store.prune()
+        print(f'{size:>9} {timings["hit"]:>8.0f} {timings["miss"]:>8.0f} {sync_ms:>8.1f} {before / 1024:>9.0f} '
+              f'{size_of(store._revoked) / 1024:>11.0f} {RevokedToken.objects.count():>10}')
+        size *= 10
+
+
+if __name__ == '__main__':
+    main()
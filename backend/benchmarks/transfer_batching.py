@@ -0,0 +1,95 @@
+"""
+Transfer batching over one busy day.
+
+Seeds ``--rows`` service vouchers, each with one itinerary day on the same
+date holding a single TRANSFER activity at a random time between 05:00 and
+23:00, picked up at one of ``--points`` meeting points. Then times the
+pickup query, the sweep, and the full ``TransferRunViewSet.list`` response
+(best of five), and reports how full the shared vehicles run.
+
+    python -m benchmarks.transfer_batching [--rows 50000] [--points 40] [--database path]
+"""
+import random
+import time
+from datetime import date
+
+from .common import _insert, analyze, parser, seed_service_vouchers, setup, timed
+
+DAY = date(2025, 6, 1)
+
+
+def seed_transfers(points, seed):
+    """Give every voucher without itinerary days one TRANSFER on DAY; returns how many were added."""
+    from django.db import connection, transaction
+    from operations.models import Itinerary, ItineraryActivity, ServiceVoucher
+
+    vouchers = list(ServiceVoucher.objects.filter(itinerary_items__isnull=True).values_list('id', flat=True))
+    if not vouchers:
+        return 0
+    rng = random.Random(seed)
+    day_id = Itinerary.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    names = [f'Meeting point {number:02d}' for number in range(points)]
+    days, activities, meeting_points = [], [], []
+    for offset, pk in enumerate(vouchers, 1):
+        minute = rng.randrange(5 * 60, 23 * 60)
+        days.append((day_id + offset, pk, 1, DAY))
+        activities.append((day_id + offset, f'{minute // 60:02d}:{minute % 60:02d}:00', 'TRANSFER', 'Pickup', '', ''))
+        meeting_points.append((rng.choice(names), pk))
+    with transaction.atomic(), connection.cursor() as cursor:
+        _insert(cursor, Itinerary._meta.db_table, ['id', 'service_voucher_id', 'day', 'date'], days)
+        _insert(cursor, ItineraryActivity._meta.db_table, [
+            'itinerary_id', 'time', 'activity_type', 'description', 'location', 'notes',
+        ], activities)
+        cursor.executemany(
+            f'UPDATE {ServiceVoucher._meta.db_table} SET meeting_point = %s WHERE id = %s', meeting_points,
+        )
+    return len(vouchers)
+
+
+def main():
+    argument_parser = parser(__doc__.strip().splitlines()[0], 50_000)
+    argument_parser.add_argument('--points', type=int, default=40)
+    args = argument_parser.parse_args()
+    setup('transfer_batching', args.database)
+
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    from operations import transfers
+    from operations.views import TransferRunViewSet
+
+    started = time.perf_counter()
+    seed_service_vouchers(args.rows, args.seed)
+    seed_transfers(args.points, args.seed)
+    analyze()
+    print(f'seeded in {time.perf_counter() - started:.1f}s')
+
+    user = get_user_model().objects.get_or_create(username='benchmark')[0]
+    factory = APIRequestFactory()
+    view = TransferRunViewSet.as_view({'get': 'list'})
+
+    def fetch():
+        request = factory.get('/api/operations/transfer-runs/', {'start': DAY.isoformat()}, secure=True)
+        force_authenticate(request, user)
+        response = view(request)
+        assert response.status_code == 200, response.data
+        return response.render()
+
+    query_ms, records = timed(transfers.pickups, DAY, DAY)
+    schedule_ms, runs = timed(transfers.schedule, DAY, DAY)
+    endpoint_ms, _ = timed(fetch)
+
+    shared = [run for run in runs if run['capacity']]
+    seats = sum(run['capacity'] for run in shared)
+    print(f'\n{len(records)} transfers -> {len(runs)} runs '
+          f'({len(runs) - len(shared)} private, {len(shared)} shared/group)')
+    print(f'shared/group seat occupancy: {sum(run["pax"] for run in shared) / seats:.0%}, '
+          f'{sum(len(run["stops"]) for run in shared) / len(shared):.1f} bookings per run')
+    print(f'\n{"step":<22} {"ms":>9}')
+    print(f'{"pickup query":<22} {query_ms:>9.1f}')
+    print(f'{"query + sweep":<22} {schedule_ms:>9.1f}')
+    print(f'{"endpoint (rendered)":<22} {endpoint_ms:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
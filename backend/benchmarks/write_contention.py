@@ -0,0 +1,121 @@
+"""
+Concurrent writers on one SQLite file: Django's defaults vs ``core.sqlite3``.
+
+Seeds ``--rows`` service vouchers, then runs ``--workers`` processes (as
+Passenger would) that each perform ``--ops`` requests against the same
+file. A request is a voucher list read or, with probability
+``--write-ratio``, a read-then-update transaction; connections are closed
+or kept after each request exactly as ``request_finished`` would.
+
+* ``default``: ``django.db.backends.sqlite3``, rollback journal, deferred
+  transactions and a new connection per request.
+* ``tuned``: ``settings.DATABASES`` (WAL, busy_timeout, IMMEDIATE
+  transactions, persistent connections).
+
+    python -m benchmarks.write_contention [--rows 10000] [--workers 8] [--ops 300] [--write-ratio 0.5]
+"""
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import time
+from pathlib import Path
+
+from .common import BACKEND_DIR, analyze, parser, seed_service_vouchers, setup
+
+
+def _configure(database):
+    import sys
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    os.environ.setdefault('CORS_ALLOWED_ORIGINS', 'http://localhost')
+
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default'] = database
+    django.setup()
+
+
+def _work(job):
+    """Run ``ops`` requests; returns (latencies in ms, error counts)."""
+    from django.db import OperationalError, close_old_connections, transaction
+    from django.db.models import F
+    from operations.models import ServiceVoucher
+
+    seed, ops, rows, write_ratio = job
+    rng = random.Random(seed)
+    latencies, errors = [], {}
+    for _ in range(ops):
+        pk = rng.randint(1, rows)
+        started = time.perf_counter()
+        try:
+            if rng.random() < write_ratio:
+                with transaction.atomic():
+                    version = ServiceVoucher.objects.values_list('version', flat=True).get(pk=pk)
+                    ServiceVoucher.objects.filter(pk=pk, version=version).update(version=F('version') + 1)
+            else:
+                list(ServiceVoucher.objects.filter(pk__gte=pk).order_by('pk').values('id', 'reservation_number')[:20])
+        except OperationalError as exc:
+            errors[str(exc)] = errors.get(str(exc), 0) + 1
+        else:
+            latencies.append((time.perf_counter() - started) * 1000)
+        close_old_connections()
+    return latencies, errors
+
+
+def run(name, database, args):
+    context = multiprocessing.get_context('spawn')
+    jobs = [(worker, args.ops, args.rows, args.write_ratio) for worker in range(args.workers)]
+    with context.Pool(args.workers, initializer=_configure, initargs=(database,)) as pool:
+        pool.map(_work, [(0, 1, args.rows, 0)] * args.workers)  # warm up imports
+        started = time.perf_counter()
+        results = pool.map(_work, jobs)
+        elapsed = time.perf_counter() - started
+    latencies = sorted(latency for worker_latencies, _ in results for latency in worker_latencies)
+    errors = {}
+    for _, worker_errors in results:
+        for message, count in worker_errors.items():
+            errors[message] = errors.get(message, 0) + count
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else float('nan')
+    median = statistics.median(latencies) if latencies else float('nan')
+    print(f'{name:<8} {len(latencies) / elapsed:>8.0f} {sum(errors.values()):>7} {median:>8.2f} {p95:>8.2f}'
+          f'  {", ".join(f"{message}: {count}" for message, count in errors.items())}')
+
+
+def main():
+    argument_parser = parser(__doc__.strip().splitlines()[0], 10_000)
+    argument_parser.add_argument('--workers', type=int, default=8)
+    argument_parser.add_argument('--ops', type=int, default=300)
+    argument_parser.add_argument('--write-ratio', type=float, default=0.5)
+    args = argument_parser.parse_args()
+    setup('write_contention', args.database)
+
+    from django.conf import settings
+    from django.db import connection
+
+    seed_service_vouchers(args.rows, args.seed)
+    analyze()
+    tuned = dict(settings.DATABASES['default'])
+    connection.close()
+
+    # The journal mode is stored in the file, so the baseline gets a copy.
+    path = Path(tuned['NAME'])
+    baseline = path.with_name(f'{path.stem}_default{path.suffix}')
+    source, target = sqlite3.connect(path), sqlite3.connect(baseline)
+    source.backup(target)
+    target.execute('PRAGMA journal_mode = DELETE')
+    source.close()
+    target.close()
+    default = {**tuned, 'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(baseline), 'OPTIONS': {},
+               'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+
+    print(f'{args.workers} workers x {args.ops} requests, {args.write_ratio:.0%} writes\n')
+    print(f'{"config":<8} {"req/s":>8} {"errors":>7} {"p50 ms":>8} {"p95 ms":>8}')
+    run('default', default, args)
+    run('tuned', tuned, args)
+
+
+if __name__ == '__main__':
+    main()
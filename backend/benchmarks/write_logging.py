@@ -0,0 +1,143 @@
+"""
+What logging costs the voucher write path, on the request thread.
+
+Two measurements, each with logs written to a file:
+
+* per record: the old ``create`` line (``request.data`` of a ``--days``
+  voucher merged into the message, written by a plain ``FileHandler``)
+  against the structured record ``create`` logs now, through
+  ``core.logs.QueueHandler`` and ``JSONFormatter``, mean over ``--records``
+  calls;
+* per request: ``--requests`` service voucher creates and updates through
+  the test client each with the pipeline logging to a file and with
+  logging disabled, alternated request by request.
+
+    python -m benchmarks.write_logging [--rows 1000] [--days 14] [--records 20000] [--requests 300]
+"""
+import logging
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from .common import analyze, parser, seed_service_vouchers, seed_voucher_details, setup
+
+
+def payload(number, days):
+    start = date(2026, 1, 1) + timedelta(days=number % 365)
+    return {
+        'traveler': {'name': f'Logging Guest {number}', 'num_adults': 2, 'num_infants': 0},
+        'reservation_number': f'LOG-{os.getpid()}-{number:06d}',
+        'hotel_confirmation_number': f'LOG-{number:06d}',
+        'travel_start_date': start.isoformat(),
+        'travel_end_date': (start + timedelta(days=days)).isoformat(),
+        'hotel_name': 'Hotel 001',
+        'transfer_type': 'PRIVATE',
+        'meal_plan': 'HB',
+        'room_allocations': [{'room_type': 'DBL', 'quantity': 2}, {'room_type': 'SGL', 'quantity': 1}],
+        'itinerary_items': [
+            {'day': day, 'date': (start + timedelta(days=day - 1)).isoformat(), 'activities': [
+                {'time': f'{9 + 3 * hour:02d}:00', 'activity_type': 'TOUR', 'description': f'Stop {hour} ' * 8}
+                for hour in range(3)
+            ]}
+            for day in range(1, days + 1)
+        ],
+    }
+
+
+def main():
+    argument_parser = parser(__doc__.strip().splitlines()[0], 1000)
+    argument_parser.add_argument('--days', type=int, default=14)
+    argument_parser.add_argument('--records', type=int, default=20_000)
+    argument_parser.add_argument('--requests', type=int, default=300)
+    args = argument_parser.parse_args()
+    setup('write_logging', args.database)
+
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from django.urls import reverse
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from core.logs import JSONFormatter, QueueHandler
+
+    seed_service_vouchers(args.rows, args.seed)
+    seed_voucher_details(args.seed)
+    analyze()
+
+    directory = tempfile.mkdtemp(prefix='write_logging-')
+    data = payload(0, args.days)
+
+    old = logging.getLogger('benchmarks.write_logging.old')
+    old.propagate = False
+    old.setLevel(logging.INFO)
+    old.addHandler(logging.FileHandler(os.path.join(directory, 'old.log')))
+    new = logging.getLogger('benchmarks.write_logging.new')
+    new.propagate = False
+    new.setLevel(logging.INFO)
+    handler = QueueHandler(target='logging.FileHandler', filename=os.path.join(directory, 'new.log'))
+    handler.setFormatter(JSONFormatter())
+    new.addHandler(handler)
+
+    def old_record():
+        old.info("Creating new service voucher with data: %s", data)
+
+    def new_record():
+        new.info("Created service voucher %s", 1, extra={
+            'event': 'service_voucher.created', 'voucher_id': 1, 'reservation_number': 'LOG-000001',
+            'validate_ms': 4.2, 'write_ms': 5.1,
+        })
+
+    print(f'{"per record":<28} {"us":>8}')
+    for name, call in (('payload dump, sync', old_record), ('structured, queued', new_record)):
+        rounds = []
+        for _ in range(5):
+            started = time.perf_counter()
+            for _ in range(args.records // 5):
+                call()
+            rounds.append((time.perf_counter() - started) / (args.records // 5) * 1e6)
+            handler.flush()
+        print(f'{name:<28} {statistics.median(rounds):>8.1f}')
+    print(f'log size per record: {os.path.getsize(os.path.join(directory, "old.log")) // args.records} B before, '
+          f'{os.path.getsize(os.path.join(directory, "new.log")) // args.records} B after')
+
+    user = get_user_model().objects.get_or_create(username='benchmark', defaults={'role': 'STAFF'})[0]
+    client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    operations = logging.getLogger('operations')
+    operations.handlers = [QueueHandler(target='logging.FileHandler', filename=os.path.join(directory, 'ops.log'))]
+    operations.handlers[0].setFormatter(JSONFormatter())
+    operations.setLevel(logging.INFO)
+    number = iter(range(1, 10 ** 9))
+
+    def create():
+        client.post(reverse('service-voucher-list'), payload(next(number), args.days),
+                    content_type='application/json', secure=True)
+
+    def update():
+        voucher = next(number) % args.rows + 1
+        client.patch(reverse('service-voucher-detail', args=[voucher]), {'room_allocations': [
+            {'room_type': 'DBL', 'quantity': voucher % 3 + 1},
+        ]}, content_type='application/json', secure=True)
+
+    print(f'\n{"per request":<28} {"p50 ms":>8} {"p95 ms":>8}')
+    for name, call in (('create', create), ('update', update)):
+        for _ in range(20):
+            call()
+        # Alternate on and off request by request, so drift (the tables
+        # growing, the disk) hits both alike.
+        latencies = {False: [], True: []}
+        for request in range(2 * args.requests):
+            logging_on = bool(request % 2)
+            logging.disable(logging.NOTSET if logging_on else logging.CRITICAL)
+            started = time.perf_counter()
+            call()
+            latencies[logging_on].append((time.perf_counter() - started) * 1000)
+        logging.disable(logging.NOTSET)
+        for logging_on, timings in latencies.items():
+            timings.sort()
+            label = f'{name}, logging {"on" if logging_on else "off"}'
+            print(f'{label:<28} {statistics.median(timings):>8.2f} {timings[int(len(timings) * 0.95)]:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,9 @@
 """
 ASGI config for core project.
+
+Serve with any ASGI server, e.g. ``uvicorn core.asgi:application``. The
+async read endpoints live under ``/api/async/operations/`` (see
+``operations.async_views``); every other view runs in a worker thread.
 """
 
 import os
@@ -7,5 +11,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Each ASGI request runs its database work on a thread of its own, so a
+# connection kept open after the request would never be reused.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
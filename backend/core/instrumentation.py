@@ -0,0 +1,219 @@
+"""
+Per-request timings: Server-Timing headers, a slow-request log and
+per-endpoint latency histograms.
+
+Off unless ``INSTRUMENTATION_ENABLED`` is set; the middleware then removes
+itself (``MiddlewareNotUsed``) and ``timed`` costs one context-variable
+lookup. When on, each request gets a ``RequestTimings`` and:
+
+* every query on every connection is counted and timed by an execute
+  wrapper, which keeps the ``INSTRUMENTATION_TOP_QUERIES`` slowest;
+* code wrapped in ``timed(phase)`` adds its wall time to that phase:
+  ``auth`` (JWT authentication), ``serialize`` (serializers and readers
+  building the response data) and ``render`` (encoding it). Phases include
+  the queries run inside them; ``db`` is the total of all queries;
+* the response carries ``Server-Timing`` with ``db``, the phases and
+  ``total`` (unless ``INSTRUMENTATION_SERVER_TIMING`` is off);
+* a request slower than ``INSTRUMENTATION_SLOW_MS`` is logged as a warning
+  on ``core.instrumentation`` with its phases and slowest queries;
+* its latency, query count and DB time go into the histogram of its
+  endpoint (method and URL name), served by ``core.views.MetricsView``.
+
+Histograms live in each process, like the caches: with several workers,
+each answers for the requests it served (``process`` in the response).
+"""
+import bisect
+import heapq
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open.
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+MAX_SQL_LENGTH = 500
+
+_current = ContextVar('request_timings', default=None)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RequestTimings:
+    __slots__ = ('started', 'phases', 'active', 'queries', 'db', 'slowest', 'top')
+
+    def __init__(self, top):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.active = set()
+        self.queries = 0
+        self.db = 0.0
+        # Min-heap of (seconds, sql): the ``top`` slowest queries so far.
+        self.slowest = []
+        self.top = top
+
+    def add_query(self, seconds, sql):
+        self.queries += 1
+        self.db += seconds
+        if len(self.slowest) < self.top:
+            heapq.heappush(self.slowest, (seconds, sql))
+        elif self.top and seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, sql))
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to ``phase`` of the current request (once, if nested)."""
+    timings = _current.get()
+    if timings is None or phase in timings.active:
+        yield
+        return
+    timings.active.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(phase)
+        timings.phases[phase] = timings.phases.get(phase, 0.0) + time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(time.perf_counter() - started, sql)
+
+
+def install(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'count', 'total', 'queries', 'db')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.queries = 0
+        self.db = 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 2) if self.count else 0,
+            'mean_queries': round(self.queries / self.count, 2) if self.count else 0,
+            'mean_db_ms': round(self.db / self.count, 2) if self.count else 0,
+            'buckets': {
+                **{f'le_{bound}': count for bound, count in zip(BUCKETS_MS, self.buckets)},
+                'inf': self.buckets[-1],
+            },
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(endpoint, elapsed_ms, queries, db_ms):
+    with _histograms_lock:
+        histogram = _histograms.get(endpoint)
+        if histogram is None:
+            histogram = _histograms[endpoint] = Histogram()
+        histogram.buckets[bisect.bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+        histogram.count += 1
+        histogram.total += elapsed_ms
+        histogram.queries += queries
+        histogram.db += db_ms
+
+
+def snapshot():
+    """``{endpoint: histogram dict}`` for this process."""
+    with _histograms_lock:
+        return {endpoint: histogram.as_dict() for endpoint, histogram in sorted(_histograms.items())}
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return f"{request.method} {match.view_name if match else 'unresolved'}"
+
+
+class InstrumentationMiddleware:
+    """Times each request; list it first in ``MIDDLEWARE`` so it covers the others."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not _setting('INSTRUMENTATION_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = _setting('INSTRUMENTATION_SERVER_TIMING', True)
+        self.slow_ms = _setting('INSTRUMENTATION_SLOW_MS', 500)
+        self.top = _setting('INSTRUMENTATION_TOP_QUERIES', 5)
+        connection_created.connect(install, dispatch_uid='core.instrumentation.install')
+        for connection in connections.all(initialized_only=True):
+            install(None, connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings(self.top)
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, timings)
+        return response
+
+    async def __acall__(self, request):
+        timings = RequestTimings(self.top)
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, timings)
+        return response
+
+    def finish(self, request, response, timings):
+        elapsed_ms = (time.perf_counter() - timings.started) * 1000
+        db_ms = timings.db * 1000
+        endpoint = endpoint_name(request)
+        observe(endpoint, elapsed_ms, timings.queries, db_ms)
+        if self.server_timing:
+            metrics = [f'db;dur={db_ms:.1f};desc="{timings.queries} queries"']
+            metrics += [f'{phase};dur={seconds * 1000:.1f}' for phase, seconds in timings.phases.items()]
+            metrics.append(f'total;dur={elapsed_ms:.1f}')
+            response['Server-Timing'] = ', '.join(metrics)
+        if elapsed_ms >= self.slow_ms:
+            logger.warning(
+                "Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, %s; slowest queries: %s",
+                request.method, request.get_full_path(), endpoint, elapsed_ms, timings.queries, db_ms,
+                ', '.join(f'{phase} {seconds * 1000:.0f} ms' for phase, seconds in timings.phases.items()) or '-',
+                ' | '.join(f'{seconds * 1000:.1f} ms: {sql[:MAX_SQL_LENGTH]}'
+                           for seconds, sql in sorted(timings.slowest, reverse=True)) or '-',
+            )
+
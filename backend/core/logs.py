@@ -0,0 +1,172 @@
+"""
+Logging pipeline: JSON lines, written off the request thread, sampled and capped.
+
+``settings.LOGGING`` routes the project's loggers to ``QueueHandler``. On
+the logging thread it only runs the filters, merges the message and puts
+the record on a bounded queue. It never waits: when the queue is full the
+record is dropped, and the next one to get through carries
+``dropped_records``. A ``QueueListener`` thread formats and writes records
+to the target handler (stderr unless told otherwise).
+
+* ``SamplingFilter`` keeps records below WARNING at a rate per logger name
+  (longest dotted prefix wins). Kept records carry ``sample_rate`` so
+  counts can be scaled back up. Warnings and errors are always kept.
+* ``JSONFormatter`` writes one object per line: ``time``, ``level``,
+  ``logger``, ``message``, any ``extra`` fields and ``exception``. Field
+  values longer than ``max_field_length`` characters (strings, or the JSON
+  of anything else) are cut. A line over ``max_record_bytes`` keeps only
+  the fixed fields and ``truncated``.
+
+Log identifiers and timings through ``extra`` rather than whole payloads:
+only the message is merged where the record is logged, the rest is
+encoded on the listener thread.
+"""
+import copy
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import weakref
+from datetime import datetime, timezone
+from logging import handlers
+
+from django.utils.module_loading import import_string
+
+# Attributes every LogRecord has; anything else came in through ``extra``.
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+def _cut(text, limit):
+    return text if len(text) <= limit else f'{text[:limit]}...[{len(text) - limit} more]'
+
+
+class JSONFormatter(logging.Formatter):
+    def __init__(self, max_field_length=1000, max_record_bytes=16384, **kwargs):
+        super().__init__(**kwargs)
+        self.max_field_length = max_field_length
+        self.max_record_bytes = max_record_bytes
+
+    def capped(self, value):
+        if isinstance(value, str):
+            return _cut(value, self.max_field_length)
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        text = json.dumps(value, default=str)
+        return value if len(text) <= self.max_field_length else _cut(text, self.max_field_length)
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': _cut(record.getMessage(), self.max_field_length),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                data[key] = self.capped(value)
+        if record.exc_info:
+            data['exception'] = _cut(self.formatException(record.exc_info), self.max_field_length)
+        line = json.dumps(data, default=str)
+        if len(line.encode()) > self.max_record_bytes:
+            line = json.dumps(dict(
+                {key: data[key] for key in ('time', 'level', 'logger', 'message')}, truncated=True,
+            ))
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates=None):
+        super().__init__()
+        # Longest prefix first, so the most specific rate wins.
+        self.rates = sorted((rates or {}).items(), key=lambda item: -len(item[0]))
+        self._by_logger = {}
+
+    def rate(self, name):
+        rate = self._by_logger.get(name)
+        if rate is None:
+            rate = next((rate for prefix, rate in self.rates
+                         if name == prefix or name.startswith(f'{prefix}.')), 1.0)
+            self._by_logger[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        if rate >= 1:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+def _restart(reference):
+    handler = reference()
+    if handler is not None and handler.listener is not None:
+        handler.start()
+
+
+class QueueHandler(handlers.QueueHandler):
+    """
+    Hands records to a background ``QueueListener`` writing to ``target``
+    (a handler class path; ``StreamHandler`` on stderr by default). The
+    formatter set on this handler is used by the target, on that thread.
+    """
+
+    def __init__(self, target='logging.StreamHandler', queue_size=10000, **target_kwargs):
+        self.queue_size = queue_size
+        self.target = import_string(target)(**target_kwargs)
+        self.listener = None
+        self.dropped = 0
+        super().__init__(None)
+        self.start()
+        if hasattr(os, 'register_at_fork'):
+            # The listener thread does not survive a fork (e.g. preloading web
+            # workers); give each child its own queue and thread.
+            os.register_at_fork(after_in_child=functools.partial(_restart, weakref.ref(self)))
+
+    def start(self):
+        self.queue = queue.Queue(self.queue_size)
+        self.dropped = 0
+        self.listener = handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Only merge the message, so arguments mutated after the call cannot
+        # change it; the formatting happens on the listener thread.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+    def emit(self, record):
+        # Called with the handler lock held, so ``dropped`` needs no other.
+        try:
+            record = self.prepare(record)
+            if self.dropped:
+                record.dropped_records = self.dropped
+            self.queue.put_nowait(record)
+            self.dropped = 0
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        """Wait until the records queued so far are written."""
+        if self.listener is not None:
+            self.queue.join()
+        self.target.flush()
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
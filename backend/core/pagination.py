@@ -0,0 +1,96 @@
+from collections import OrderedDict
+
+from django.core.paginator import InvalidPage
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+
+
+class PageNumberPagination(pagination.PageNumberPagination):
+    """The default paginator, honouring a bounded ``?page_size=``."""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` running the COUNT and the page query through the async ORM."""
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property; fill it so nothing counts synchronously.
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return [row async for row in self.page.object_list]
+
+
+class KeysetPagination(pagination.CursorPagination):
+    """
+    Cursor pagination over ``-id``: every page is an indexed ``id < x LIMIT n``
+    scan, so deep pages cost the same as the first one. There is no COUNT
+    unless the client asks for it with ``?include_count=true``.
+
+    The cursor is a single position, so it must be on a unique column:
+    ``?ordering=`` on anything but ``id`` is rejected with a 400 (page-number
+    pagination takes any ordering).
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_query_param = 'include_count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering[0].lstrip('-') not in ('id', 'pk'):
+            raise ValidationError({'ordering': ['Cursor pagination can only order by id.']})
+        return ordering
+
+    def get_paginated_response(self, data):
+        page = OrderedDict()
+        if self.count is not None:
+            page['count'] = self.count
+        page['next'] = self.get_next_link()
+        page['previous'] = self.get_previous_link()
+        page['results'] = data
+        return Response(page)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {'type': 'integer', 'example': 123}
+        return response_schema
+
+
+class KeysetPaginationMixin:
+    """
+    Lets a list endpoint switch to ``KeysetPagination`` per request.
+
+    Page-number pagination stays the default so existing clients keep
+    working; passing ``?cursor=`` (as the ``next``/``previous`` links do) or
+    ``?pagination=cursor`` selects keyset pagination instead.
+    """
+    keyset_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = getattr(self.request, 'query_params', {})
+            if 'cursor' in params or params.get('pagination') == 'cursor':
+                self._paginator = self.keyset_pagination_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
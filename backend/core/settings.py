@@ -34,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -67,13 +68,58 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database: SQLite (default) or PostgreSQL, chosen with DB_ENGINE.
+# Connections are kept open for DB_CONN_MAX_AGE seconds and checked before
+# reuse, instead of being opened on every request.
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite').lower()
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 600))
+
+if DB_ENGINE in ('postgres', 'postgresql'):
+    # Requires psycopg2. With DB_PGBOUNCER=true, point DB_HOST/DB_PORT at a
+    # pgbouncer in transaction pooling mode; server-side cursors do not
+    # survive it, so they are disabled.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'travel_operations'),
+            'USER': os.getenv('DB_USER', ''),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', ''),
+            'PORT': os.getenv('DB_PORT', ''),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_PGBOUNCER', 'False').lower() == 'true',
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
+    }
+else:
+    # WAL lets readers run alongside the single writer; writers wait up to
+    # busy_timeout ms for the lock and take it when the transaction starts
+    # (see core.sqlite3). synchronous=NORMAL is durable in WAL mode except
+    # for the last commits on power loss.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.sqlite3',
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'transaction_mode': os.getenv('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
+                'pragmas': {
+                    'journal_mode': 'WAL',
+                    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+                    'synchronous': 'NORMAL',
+                    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+                    'cache_size': -int(os.getenv('SQLITE_CACHE_KB', 20000)),
+                    'temp_store': 'MEMORY',
+                },
+            },
+        }
     }
-}
 
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -89,6 +135,10 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Rendered voucher PDFs, keyed by a hash of the voucher contents (LRU, bounded)
+VOUCHER_PDF_CACHE_DIR = os.getenv('VOUCHER_PDF_CACHE_DIR', os.path.join(MEDIA_ROOT, 'voucher-pdfs'))
+VOUCHER_PDF_CACHE_MAX_BYTES = int(os.getenv('VOUCHER_PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
 # Security settings
 SECURE_SSL_REDIRECT = not DEBUG
 SESSION_COOKIE_SECURE = not DEBUG
@@ -122,21 +172,100 @@ CORS_ALLOW_HEADERS = [
 # Rest Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'operations.renderers.FastJSONRenderer',
     ) if not DEBUG else (
-        'rest_framework.renderers.JSONRenderer',
+        'operations.renderers.FastJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
 
+# Seconds the dashboard aggregates are cached between writes
+DASHBOARD_STATS_CACHE_TTL = int(os.getenv('DASHBOARD_STATS_CACHE_TTL', 60))
+
+# Seconds a serialized voucher detail is kept; entries are keyed by version
+VOUCHER_DETAIL_CACHE_TTL = int(os.getenv('VOUCHER_DETAIL_CACHE_TTL', 300))
+
+# Largest ``chunk_size`` a voucher import may ask for: a chunk is held in
+# memory and validated in one pass
+IMPORT_MAX_CHUNK_SIZE = int(os.getenv('IMPORT_MAX_CHUNK_SIZE', 5000))
+
+# Background jobs (operations.jobs): where their files go, how many of each
+# kind run at once, retry backoff (seconds, doubling per attempt) and how
+# long a running job may go without a heartbeat before it is retried
+JOB_FILES_DIR = os.getenv('JOB_FILES_DIR', os.path.join(MEDIA_ROOT, 'jobs'))
+JOB_CONCURRENCY = {
+    'import': int(os.getenv('JOB_IMPORT_CONCURRENCY', 1)),
+    'export': int(os.getenv('JOB_EXPORT_CONCURRENCY', 2)),
+    'pdf-batch': int(os.getenv('JOB_PDF_BATCH_CONCURRENCY', 2)),
+}
+JOB_RETRY_DELAY = int(os.getenv('JOB_RETRY_DELAY', 30))
+JOB_RETRY_MAX_DELAY = int(os.getenv('JOB_RETRY_MAX_DELAY', 3600))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 300))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+JOB_PDF_BATCH_MAX = int(os.getenv('JOB_PDF_BATCH_MAX', 1000))
+
+# Request instrumentation (core.instrumentation): Server-Timing headers, a
+# warning with the slowest queries for requests over INSTRUMENTATION_SLOW_MS
+# and per-endpoint latency histograms at /api/metrics/. Off by default
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', 'False').lower() == 'true'
+INSTRUMENTATION_SERVER_TIMING = os.getenv('INSTRUMENTATION_SERVER_TIMING', 'True').lower() == 'true'
+INSTRUMENTATION_SLOW_MS = int(os.getenv('INSTRUMENTATION_SLOW_MS', 500))
+INSTRUMENTATION_TOP_QUERIES = int(os.getenv('INSTRUMENTATION_TOP_QUERIES', 5))
+
+# Seconds a JWT-authenticated user is cached between lookups (0 disables);
+# saving or deleting the user drops the entry
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', 30))
+
+# Revoked JWTs (users.revocation): the store, how often each process picks
+# up revocations made by the others and how often expired ones are pruned
+TOKEN_REVOCATION_STORE = os.getenv('TOKEN_REVOCATION_STORE', 'users.revocation.DatabaseRevocationStore')
+TOKEN_REVOCATION_SYNC_SECONDS = float(os.getenv('TOKEN_REVOCATION_SYNC_SECONDS', 1.0))
+TOKEN_REVOCATION_PRUNE_SECONDS = int(os.getenv('TOKEN_REVOCATION_PRUNE_SECONDS', 300))
+
+# Logging (core.logs): the project's loggers write JSON lines to stderr from
+# a background thread fed by a bounded queue (records are dropped, never
+# waited for, when it is full). Below WARNING, operations records are kept
+# at LOG_OPERATIONS_SAMPLE_RATE; fields are cut at LOG_MAX_FIELD_LENGTH
+# characters and records at LOG_MAX_RECORD_BYTES
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'core.logs.JSONFormatter',
+            'max_field_length': int(os.getenv('LOG_MAX_FIELD_LENGTH', 1000)),
+            'max_record_bytes': int(os.getenv('LOG_MAX_RECORD_BYTES', 16384)),
+        },
+    },
+    'filters': {
+        'sampled': {
+            '()': 'core.logs.SamplingFilter',
+            'rates': {'operations': float(os.getenv('LOG_OPERATIONS_SAMPLE_RATE', 1.0))},
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'core.logs.QueueHandler',
+            'queue_size': int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+            'formatter': 'json',
+            'filters': ['sampled'],
+        },
+    },
+    'loggers': {
+        name: {'handlers': ['queue'], 'level': LOG_LEVEL, 'propagate': False}
+        for name in ('core', 'operations', 'users')
+    },
+}
+
 # Custom user model
 AUTH_USER_MODEL = 'users.User'
 
@@ -0,0 +1,52 @@
+"""
+SQLite backend tuned for several worker processes sharing one database file.
+
+Selected with ``'ENGINE': 'core.sqlite3'``. On top of Django's backend it
+reads two extra ``OPTIONS`` (the names Django 5.1 adopted for the same
+purpose):
+
+* ``pragmas``: a mapping of ``PRAGMA`` settings run on every new
+  connection, e.g. ``journal_mode=WAL`` so readers never block the writer,
+  and ``busy_timeout`` so a writer waits for the lock instead of failing
+  with "database is locked".
+* ``transaction_mode``: how ``atomic()`` opens its transaction. Django
+  issues a plain (``DEFERRED``) ``BEGIN``, which takes the write lock only
+  at the first write; if another connection wrote in between, SQLite fails
+  the upgrade immediately, without waiting out ``busy_timeout``.
+  ``IMMEDIATE`` takes the write lock up front, so contending writers queue.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pragmas(self):
+        return self.settings_dict['OPTIONS'].get('pragmas', {})
+
+    @property
+    def transaction_mode(self):
+        mode = (self.settings_dict['OPTIONS'].get('transaction_mode') or 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode must be one of {', '.join(TRANSACTION_MODES)}, not {mode!r}."
+            )
+        return mode
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # Not sqlite3.connect() arguments.
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -6,9 +6,22 @@ from operations.views import (
     ServiceVoucherViewSet, 
     ItineraryViewSet, 
     ItineraryActivityViewSet,
-    HotelVoucherViewSet
+    HotelVoucherViewSet,
+    DashboardStatsViewSet,
+    SearchViewSet,
+    ManifestViewSet,
+    TransferRunViewSet,
+    OccupancyViewSet,
+    JobViewSet,
+)
+from operations.async_views import (
+    ServiceVoucherListView,
+    ServiceVoucherDetailView,
+    HotelVoucherListView,
+    ItineraryListView,
 )
 from rest_framework import permissions
+from core.views import MetricsView
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
@@ -32,11 +45,27 @@ router.register(r'service-vouchers', ServiceVoucherViewSet, basename='service-vo
 router.register(r'hotel-vouchers', HotelVoucherViewSet, basename='hotel-voucher')
 router.register(r'itinerary', ItineraryViewSet, basename='itinerary')
 router.register(r'itinerary-activities', ItineraryActivityViewSet, basename='itinerary-activity')
+router.register(r'dashboard-stats', DashboardStatsViewSet, basename='dashboard-stats')
+router.register(r'search', SearchViewSet, basename='search')
+router.register(r'manifest', ManifestViewSet, basename='manifest')
+router.register(r'transfer-runs', TransferRunViewSet, basename='transfer-run')
+router.register(r'occupancy', OccupancyViewSet, basename='occupancy')
+router.register(r'jobs', JobViewSet, basename='job')
+
+# Async (ASGI) versions of the hot read endpoints, see operations.async_views
+async_patterns = [
+    path('service-vouchers/', ServiceVoucherListView.as_view(), name='async-service-voucher-list'),
+    path('service-vouchers/<str:pk>/', ServiceVoucherDetailView.as_view(), name='async-service-voucher-detail'),
+    path('hotel-vouchers/', HotelVoucherListView.as_view(), name='async-hotel-voucher-list'),
+    path('itinerary/', ItineraryListView.as_view(), name='async-itinerary-list'),
+]
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('users.urls')),
     path('api/operations/', include(router.urls)),
+    path('api/async/operations/', include(async_patterns)),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
     # Voucher history endpoint
     
     # Swagger documentation URLs
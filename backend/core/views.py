@@ -0,0 +1,27 @@
+import os
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import instrumentation
+
+
+class IsAdministrator(BasePermission):
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (user.is_staff or getattr(user, 'role', None) == 'ADMIN'))
+
+
+class MetricsView(APIView):
+    """Latency histograms per endpoint (``INSTRUMENTATION_ENABLED`` only), for administrators."""
+    permission_classes = [IsAdministrator]
+
+    def get(self, request):
+        return Response({
+            'enabled': getattr(settings, 'INSTRUMENTATION_ENABLED', False),
+            'process': os.getpid(),
+            'buckets_ms': list(instrumentation.BUCKETS_MS),
+            'endpoints': instrumentation.snapshot(),
+        })
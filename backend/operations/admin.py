@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ServiceVoucher, Traveler, RoomAllocation, Itinerary, ItineraryActivity, HotelVoucher
+from .models import ServiceVoucher, Traveler, RoomAllocation, Itinerary, ItineraryActivity, HotelVoucher, Job
 
 class RoomAllocationInline(admin.TabularInline):
     model = RoomAllocation
@@ -76,3 +76,9 @@ class TravelerAdmin(admin.ModelAdmin):
 class HotelVoucherAdmin(admin.ModelAdmin):
     list_display = ('hotel_name', 'guest_name', 'check_in_date', 'check_out_date', 'confirmation_number')
     search_fields = ('hotel_name', 'guest_name', 'confirmation_number')
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'progress', 'total', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('worker', 'heartbeat_at', 'started_at', 'finished_at', 'created_at')
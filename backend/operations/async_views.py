@@ -0,0 +1,137 @@
+"""
+Async versions of the hot read endpoints, for the ASGI deployment.
+
+Each view serves one read action of an existing DRF viewset and reuses
+that viewset for everything except the database reads. Authentication
+(JWT) and permission checks run as they do in the sync view. So do
+throttles, content negotiation, the query-parameter filters, pagination
+links, error responses and rendering. The rows themselves are fetched
+through the async ORM with the viewset's ``reader``. While one request
+waits on the database, the event loop serves the others instead of
+holding a worker.
+
+``initial()`` (authentication resolves the user with a query) runs through
+``sync_to_async``. Requests the async path does not cover, ``?fields=``
+selections and cursor pagination, are handed to the sync action the same
+way, so every URL answers exactly like its sync counterpart.
+
+Under WSGI these views still work, with Django running each one in an
+event loop of its own, but only ``core.asgi`` gets any concurrency out of
+them.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.views import View
+from rest_framework.response import Response
+
+from .models import ServiceVoucher
+from .views import ServiceVoucherViewSet, HotelVoucherViewSet, ItineraryViewSet
+
+
+class AsyncReadView(View):
+    """
+    Serves ``action`` of ``viewset`` as an async view.
+
+    Subclasses implement ``respond`` and, if some requests must go to the
+    sync action, ``is_async``.
+    """
+    viewset = None
+    action = None
+    detail = False
+    http_method_names = ['get']
+
+    async def get(self, request, *args, **kwargs):
+        view = self.viewset(action_map={'get': self.action}, detail=self.detail)
+        view.args = args
+        view.kwargs = kwargs
+        request = view.initialize_request(request, *args, **kwargs)
+        view.request = request
+        view.headers = view.default_response_headers
+        try:
+            await sync_to_async(view.initial)(request, *args, **kwargs)
+            if self.is_async(view):
+                response = await self.respond(view, request)
+            else:
+                response = await sync_to_async(getattr(view, self.action))(request, *args, **kwargs)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        return view.finalize_response(request, response, *args, **kwargs)
+
+    def is_async(self, view):
+        """Whether ``respond`` can serve this request; sparse field selections cannot."""
+        selection = getattr(view, 'field_selection', None)
+        return view.reader is not None and (selection is None or selection.is_full)
+
+    async def respond(self, view, request):
+        raise NotImplementedError
+
+
+class AsyncListView(AsyncReadView):
+    """``ReaderListMixin.list`` through the async ORM, for page-number pagination."""
+    action = 'list'
+
+    def is_async(self, view):
+        paginator = view.paginator
+        return super().is_async(view) and (paginator is None or hasattr(paginator, 'apaginate_queryset'))
+
+    async def respond(self, view, request):
+        rows = view.reader.rows(view.filter_queryset(view.get_queryset()))
+        if view.paginator is not None:
+            page = await view.paginator.apaginate_queryset(rows, request, view=view)
+            if page is not None:
+                return view.get_paginated_response(await view.reader.aread(page))
+        return Response(await view.reader.aread(rows))
+
+
+class ServiceVoucherListView(AsyncListView):
+    viewset = ServiceVoucherViewSet
+
+
+class HotelVoucherListView(AsyncListView):
+    viewset = HotelVoucherViewSet
+
+
+class ItineraryListView(AsyncListView):
+    viewset = ItineraryViewSet
+
+
+class ServiceVoucherDetailView(AsyncReadView):
+    """
+    ``ServiceVoucherViewSet.retrieve`` through the async ORM: the same
+    version lookup, conditional responses and version-keyed body cache,
+    with a cache miss built by the list reader.
+    """
+    viewset = ServiceVoucherViewSet
+    action = 'retrieve'
+    detail = True
+
+    async def respond(self, view, request):
+        # The query-parameter filters narrow (or reject) the lookup, as in the sync view.
+        queryset = view.filter_queryset(view.get_queryset())
+        lookup = {view.lookup_field: view.kwargs[view.lookup_url_kwarg or view.lookup_field]}
+        try:
+            stamp = await queryset.prefetch_related(None).values('id', 'version', 'updated_at').aget(**lookup)
+        except (ServiceVoucher.DoesNotExist, ValueError, TypeError, ValidationError):
+            # A malformed id is as missing as an unknown one, as in the sync view.
+            raise Http404
+        view.check_object_permissions(request, ServiceVoucher.from_db(queryset.db, list(stamp), list(stamp.values())))
+        not_modified = get_conditional_response(
+            request, etag=view.version_etag(stamp), last_modified=int(stamp['updated_at'].timestamp()),
+        )
+        if not_modified is not None:
+            return view.with_version_headers(not_modified, stamp)
+
+        data = await cache.aget(view.detail_cache_key(stamp))
+        if data is None:
+            rows = [row async for row in view.reader.rows(queryset.filter(pk=stamp['id']))]
+            if not rows:
+                raise Http404
+            # Key by the version actually read, in case a write landed in between.
+            stamp = {key: rows[0][key] for key in ('id', 'version', 'updated_at')}
+            data = (await view.reader.aread(rows))[0]
+            await cache.aset(view.detail_cache_key(stamp), data, settings.VOUCHER_DETAIL_CACHE_TTL)
+        return view.with_version_headers(Response(data), stamp)
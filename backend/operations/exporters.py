@@ -0,0 +1,208 @@
+"""
+Streaming CSV / NDJSON exports of vouchers, itineraries and hotel vouchers.
+
+Rows are read in keyset-paginated chunks (``WHERE id > last ORDER BY id
+LIMIT n``) and encoded as they arrive, so an export of any size holds one
+chunk in memory and the first bytes go out before the table has been read.
+
+Service voucher CSV uses the column layout ``importers`` reads back, and
+service voucher NDJSON lines are the nested create payload, so both round
+trip through ``import_vouchers``.
+"""
+import csv
+import json
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import ServiceVoucher, RoomAllocation, Itinerary, ItineraryActivity, HotelVoucher
+
+FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+DEFAULT_CHUNK_SIZE = 2000
+
+VOUCHER_FIELDS = [
+    'id', 'reservation_number', 'hotel_confirmation_number', 'travel_start_date',
+    'travel_end_date', 'hotel_name', 'transfer_type', 'meal_plan', 'inclusions',
+    'arrival_details', 'departure_details', 'meeting_point',
+]
+TRAVELER_COLUMNS = {
+    'traveler__name': 'traveler_name',
+    'traveler__num_adults': 'num_adults',
+    'traveler__num_infants': 'num_infants',
+    'traveler__contact_email': 'contact_email',
+    'traveler__contact_phone': 'contact_phone',
+}
+ITINERARY_COLUMNS = [
+    'service_voucher_id', 'reservation_number', 'itinerary_id', 'day', 'date',
+    'activity_id', 'time', 'activity_type', 'description', 'location', 'notes',
+]
+ACTIVITY_FIELDS = ['id', 'itinerary_id', 'time', 'activity_type', 'description', 'location', 'notes']
+HOTEL_VOUCHER_FIELDS = [field.name for field in HotelVoucher._meta.concrete_fields]
+
+
+def keyset_chunks(queryset, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of ``values('id', *fields)`` dicts in id order, one chunk at a time."""
+    queryset = queryset.order_by('id').values('id', *[field for field in fields if field != 'id'])
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(id__gt=last)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]['id']
+
+
+def date_range(queryset, field, start=None, end=None):
+    """Restrict ``field`` to the inclusive ``start``..``end`` range when given."""
+    if start:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end:
+        queryset = queryset.filter(**{f'{field}__lte': end})
+    return queryset
+
+
+def service_voucher_records(start=None, end=None, nested=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield one dict per voucher whose travel_start_date is in range.
+
+    Flat records (``nested=False``) carry the traveler columns and rooms as
+    ``DBL:2;SGL:1``; nested records are the create payload, itinerary included.
+    """
+    queryset = date_range(ServiceVoucher.objects.all(), 'travel_start_date', start, end)
+    for chunk in keyset_chunks(queryset, VOUCHER_FIELDS + list(TRAVELER_COLUMNS), chunk_size):
+        ids = [row['id'] for row in chunk]
+        rooms = defaultdict(list)
+        for room in RoomAllocation.objects.filter(service_voucher_id__in=ids).order_by('pk').values(
+                'service_voucher_id', 'room_type', 'quantity'):
+            rooms[room.pop('service_voucher_id')].append(room)
+        itineraries = _itineraries(ids) if nested else {}
+
+        for row in chunk:
+            traveler = {column: row.pop(field) for field, column in TRAVELER_COLUMNS.items()}
+            if nested:
+                traveler['name'] = traveler.pop('traveler_name')
+                row['traveler'] = traveler
+                row['room_allocations'] = rooms[row['id']]
+                row['itinerary_items'] = itineraries.get(row['id'], [])
+            else:
+                row.update(traveler)
+                row['room_allocations'] = ';'.join(
+                    f"{room['room_type']}:{room['quantity']}" for room in rooms[row['id']]
+                )
+            yield row
+
+
+def _itineraries(voucher_ids):
+    days = list(Itinerary.objects.filter(service_voucher_id__in=voucher_ids).values(
+        'id', 'service_voucher_id', 'day', 'date'))
+    activities = defaultdict(list)
+    for activity in ItineraryActivity.objects.filter(
+            itinerary_id__in=[day['id'] for day in days]).values(*ACTIVITY_FIELDS):
+        activities[activity.pop('itinerary_id')].append(activity)
+    by_voucher = defaultdict(list)
+    for day in days:
+        day['activities'] = activities[day['id']]
+        by_voucher[day.pop('service_voucher_id')].append(day)
+    return by_voucher
+
+
+def itinerary_records(start=None, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one dict per activity (or per day without activities) with Itinerary.date in range."""
+    queryset = date_range(Itinerary.objects.all(), 'date', start, end)
+    fields = ['service_voucher_id', 'service_voucher__reservation_number', 'day', 'date']
+    for chunk in keyset_chunks(queryset, fields, chunk_size):
+        activities = defaultdict(list)
+        for activity in ItineraryActivity.objects.filter(
+                itinerary_id__in=[day['id'] for day in chunk]).values(*ACTIVITY_FIELDS):
+            activities[activity['itinerary_id']].append(activity)
+        for day in chunk:
+            base = {
+                'service_voucher_id': day['service_voucher_id'],
+                'reservation_number': day['service_voucher__reservation_number'],
+                'itinerary_id': day['id'],
+                'day': day['day'],
+                'date': day['date'],
+            }
+            for activity in activities[day['id']] or [{}]:
+                yield {
+                    **base,
+                    'activity_id': activity.get('id'),
+                    'time': activity.get('time'),
+                    'activity_type': activity.get('activity_type'),
+                    'description': activity.get('description'),
+                    'location': activity.get('location'),
+                    'notes': activity.get('notes'),
+                }
+
+
+def hotel_voucher_records(start=None, end=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one dict per hotel voucher whose check_in_date is in range."""
+    queryset = date_range(HotelVoucher.objects.all(), 'check_in_date', start, end)
+    for chunk in keyset_chunks(queryset, HOTEL_VOUCHER_FIELDS, chunk_size):
+        yield from chunk
+
+
+class _Echo:
+    """File-like object whose write() hands the encoded line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def encode_csv(records, columns):
+    """Yield the CSV header, then one encoded line per record."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for record in records:
+        yield writer.writerow(['' if record.get(column) is None else record[column] for column in columns])
+
+
+def encode_ndjson(records):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORTS = {
+    'service-vouchers': (service_voucher_records, VOUCHER_FIELDS + list(TRAVELER_COLUMNS.values()) + ['room_allocations']),
+    'itinerary': (itinerary_records, ITINERARY_COLUMNS),
+    'hotel-vouchers': (hotel_voucher_records, HOTEL_VOUCHER_FIELDS),
+}
+
+
+def export_stream(name, fmt, start=None, end=None):
+    """Encoded chunks for the ``name`` export in ``fmt`` ('csv' or 'ndjson')."""
+    records, columns = EXPORTS[name]
+    if fmt == 'csv':
+        lines = encode_csv(records(start=start, end=end), columns)
+    elif name == 'service-vouchers':
+        lines = encode_ndjson(records(start=start, end=end, nested=True))
+    else:
+        lines = encode_ndjson(records(start=start, end=end))
+    return buffered(lines)
+
+
+def buffered(lines, size=64 * 1024):
+    """
+    Group lines into ~``size`` byte blocks so the server is not asked to
+    flush every row; the first line is sent on its own straight away.
+    """
+    lines = iter(lines)
+    for line in lines:
+        yield line.encode()
+        break
+    block = []
+    length = 0
+    for line in lines:
+        block.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(block).encode()
+            block = []
+            length = 0
+    if block:
+        yield ''.join(block).encode()
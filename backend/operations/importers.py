@@ -0,0 +1,174 @@
+"""
+Streaming bulk import of service vouchers from CSV or newline-delimited JSON.
+
+Rows are read lazily, validated and written ``chunk_size`` at a time, so
+memory stays flat however large the file is. Each chunk is one transaction
+with one bulk INSERT per table (see ``services.create_service_vouchers``).
+
+NDJSON lines are the same nested payload accepted by
+``POST /api/operations/service-vouchers/``. CSV rows use the voucher column
+names plus ``traveler_name``, ``num_adults``, ``num_infants``,
+``contact_email`` and ``contact_phone``; ``room_allocations`` is written as
+``DBL:2;SGL:1`` and an optional ``itinerary_items`` column holds JSON.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from .models import ServiceVoucher
+from .serializers import ServiceVoucherImportSerializer
+from .services import create_service_vouchers
+
+FORMATS = ('csv', 'ndjson')
+DEFAULT_CHUNK_SIZE = 500
+
+TRAVELER_COLUMNS = {
+    'traveler_name': 'name',
+    'num_adults': 'num_adults',
+    'num_infants': 'num_infants',
+    'contact_email': 'contact_email',
+    'contact_phone': 'contact_phone',
+}
+
+
+def detect_format(filename):
+    """Guess the import format from a file name, defaulting to NDJSON."""
+    return 'csv' if filename.lower().endswith('.csv') else 'ndjson'
+
+
+def read_rows(stream, fmt):
+    """
+    Yield ``(row_number, payload)`` pairs from a text stream.
+
+    Rows that cannot be parsed (bad JSON) yield the ``ValueError`` in place
+    of the payload, so they are reported without stopping the import.
+    """
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), start=1):
+            try:
+                yield number, csv_row_to_payload(row)
+            except ValueError as e:
+                yield number, e
+    elif fmt == 'ndjson':
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, e
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def csv_row_to_payload(row):
+    """Turn one flat CSV row into the nested voucher payload."""
+    payload = {}
+    traveler = {}
+    for column, value in row.items():
+        if column is None or value is None or value == '':
+            continue
+        if column in TRAVELER_COLUMNS:
+            traveler[TRAVELER_COLUMNS[column]] = value
+        elif column == 'room_allocations':
+            payload[column] = [_parse_room(room) for room in value.split(';') if room.strip()]
+        elif column == 'itinerary_items':
+            payload[column] = json.loads(value)
+        else:
+            payload[column] = value
+    payload['traveler'] = traveler
+    return payload
+
+
+def _parse_room(value):
+    room_type, _, quantity = value.strip().partition(':')
+    room = {'room_type': room_type.strip()}
+    if quantity:
+        room['quantity'] = quantity.strip()
+    return room
+
+
+def import_vouchers(rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Validate and write ``(row_number, payload)`` pairs in chunks.
+
+    Yields one result dict per row, in input order:
+    ``{'row': 3, 'status': 'created', 'id': 42, 'reservation_number': ...}`` or
+    ``{'row': 4, 'status': 'error', 'errors': {...}}``.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield from _import_chunk(chunk)
+
+
+def _import_chunk(chunk):
+    results = {}
+    valid = []
+    # Building a serializer's fields costs far more than validating a row,
+    # so one instance validates the whole chunk, as ListSerializer does.
+    validator = ServiceVoucherImportSerializer()
+    for number, payload in chunk:
+        if isinstance(payload, Exception):
+            results[number] = _error(number, {'non_field_errors': [f"Could not parse row: {payload}"]})
+            continue
+        try:
+            valid.append((number, validator.run_validation(payload)))
+        except ValidationError as exc:
+            results[number] = _error(number, as_serializer_error(exc))
+
+    # reservation_number must be unique across the file and the database.
+    taken = set(ServiceVoucher.objects.filter(
+        reservation_number__in=[data['reservation_number'] for _, data in valid]
+    ).values_list('reservation_number', flat=True))
+    unique = []
+    for number, data in valid:
+        if data['reservation_number'] in taken:
+            results[number] = _error(number, {
+                'reservation_number': ['service voucher with this reservation number already exists.']
+            })
+        else:
+            taken.add(data['reservation_number'])
+            unique.append((number, data))
+
+    for number, voucher in _write(unique):
+        results[number] = voucher
+
+    for number, _ in chunk:
+        yield results[number]
+
+
+def _write(rows):
+    """Bulk insert a chunk; fall back to row-at-a-time if a concurrent write collides."""
+    if not rows:
+        return []
+    try:
+        with transaction.atomic():
+            vouchers = create_service_vouchers([data for _, data in rows])
+    except IntegrityError:
+        if len(rows) == 1:
+            number, _ = rows[0]
+            return [(number, _error(number, {'non_field_errors': ['Conflicts with an existing record.']}))]
+        return [result for row in rows for result in _write([row])]
+    return [(number, _created(number, voucher)) for (number, _), voucher in zip(rows, vouchers)]
+
+
+def _created(number, voucher):
+    return {'row': number, 'status': 'created', 'id': voucher.pk,
+            'reservation_number': voucher.reservation_number}
+
+
+def _error(number, errors):
+    return {'row': number, 'status': 'error', 'errors': errors}
+
+
+def text_stream(binary):
+    """Wrap an uploaded (binary) file so rows can be read lazily as text."""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
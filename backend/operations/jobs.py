@@ -0,0 +1,313 @@
+"""
+Background jobs, queued in the database and run by ``manage.py run_jobs``.
+
+A view that would otherwise hold the request for a long time calls
+``enqueue`` and answers ``202`` with the ``Job``; the client follows it at
+``/api/operations/jobs/<id>/``. Workers are plain processes, with no
+broker. Each one claims the oldest ready job in a short transaction,
+runs its handler outside of it and records the result.
+
+* Concurrency: ``JOB_CONCURRENCY`` caps how many jobs of a kind run at
+  once across all workers (on top of the number of workers). The cap is
+  checked and the job claimed in one write transaction. SQLite runs those
+  one at a time (``BEGIN IMMEDIATE``, see ``core.sqlite3``); PostgreSQL
+  takes a transaction-level advisory lock.
+* Retries: a handler that raises is retried after
+  ``JOB_RETRY_DELAY * 2 ** (attempts - 1)`` seconds (capped at
+  ``JOB_RETRY_MAX_DELAY``, with jitter) until it reaches its
+  ``max_attempts``. After that the job is FAILED with the traceback.
+* Orphans: while a job runs, a thread refreshes its heartbeat. A RUNNING
+  job whose heartbeat is older than ``JOB_LEASE_SECONDS`` (its worker
+  died) goes back to the queue as a failed attempt.
+* Progress: handlers call ``context.report(done, total, message)``. If
+  the job was cancelled or taken over in the meantime, ``report`` raises
+  ``JobAbandoned`` and the handler stops.
+
+Handlers are registered with ``@handler(kind)`` and receive the job's
+context and its ``params`` as keyword arguments. They return a
+JSON-serializable result. Files they produce go under ``JOB_FILES_DIR``.
+"""
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import zipfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import exporters, pdf
+from .importers import import_vouchers, read_rows
+from .models import Job, ServiceVoucher
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+# Any stable 64-bit number; names the PostgreSQL advisory lock taken while claiming.
+CLAIM_LOCK_ID = 0x6A6F6273
+
+
+class JobAbandoned(Exception):
+    """The job was cancelled or taken over by another worker while it ran."""
+
+
+class Handler:
+    def __init__(self, function, max_attempts, concurrency):
+        self.function = function
+        self.max_attempts = max_attempts
+        self.concurrency = concurrency
+
+
+def handler(kind, max_attempts=3, concurrency=None):
+    """Register the decorated function as the handler for ``kind`` jobs."""
+    def register(function):
+        HANDLERS[kind] = Handler(function, max_attempts, concurrency)
+        return function
+    return register
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def concurrency_limits():
+    """``{kind: max running at once}``; ``JOB_CONCURRENCY`` overrides the handlers' defaults."""
+    limits = {kind: entry.concurrency for kind, entry in HANDLERS.items() if entry.concurrency}
+    limits.update(_setting('JOB_CONCURRENCY', {}))
+    return limits
+
+
+def files_dir():
+    return Path(_setting('JOB_FILES_DIR', Path(settings.MEDIA_ROOT) / 'jobs'))
+
+
+def job_file(job, name):
+    """Path for a file produced by (or uploaded for) ``job``, creating the directory."""
+    directory = files_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f'{job.pk}-{name}'
+
+
+def enqueue(kind, params=None, user=None, delay=0):
+    """Queue a ``kind`` job with ``params`` (JSON-serializable) to run in ``delay`` seconds."""
+    if kind not in HANDLERS:
+        raise ValueError(f'No handler registered for {kind!r} jobs')
+    return Job.objects.create(
+        kind=kind, params=params or {}, max_attempts=HANDLERS[kind].max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay), created_by=user,
+    )
+
+
+def backoff(attempts):
+    """Seconds to wait before retrying after ``attempts`` failed attempts."""
+    delay = min(_setting('JOB_RETRY_MAX_DELAY', 3600), _setting('JOB_RETRY_DELAY', 30) * 2 ** (attempts - 1))
+    # Jitter, so jobs that failed together do not all retry together.
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _retry_or_fail(job, error, now):
+    if job.attempts < job.max_attempts:
+        return {'status': Job.QUEUED, 'run_after': now + timedelta(seconds=backoff(job.attempts)),
+                'error': error, 'worker': '', 'heartbeat_at': None}
+    return {'status': Job.FAILED, 'error': error, 'finished_at': now, 'heartbeat_at': None}
+
+
+def requeue_orphans(now=None):
+    """Retry (or fail) RUNNING jobs whose worker stopped sending heartbeats; returns how many."""
+    now = now or timezone.now()
+    expired = now - timedelta(seconds=_setting('JOB_LEASE_SECONDS', 300))
+    orphans = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=expired)
+    count = 0
+    for job in orphans:
+        error = f'Worker {job.worker} stopped responding'
+        count += Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+            **_retry_or_fail(job, error, now))
+    return count
+
+
+def claim(worker):
+    """Mark the oldest ready job whose kind is under its concurrency limit as RUNNING on ``worker``."""
+    now = timezone.now()
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CLAIM_LOCK_ID])
+        requeue_orphans(now)
+        running = dict(
+            Job.objects.filter(status=Job.RUNNING).order_by().values_list('kind').annotate(Count('id'))
+        )
+        full = [kind for kind, limit in concurrency_limits().items() if running.get(kind, 0) >= limit]
+        job = (
+            Job.objects.filter(status=Job.QUEUED, run_after__lte=now, kind__in=list(HANDLERS))
+            .exclude(kind__in=full).order_by('run_after', 'id').first()
+        )
+        if job is None:
+            return None
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.worker = worker
+        job.heartbeat_at = now
+        job.started_at = job.started_at or now
+        job.save(update_fields=['status', 'attempts', 'worker', 'heartbeat_at', 'started_at'])
+    return job
+
+
+class JobContext:
+    """What a handler gets besides its params: the job and a way to report progress."""
+
+    def __init__(self, job):
+        self.job = job
+        self.abandoned = threading.Event()
+        self._reported = 0.0
+
+    def _update(self, **fields):
+        updated = Job.objects.filter(pk=self.job.pk, status=Job.RUNNING, worker=self.job.worker).update(**fields)
+        if not updated:
+            self.abandoned.set()
+        return updated
+
+    def heartbeat(self):
+        self._update(heartbeat_at=timezone.now())
+
+    def report(self, done, total=None, message=''):
+        """Record progress (at most once per ``JOB_PROGRESS_INTERVAL`` seconds, and always at the end)."""
+        if self.abandoned.is_set():
+            raise JobAbandoned
+        finished = total is not None and done >= total
+        if not finished and time.monotonic() - self._reported < _setting('JOB_PROGRESS_INTERVAL', 1.0):
+            return
+        self._reported = time.monotonic()
+        if not self._update(progress=done, total=total, message=message[:200], heartbeat_at=timezone.now()):
+            raise JobAbandoned
+
+
+def _heartbeats(context, stop):
+    interval = _setting('JOB_LEASE_SECONDS', 300) / 3
+    try:
+        while not stop.wait(interval):
+            context.heartbeat()
+    finally:
+        connection.close()
+
+
+def run(job):
+    """Run a claimed ``job`` to completion, recording its result, retry or failure."""
+    context = JobContext(job)
+    stop = threading.Event()
+    beating = threading.Thread(target=_heartbeats, args=(context, stop), daemon=True)
+    beating.start()
+    started = time.monotonic()
+    try:
+        result = HANDLERS[job.kind].function(context, **job.params)
+    except JobAbandoned:
+        logger.info("Job %s (%s) was cancelled while running", job.pk, job.kind)
+        return
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %s", job.pk, job.kind, job.attempts)
+        context._update(**_retry_or_fail(job, traceback.format_exc(), timezone.now()))
+        return
+    finally:
+        stop.set()
+        beating.join()
+    context._update(status=Job.SUCCEEDED, result=result, error='', finished_at=timezone.now(), heartbeat_at=None)
+    logger.info("Job %s (%s) succeeded in %.1fs", job.pk, job.kind, time.monotonic() - started)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def work(burst=False, max_jobs=None, poll_interval=1.0, stop=None):
+    """
+    Claim and run jobs until ``stop`` is set, ``max_jobs`` have run or (with
+    ``burst``) nothing is ready; returns the number of jobs run.
+    """
+    worker = worker_name()
+    stop = stop or threading.Event()
+    done = 0
+    while not stop.is_set() and (max_jobs is None or done < max_jobs):
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            stop.wait(poll_interval)
+            continue
+        run(job)
+        done += 1
+    return done
+
+
+# Handlers
+
+
+def _date(value):
+    return parse_date(value) if value else None
+
+
+@handler('import', max_attempts=1, concurrency=1)
+def import_file(context, path, fmt, chunk_size, name=''):
+    """
+    Import an uploaded voucher file. Never retried: rows created by a failed
+    attempt would come back as duplicate reservations. Every row's result
+    goes to an NDJSON report file.
+    """
+    # Jobs queued before the limit, or from elsewhere, are held to it too.
+    chunk_size = min(chunk_size, settings.IMPORT_MAX_CHUNK_SIZE)
+    created = failed = 0
+    report_path = job_file(context.job, 'import-report.ndjson')
+    with open(path, encoding='utf-8-sig', newline='') as source, open(report_path, 'w') as report:
+        for result in import_vouchers(read_rows(source, fmt), chunk_size):
+            if result['status'] == 'created':
+                created += 1
+            else:
+                failed += 1
+            report.write(json.dumps(result) + '\n')
+            if (created + failed) % chunk_size == 0:
+                context.report(created + failed, message=f'{failed} rows failed so far')
+    os.remove(path)
+    context.report(created + failed, created + failed)
+    return {'name': name, 'created': created, 'failed': failed, 'file': report_path.name}
+
+
+@handler('export', concurrency=2)
+def export_file(context, name, fmt, start=None, end=None):
+    """Write the ``name`` export to a file for download."""
+    path = job_file(context.job, f'{name}.{fmt}')
+    size = 0
+    with open(path, 'wb') as output:
+        for block in exporters.export_stream(name, fmt, start=_date(start), end=_date(end)):
+            output.write(block)
+            size += len(block)
+            context.report(size, message='bytes written')
+    context.report(size, size, message='bytes written')
+    return {'file': path.name, 'size': size}
+
+
+@handler('pdf-batch', concurrency=2)
+def pdf_batch(context, ids):
+    """Render the service vouchers ``ids`` as PDFs, zipped together."""
+    from .serializers import ServiceVoucherSerializer
+
+    path = job_file(context.job, 'service-vouchers.zip')
+    cache = pdf.get_cache()
+    done = 0
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as archive:
+        for offset in range(0, len(ids), 100):
+            vouchers = ServiceVoucher.objects.for_api().filter(pk__in=ids[offset:offset + 100]).order_by('id')
+            for voucher in vouchers:
+                data = ServiceVoucherSerializer(voucher).data
+                key = pdf.content_hash('service-voucher', data)
+                with cache.open_or_render(key, 'service-voucher', data) as rendered:
+                    archive.writestr(f'service-voucher-{voucher.reservation_number}.pdf', rendered.read())
+                done += 1
+            context.report(min(offset + 100, len(ids)), len(ids), message=f'{done} PDFs rendered')
+    return {'file': path.name, 'size': path.stat().st_size, 'rendered': done, 'missing': len(ids) - done}
@@ -1,83 +1,238 @@
-from django.core.management.base import BaseCommand
-from operations.models import ServiceVoucher, Traveler, Itinerary, RoomAllocation, ItineraryActivity, HotelVoucher
-from faker import Faker
+import multiprocessing
 import random
-from datetime import timedelta
+import time
+import uuid
+from argparse import ArgumentTypeError
+from bisect import bisect
+from datetime import date, time as clock, timedelta
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from faker import Faker
+from operations import occupancy, search, stats
+from operations.models import ServiceVoucher, Traveler, Itinerary, RoomAllocation, ItineraryActivity, HotelVoucher
+from operations.services import insert_returning_pks
+
+# Vouchers generated from one random stream and written in one transaction.
+# Voucher ``n`` always comes from block ``n // BLOCK``, so the data depends
+# only on the seed and the options, not on --processes or earlier runs.
+BLOCK = 1000
+TRANSFER_TYPES = [code for code, _ in ServiceVoucher.TRANSFER_TYPES]
+MEAL_PLANS = [code for code, _ in ServiceVoucher.MEAL_PLANS]
+ROOM_TYPES = [code for code, _ in RoomAllocation.ROOM_TYPES]
+ACTIVITY_TYPES = [code for code, _ in ItineraryActivity.ACTIVITY_TYPES]
 
-class Command(BaseCommand):
-    help = 'Generate fake service vouchers with related data'
 
-    def handle(self, *args, **kwargs):
+def span(value):
+    """``'2-5'`` -> (2, 5), ``'3'`` -> (3, 3)."""
+    low, _, high = value.partition('-')
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise ArgumentTypeError(f'{value!r} is not a number or a MIN-MAX range')
+    if not 0 <= low <= high:
+        raise ArgumentTypeError(f'{value!r} must satisfy 0 <= MIN <= MAX')
+    return low, high
+
+
+class Pools:
+    """
+    Text drawn from Faker once, up front (Faker is far too slow to call per
+    row at millions of rows); rows pick from these lists.
+    """
+
+    def __init__(self, seed, hotels, hotel_skew):
         fake = Faker()
+        fake.seed_instance(seed)
+        self.names = [fake.name() for _ in range(5000)]
+        self.phones = [fake.phone_number()[:20] for _ in range(1000)]
+        self.domains = [fake.free_email_domain() for _ in range(50)]
+        self.addresses = [fake.address().replace('\n', ', ') for _ in range(1000)]
+        self.cities = [fake.city() for _ in range(500)]
+        self.sentences = [fake.sentence(nb_words=10) for _ in range(2000)]
+        self.short_texts = [fake.text(max_nb_chars=100) for _ in range(500)]
+        self.long_texts = [fake.text(max_nb_chars=200) for _ in range(500)]
+        self.hotels = []
+        seen = set()
+        while len(self.hotels) < hotels:
+            name = f'{fake.last_name()} {fake.random_element(["Hotel", "Resort", "Suites", "Inn", "Palace"])}'
+            if name in seen:
+                name = f'{name} {len(self.hotels)}'
+            seen.add(name)
+            self.hotels.append(name)
+        self.hotel_addresses = [fake.address().replace('\n', ', ') for _ in self.hotels]
+        # Zipf-like popularity: the hotel of rank r gets weight 1 / r ** skew.
+        self.hotel_weights = list(accumulate(1 / rank ** hotel_skew for rank in range(1, hotels + 1)))
+
+    def hotel(self, rng):
+        index = bisect(self.hotel_weights, rng.random() * self.hotel_weights[-1])
+        return min(index, len(self.hotels) - 1)
+
+
+# Set in the parent before the workers fork, so they share it.
+_pools = None
 
-        for _ in range(15):
-            # Create a fake traveler
-            traveler = Traveler.objects.create(
-                name=fake.name(),
-                num_adults=random.randint(1, 4),
-                num_infants=random.randint(0, 2),
-                contact_email=fake.email(),
-                contact_phone=fake.phone_number()
-            )
-
-            # Create a fake service voucher
-            start_date = fake.date_this_year()
-            end_date = start_date + timedelta(days=random.randint(1, 10))
-
-            voucher = ServiceVoucher.objects.create(
-                traveler=traveler,
-                reservation_number=fake.unique.bothify(text='???-#####'),
-                hotel_confirmation_number=fake.unique.bothify(text='CONF-#####'),
-                travel_start_date=start_date,
-                travel_end_date=end_date,
-                hotel_name=fake.company(),
-                transfer_type=random.choice(['PRIVATE', 'SHARED', 'GROUP']),
-                meal_plan=random.choice(['BB', 'HB', 'FB', 'AI']),
-                inclusions=fake.text(max_nb_chars=200),
-                arrival_details=fake.text(max_nb_chars=100),
-                departure_details=fake.text(max_nb_chars=100),
-                meeting_point=fake.address(),
-            )
-
-            # Create fake room allocations
-            for room_type in ['SGL', 'DBL', 'TWN', 'TPL']:
-                if random.choice([True, False]):  # Randomly decide if this room type is included
-                    RoomAllocation.objects.create(
-                        service_voucher=voucher,
-                        room_type=room_type,
-                        quantity=random.randint(1, 3)
-                    )
-
-            # Create fake itineraries and activities
-            for day in range(1, random.randint(2, 5)):
-                itinerary = Itinerary.objects.create(
-                    service_voucher=voucher,
-                    day=day,
-                    date=start_date + timedelta(days=day-1)
+
+def generate_block(task):
+    """Create vouchers ``start``..``stop - 1`` (all inside block ``block``); returns the rows written."""
+    block, start, stop, options = task
+    rng = random.Random(f"{options['seed']}:{block}")
+    first = block * BLOCK
+    prefix = f"GEN{options['seed']}"
+    travelers, vouchers, hotel_vouchers, nested = [], [], [], []
+    for number in range(first, stop):
+        name = rng.choice(_pools.names)
+        traveler = Traveler(
+            name=name,
+            num_adults=rng.randint(1, 4),
+            num_infants=rng.choice((0, 0, 0, 1, 2)),
+            contact_email=f"{name.split()[-1].lower()}{number}@{rng.choice(_pools.domains)}",
+            contact_phone=rng.choice(_pools.phones),
+        )
+        start_date = options['start_date'] + timedelta(days=rng.randrange(options['span']))
+        days = rng.randint(*options['days'])
+        end_date = start_date + timedelta(days=max(days, 1))
+        hotel = _pools.hotel(rng)
+        voucher = ServiceVoucher(
+            reservation_number=f'{prefix}-{number:08d}',
+            hotel_confirmation_number=f'CONF-{number:08d}',
+            travel_start_date=start_date,
+            travel_end_date=end_date,
+            hotel_name=_pools.hotels[hotel],
+            transfer_type=rng.choice(TRANSFER_TYPES),
+            meal_plan=rng.choice(MEAL_PLANS),
+            inclusions=rng.choice(_pools.long_texts),
+            arrival_details=rng.choice(_pools.short_texts),
+            departure_details=rng.choice(_pools.short_texts),
+            meeting_point=rng.choice(_pools.addresses),
+        )
+        rooms = [
+            RoomAllocation(room_type=room_type, quantity=rng.randint(1, 3))
+            for room_type in ROOM_TYPES if rng.random() < 0.5
+        ]
+        itinerary = []
+        for day in range(1, days + 1):
+            activities = [
+                ItineraryActivity(
+                    time=clock(rng.randint(6, 21), rng.choice((0, 15, 30, 45))),
+                    activity_type=rng.choice(ACTIVITY_TYPES),
+                    description=rng.choice(_pools.sentences),
+                    location=rng.choice(_pools.cities),
+                    notes=rng.choice(_pools.short_texts)[:50],
                 )
+                for _ in range(rng.randint(*options['activities']))
+            ]
+            itinerary.append((Itinerary(day=day, date=start_date + timedelta(days=day - 1)), activities))
+        hotel_voucher = HotelVoucher(
+            hotel_name=voucher.hotel_name,
+            hotel_address=_pools.hotel_addresses[hotel],
+            guest_name=name,
+            number_of_rooms=rng.randint(1, 5),
+            check_in_date=start_date,
+            check_out_date=end_date,
+            number_of_nights=(end_date - start_date).days,
+            confirmation_number=str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        )
+        # Vouchers before ``start`` already exist; their draws above keep
+        # the stream aligned for the ones after.
+        if number >= start:
+            travelers.append(traveler)
+            vouchers.append(voucher)
+            hotel_vouchers.append(hotel_voucher)
+            nested.append((rooms, itinerary))
+
+    batch_size = options['batch_size']
+    with transaction.atomic():
+        # Travelers have no natural key; without RETURNING they are saved one by one.
+        insert_returning_pks(Traveler, travelers, batch_size=batch_size)
+        for traveler, voucher in zip(travelers, vouchers):
+            voucher.traveler = traveler
+        insert_returning_pks(ServiceVoucher, vouchers, key_fields=['reservation_number'], batch_size=batch_size)
+        rooms, days = [], []
+        for voucher, (voucher_rooms, itinerary) in zip(vouchers, nested):
+            for room in voucher_rooms:
+                room.service_voucher = voucher
+                rooms.append(room)
+            for day, _ in itinerary:
+                day.service_voucher = voucher
+                days.append(day)
+        RoomAllocation.objects.bulk_create(rooms, batch_size=batch_size)
+        insert_returning_pks(Itinerary, days, key_fields=['service_voucher_id', 'day'], batch_size=batch_size)
+        activities = []
+        for _, itinerary in nested:
+            for day, day_activities in itinerary:
+                for activity in day_activities:
+                    activity.itinerary = day
+                    activities.append(activity)
+        ItineraryActivity.objects.bulk_create(activities, batch_size=batch_size)
+        HotelVoucher.objects.bulk_create(hotel_vouchers, batch_size=batch_size)
+    return len(travelers) * 3 + len(rooms) + len(days) + len(activities)
+
+
+def _close_connections():
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate fake service vouchers (with travelers, rooms, itinerary days and activities) and hotel '
+        'vouchers. The same --seed and options always produce the same vouchers; running again continues '
+        'the sequence.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=15, help='Service vouchers to add')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seeds the data; reservation numbers are GEN<seed>-<n>')
+        parser.add_argument('--days', type=span, default=(1, 4), help='Itinerary days per voucher, MIN-MAX')
+        parser.add_argument('--activities', type=span, default=(1, 3), help='Activities per day, MIN-MAX')
+        parser.add_argument('--hotels', type=int, default=200, help='Number of distinct hotels')
+        parser.add_argument('--hotel-skew', type=float, default=0.0,
+                            help='Zipf exponent of hotel popularity; 0 spreads bookings evenly')
+        parser.add_argument('--start-date', type=date.fromisoformat, default=date(2025, 1, 1),
+                            help='First travel start date (YYYY-MM-DD)')
+        parser.add_argument('--span', type=int, default=365, help='Days over which start dates are spread')
+        parser.add_argument('--batch-size', type=int, help='Rows per INSERT (default: as many as the database allows)')
+        parser.add_argument('--processes', type=int, default=1, help='Generate blocks of vouchers in parallel')
+        parser.add_argument('--skip-derived', action='store_true',
+                            help='Do not rebuild the search index and occupancy table afterwards')
+
+    def handle(self, *args, **options):
+        global _pools
+        for name in ('count', 'hotels', 'span', 'processes'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be at least 1")
+
+        started = time.monotonic()
+        prefix = f"GEN{options['seed']}-"
+        first = ServiceVoucher.objects.filter(reservation_number__startswith=prefix).count()
+        stop = first + options['count']
+        _pools = Pools(options['seed'], options['hotels'], options['hotel_skew'])
+        tasks = [
+            (block, max(first, block * BLOCK), min(stop, (block + 1) * BLOCK), options)
+            for block in range(first // BLOCK, (stop - 1) // BLOCK + 1)
+        ]
+
+        if options['processes'] == 1:
+            rows = sum(map(generate_block, tasks))
+        else:
+            # SQLite runs one writer at a time; the workers overlap generating
+            # a block with another one's INSERTs.
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(options['processes'], initializer=_close_connections) as pool:
+                rows = sum(pool.imap_unordered(generate_block, tasks))
+        generated = time.monotonic() - started
+
+        if not options['skip_derived']:
+            with transaction.atomic():
+                search.rebuild()
+                occupancy.rebuild()
+            stats.invalidate()
 
-                # Create fake itinerary activities
-                for _ in range(random.randint(1, 3)):  # Randomly create 1 to 3 activities
-                    ItineraryActivity.objects.create(
-                        itinerary=itinerary,
-                        time=fake.time(),
-                        activity_type=random.choice(['TRANSFER', 'TOUR', 'CHECKIN', 'CHECKOUT', 'MEAL', 'FREE', 'OTHER']),
-                        description=fake.sentence(nb_words=10),
-                        location=fake.city(),
-                        notes=fake.text(max_nb_chars=50)
-                    )
-
-            # Create fake hotel voucher
-            hotel_voucher = HotelVoucher(
-                hotel_name=voucher.hotel_name,
-                hotel_address=fake.address(),
-                guest_name=traveler.name,
-                number_of_rooms=random.randint(1, 5),
-                check_in_date=start_date,
-                check_out_date=end_date,
-                number_of_nights=(end_date - start_date).days,
-                confirmation_number=fake.uuid4()
-            )
-            hotel_voucher.save()
-
-        self.stdout.write(self.style.SUCCESS('Successfully created 15 fake service vouchers with travelers, room allocations, itineraries, activities, and hotel vouchers.'))
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {options['count']} fake service vouchers ({prefix}{first:08d} to {prefix}{stop - 1:08d}), "
+            f"{rows} rows in all, in {generated:.1f}s ({rows / generated:.0f} rows/s); {elapsed:.1f}s in total."
+        ))
@@ -0,0 +1,50 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from operations.importers import DEFAULT_CHUNK_SIZE, FORMATS, detect_format, import_vouchers, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import service vouchers from a CSV or NDJSON file, streaming it in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension (.csv or NDJSON)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Rows validated and written per transaction')
+        parser.add_argument('--report', help='Write the per-row results as NDJSON to this file')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        path = options['path']
+        fmt = options['format'] or ('ndjson' if path == '-' else detect_format(path))
+
+        source = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        report = open(options['report'], 'w') if options['report'] else None
+        created = failed = 0
+        started = time.monotonic()
+        try:
+            for result in import_vouchers(read_rows(source, fmt), options['chunk_size']):
+                if result['status'] == 'created':
+                    created += 1
+                else:
+                    failed += 1
+                    if report is None:
+                        self.stderr.write(f"Row {result['row']}: {json.dumps(result['errors'])}")
+                if report is not None:
+                    report.write(json.dumps(result) + '\n')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if report is not None:
+                report.close()
+
+        elapsed = time.monotonic() - started
+        rate = (created + failed) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} service vouchers, {failed} rows failed '
+            f'({elapsed:.1f}s, {rate:.0f} rows/s).'
+        ))
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from operations import occupancy
+
+
+class Command(BaseCommand):
+    help = 'Recompute the hotel room-night occupancy table from the service vouchers'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            count = occupancy.rebuild()
+        self.stdout.write(f'Rebuilt {count} hotel room-nights in {time.monotonic() - started:.1f}s.')
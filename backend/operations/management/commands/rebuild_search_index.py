@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from operations import search
+
+
+class Command(BaseCommand):
+    help = 'Repopulate the voucher search index from the voucher tables'
+
+    def handle(self, *args, **options):
+        if not search.backend():
+            raise CommandError('Search is only supported on SQLite and PostgreSQL')
+        started = time.monotonic()
+        with transaction.atomic():
+            count = search.rebuild()
+        self.stdout.write(f'Indexed {count} vouchers in {time.monotonic() - started:.1f}s.')
@@ -0,0 +1,56 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from operations import jobs
+
+
+def _work(options):
+    """Worker loop for one process; SIGTERM/SIGINT stop it after the job in hand."""
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+    return jobs.work(
+        burst=options['burst'], max_jobs=options['max_jobs'], poll_interval=options['poll_interval'], stop=stop,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs (imports, exports, PDF batches) from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes to run')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is ready instead of waiting for more (e.g. from cron)')
+        parser.add_argument('--max-jobs', type=int, help='Exit each worker after this many jobs')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+                            help='Seconds between queue checks while idle')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        if options['workers'] == 1:
+            done = _work(options)
+            self.stdout.write(f'Ran {done} jobs.')
+            return
+
+        # Children must not share the parent's database connections.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=_work, args=(options,)) for _ in range(options['workers'])]
+        for process in processes:
+            process.start()
+
+        def forward(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()  # SIGTERM: finish the current job, then exit
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, forward)
+        for process in processes:
+            process.join()
+        self.stdout.write(f'{options["workers"]} workers stopped.')
@@ -0,0 +1,95 @@
+"""
+Daily operations manifest: every itinerary activity on a given date.
+
+One query joins the day's activities to their itinerary day, voucher and
+traveler. It starts from the ``Itinerary.date`` index and reaches the
+activities through the ``(itinerary, time)`` index (see ``models``), so the
+cost follows the size of the day rather than of the tables. Activities are
+grouped by activity type (in ``ACTIVITY_TYPES`` order), then by time.
+"""
+from .models import ServiceVoucher, ItineraryActivity
+
+ACTIVITY_TYPE_LABELS = dict(ItineraryActivity.ACTIVITY_TYPES)
+TRANSFER_TYPE_LABELS = dict(ServiceVoucher.TRANSFER_TYPES)
+
+FIELDS = {
+    'id': 'id',
+    'time': 'time',
+    'activity_type': 'activity_type',
+    'description': 'description',
+    'location': 'location',
+    'notes': 'notes',
+    'day': 'itinerary__day',
+    'service_voucher': 'itinerary__service_voucher_id',
+    'reservation_number': 'itinerary__service_voucher__reservation_number',
+    'hotel_name': 'itinerary__service_voucher__hotel_name',
+    'meeting_point': 'itinerary__service_voucher__meeting_point',
+    'transfer_type': 'itinerary__service_voucher__transfer_type',
+    'guest': 'itinerary__service_voucher__traveler__name',
+    'adults': 'itinerary__service_voucher__traveler__num_adults',
+    'infants': 'itinerary__service_voucher__traveler__num_infants',
+}
+CSV_COLUMNS = [
+    'activity_type', 'time', 'reservation_number', 'guest', 'adults', 'infants', 'hotel_name',
+    'meeting_point', 'transfer_type', 'description', 'location', 'notes', 'day', 'service_voucher', 'id',
+]
+
+
+def activities(day):
+    """The activities on ``day`` as flat dicts (``FIELDS``), ordered by type then time."""
+    rows = ItineraryActivity.objects.filter(itinerary__date=day).order_by('time', 'id').values_list(
+        *FIELDS.values())
+    order = {code: position for position, (code, _) in enumerate(ItineraryActivity.ACTIVITY_TYPES)}
+    records = []
+    for row in rows:
+        record = dict(zip(FIELDS, row))
+        record['time'] = record['time'].isoformat()
+        record['transfer_type_display'] = TRANSFER_TYPE_LABELS.get(record['transfer_type'], record['transfer_type'])
+        records.append(record)
+    # Stable, so each type keeps the time order of the query.
+    records.sort(key=lambda record: order.get(record['activity_type'], len(order)))
+    return records
+
+
+def build(day):
+    """
+    The manifest for ``day``: totals, then activity-type groups of time slots.
+
+    Passengers (``adults``, ``infants``) are counted once per voucher, in the
+    totals and in each group, however many of its activities fall there.
+    """
+    groups = []
+    vouchers = {}  # service voucher id -> (adults, infants)
+    group_vouchers = set()
+    for record in activities(day):
+        vouchers[record['service_voucher']] = (record['adults'], record['infants'])
+        if not groups or groups[-1]['activity_type'] != record['activity_type']:
+            groups.append({
+                'activity_type': record['activity_type'],
+                'activity_type_display': ACTIVITY_TYPE_LABELS.get(record['activity_type'], record['activity_type']),
+                'activities': 0,
+                'adults': 0,
+                'infants': 0,
+                'slots': [],
+            })
+            group_vouchers = set()
+        group = groups[-1]
+        group['activities'] += 1
+        if record['service_voucher'] not in group_vouchers:
+            group_vouchers.add(record['service_voucher'])
+            group['adults'] += record['adults']
+            group['infants'] += record['infants']
+        if not group['slots'] or group['slots'][-1]['time'] != record['time']:
+            group['slots'].append({'time': record['time'], 'activities': []})
+        group['slots'][-1]['activities'].append(record)
+
+    return {
+        'date': day.isoformat(),
+        'totals': {
+            'activities': sum(group['activities'] for group in groups),
+            'vouchers': len(vouchers),
+            'adults': sum(adults for adults, _ in vouchers.values()),
+            'infants': sum(infants for _, infants in vouchers.values()),
+        },
+        'groups': groups,
+    }
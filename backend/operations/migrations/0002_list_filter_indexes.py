@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hotelvoucher',
+            index=models.Index(fields=['check_in_date', 'check_out_date'], name='hv_check_in_out_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hotelvoucher',
+            index=models.Index(fields=['check_out_date'], name='hv_check_out_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hotelvoucher',
+            index=models.Index(fields=['hotel_name', 'check_in_date'], name='hv_hotel_check_in_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicevoucher',
+            index=models.Index(fields=['travel_start_date'], name='sv_start_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicevoucher',
+            index=models.Index(fields=['travel_end_date'], name='sv_end_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicevoucher',
+            index=models.Index(fields=['hotel_name', 'travel_start_date'], name='sv_hotel_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicevoucher',
+            index=models.Index(fields=['transfer_type', 'travel_start_date'], name='sv_transfer_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servicevoucher',
+            index=models.Index(fields=['meal_plan', 'travel_start_date'], name='sv_meal_start_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# The search table as ``operations.search`` first defined it, filled from
+# the voucher tables as they are at this migration. Kept inline so later
+# changes to the models or to ``search`` cannot break a fresh migrate.
+SERVICE_VOUCHER_ROWS = (
+    "SELECT v.id * 2, 'service-voucher', v.id, v.travel_start_date, "
+    "v.reservation_number || ' ' || v.hotel_confirmation_number, t.name, v.hotel_name "
+    "FROM operations_servicevoucher v INNER JOIN operations_traveler t ON t.id = v.traveler_id"
+)
+HOTEL_VOUCHER_ROWS = (
+    "SELECT id * 2 + 1, 'hotel-voucher', id, check_in_date, confirmation_number, guest_name, hotel_name "
+    "FROM operations_hotelvoucher"
+)
+COLUMNS = 'rowid, kind, object_id, date, reference, guest, hotel'
+
+INSTALL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS operations_search USING fts5("
+        "kind UNINDEXED, object_id UNINDEXED, date UNINDEXED, reference, guest, hotel, "
+        "tokenize='trigram')",
+    ],
+    'postgresql': [
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        "CREATE TABLE IF NOT EXISTS operations_search ("
+        "rowid bigint PRIMARY KEY, kind varchar(20) NOT NULL, object_id bigint NOT NULL, date date, "
+        "reference text NOT NULL, guest text NOT NULL, hotel text NOT NULL, "
+        "document text GENERATED ALWAYS AS (reference || ' ' || guest || ' ' || hotel) STORED)",
+        'CREATE INDEX IF NOT EXISTS operations_search_trgm ON operations_search '
+        'USING gin (document gin_trgm_ops)',
+    ],
+}
+
+
+def install(apps, schema_editor):
+    statements = INSTALL.get(schema_editor.connection.vendor)
+    if statements:
+        for sql in statements:
+            schema_editor.execute(sql)
+        schema_editor.execute('DELETE FROM operations_search')
+        schema_editor.execute(f'INSERT INTO operations_search ({COLUMNS}) {SERVICE_VOUCHER_ROWS}')
+        schema_editor.execute(f'INSERT INTO operations_search ({COLUMNS}) {HOTEL_VOUCHER_ROWS}')
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor in INSTALL:
+        schema_editor.execute('DROP TABLE IF EXISTS operations_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0002_list_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
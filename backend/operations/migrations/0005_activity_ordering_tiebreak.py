@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:53
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0004_servicevoucher_version'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='itineraryactivity',
+            options={'ordering': ['time', 'id'], 'verbose_name_plural': 'Itinerary Activities'},
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0005_activity_ordering_tiebreak'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='itinerary',
+            index=models.Index(fields=['date'], name='itin_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='itineraryactivity',
+            index=models.Index(fields=['itinerary', 'time'], name='activity_itinerary_time_idx'),
+        ),
+    ]
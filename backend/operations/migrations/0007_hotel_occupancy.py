@@ -0,0 +1,73 @@
+# Generated by Django 4.2.7 on 2026-10-18 13:04
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def populate(apps, schema_editor):
+    # What operations.occupancy.rebuild() does, against the tables as they
+    # are at this migration, so later model changes cannot break it.
+    OccupancyLedger = apps.get_model('operations', 'OccupancyLedger')
+    HotelOccupancy = apps.get_model('operations', 'HotelOccupancy')
+    schema_editor.execute(
+        'INSERT INTO operations_occupancyledger '
+        '(service_voucher_id, hotel_name, check_in, check_out, room_type, quantity) '
+        'SELECT r.service_voucher_id, v.hotel_name, v.travel_start_date, v.travel_end_date, r.room_type, r.quantity '
+        'FROM operations_roomallocation r INNER JOIN operations_servicevoucher v ON v.id = r.service_voucher_id'
+    )
+    cells = Counter()
+    entries = OccupancyLedger.objects.values_list('hotel_name', 'check_in', 'check_out', 'room_type', 'quantity')
+    for hotel_name, check_in, check_out, room_type, quantity in entries.iterator(chunk_size=BATCH_SIZE):
+        if check_out is not None:
+            for offset in range((check_out - check_in).days):
+                cells[hotel_name, check_in + timedelta(days=offset), room_type] += quantity
+    HotelOccupancy.objects.bulk_create(
+        (HotelOccupancy(hotel_name=hotel_name, night=night, room_type=room_type, rooms=rooms)
+         for (hotel_name, night, room_type), rooms in cells.items() if rooms),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0006_manifest_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service_voucher_id', models.BigIntegerField(db_index=True)),
+                ('hotel_name', models.CharField(max_length=200)),
+                ('check_in', models.DateField()),
+                ('check_out', models.DateField(null=True)),
+                ('room_type', models.CharField(max_length=3)),
+                ('quantity', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HotelOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hotel_name', models.CharField(max_length=200)),
+                ('night', models.DateField()),
+                ('room_type', models.CharField(choices=[('SGL', 'Single'), ('DBL', 'Double'), ('TWN', 'Twin'), ('TPL', 'Triple')], max_length=3)),
+                ('rooms', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Hotel occupancy',
+                'indexes': [models.Index(fields=['night'], name='occupancy_night_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='hoteloccupancy',
+            constraint=models.UniqueConstraint(fields=('hotel_name', 'night', 'room_type'), name='occupancy_cell_unique'),
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
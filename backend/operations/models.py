@@ -1,4 +1,7 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 class Traveler(models.Model):
@@ -11,6 +14,59 @@ class Traveler(models.Model):
     def __str__(self):
         return self.name
 
+class ServiceVoucherQuerySet(models.QuerySet):
+    def with_total_rooms(self):
+        """Annotate ``total_rooms`` with a correlated SUM over room allocations."""
+        rooms = (
+            RoomAllocation.objects
+            .filter(service_voucher=OuterRef('pk'))
+            .order_by()
+            .values('service_voucher')
+            .annotate(total=Sum('quantity'))
+            .values('total')
+        )
+        return self.annotate(total_rooms=Coalesce(Subquery(rooms), 0))
+
+    def for_api(self, selection=None):
+        """
+        Everything ServiceVoucherSerializer reads, in a fixed number of queries.
+
+        With a ``selection.FieldSelection``, only the relations it renders are
+        loaded; collapsed relations load just their primary keys.
+        """
+        if selection is None or selection.is_full:
+            return (
+                self.select_related('traveler')
+                .prefetch_related('room_allocations', 'itinerary_items__activities')
+                .with_total_rooms()
+            )
+        queryset = self
+        if selection.expands('traveler'):
+            queryset = queryset.select_related('traveler')
+        if selection.includes('room_allocations'):
+            queryset = queryset.prefetch_related(
+                'room_allocations' if selection.expands('room_allocations')
+                else _ids_only('room_allocations', RoomAllocation, 'service_voucher')
+            )
+        if selection.expands('itinerary_items'):
+            days = selection.child('itinerary_items')
+            queryset = queryset.prefetch_related('itinerary_items')
+            if days.includes('activities'):
+                queryset = queryset.prefetch_related(
+                    'itinerary_items__activities' if days.expands('activities')
+                    else _ids_only('itinerary_items__activities', ItineraryActivity, 'itinerary')
+                )
+        elif selection.includes('itinerary_items'):
+            queryset = queryset.prefetch_related(_ids_only('itinerary_items', Itinerary, 'service_voucher'))
+        if selection.includes('total_rooms'):
+            queryset = queryset.with_total_rooms()
+        return queryset
+
+
+def _ids_only(lookup, model, fk):
+    return Prefetch(lookup, queryset=model.objects.only('id', fk))
+
+
 class ServiceVoucher(models.Model):
     TRANSFER_TYPES = [
         ('PRIVATE', 'Private Transfer'),
@@ -46,15 +102,92 @@ class ServiceVoucher(models.Model):
     departure_details = models.TextField(blank=True)
     meeting_point = models.CharField(max_length=200, blank=True)
 
+    # Bumped (in the database) whenever the voucher, its traveler or any of
+    # its rooms, days or activities change; see signals.bump_versions.
+    version = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ServiceVoucherQuerySet.as_manager()
+
+    class Meta:
+        # Back the list filters in operations.filters (date ranges, alone or
+        # after an equality on hotel / transfer type / meal plan).
+        indexes = [
+            models.Index(fields=['travel_start_date'], name='sv_start_date_idx'),
+            models.Index(fields=['travel_end_date'], name='sv_end_date_idx'),
+            models.Index(fields=['hotel_name', 'travel_start_date'], name='sv_hotel_start_idx'),
+            models.Index(fields=['transfer_type', 'travel_start_date'], name='sv_transfer_start_idx'),
+            models.Index(fields=['meal_plan', 'travel_start_date'], name='sv_meal_start_idx'),
+        ]
+
     def __str__(self):
         return f"{self.reservation_number} - {self.hotel_name}"
 
+    def save(self, *args, **kwargs):
+        # version is only ever incremented in the database; never write back
+        # a copy that may have gone stale since this instance was loaded.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'version'
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def total_rooms(self):
-        return sum(room.quantity for room in self.room_allocations.all())
+        # Set by ServiceVoucherQuerySet.with_total_rooms(); instances loaded
+        # without the annotation fall back to summing their allocations.
+        if getattr(self, '_total_rooms', None) is None:
+            return sum(room.quantity for room in self.room_allocations.all())
+        return self._total_rooms
+
+    @total_rooms.setter
+    def total_rooms(self, value):
+        self._total_rooms = value
 
 
-class RoomAllocation(models.Model):
+def _deleted(model, voucher_ids):
+    from .signals import vouchers_changed
+
+    if voucher_ids:
+        vouchers_changed.send(sender=model, voucher_ids=voucher_ids)
+
+
+class VoucherChildQuerySet(models.QuerySet):
+    """
+    Rows belonging to service vouchers (rooms, days, activities). These
+    models have no per-row delete signals, so Django deletes them, cascades
+    included, without loading each row. Instead a delete resolves the
+    vouchers it touches with one query and sends ``vouchers_changed`` once;
+    ``notify=False`` skips that for callers that send it themselves.
+    """
+
+    def delete(self, notify=True):
+        voucher_ids = list(
+            self.order_by().values_list(self.model.VOUCHER_LOOKUP, flat=True).distinct()
+        ) if notify else []
+        deleted = super().delete()
+        _deleted(self.model, voucher_ids)
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class VoucherChildMixin:
+    """Sends ``vouchers_changed`` for a single-row delete, as the queryset does for many."""
+
+    def delete(self, *args, **kwargs):
+        voucher_ids = [self.voucher_id()]
+        deleted = super().delete(*args, **kwargs)
+        _deleted(type(self), voucher_ids)
+        return deleted
+
+    def voucher_id(self):
+        return self.service_voucher_id
+
+
+class RoomAllocation(VoucherChildMixin, models.Model):
     ROOM_TYPES = [
         ('SGL', 'Single'),
         ('DBL', 'Double'),
@@ -66,6 +199,9 @@ class RoomAllocation(models.Model):
     room_type = models.CharField(max_length=3, choices=ROOM_TYPES)
     quantity = models.PositiveIntegerField(default=1)
 
+    VOUCHER_LOOKUP = 'service_voucher_id'
+    objects = VoucherChildQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.get_room_type_display()} x{self.quantity}"
 
@@ -73,11 +209,14 @@ class RoomAllocation(models.Model):
         unique_together = ['service_voucher', 'room_type']
 
 
-class Itinerary(models.Model):
+class Itinerary(VoucherChildMixin, models.Model):
     service_voucher = models.ForeignKey(ServiceVoucher, on_delete=models.CASCADE, related_name='itinerary_items')
     day = models.IntegerField()
     date = models.DateField()
 
+    VOUCHER_LOOKUP = 'service_voucher_id'
+    objects = VoucherChildQuerySet.as_manager()
+
     def __str__(self):
         return f"Day {self.day} - {self.date}"
 
@@ -85,9 +224,13 @@ class Itinerary(models.Model):
         ordering = ['day']
         unique_together = ['service_voucher', 'day']
         verbose_name_plural = 'Itineraries'
+        indexes = [
+            # The daily manifest (operations.manifest)
+            models.Index(fields=['date'], name='itin_date_idx'),
+        ]
 
 
-class ItineraryActivity(models.Model):
+class ItineraryActivity(VoucherChildMixin, models.Model):
     ACTIVITY_TYPES = [
         ('TRANSFER', 'Transfer'),
         ('TOUR', 'Tour/Activity'),
@@ -105,12 +248,23 @@ class ItineraryActivity(models.Model):
     location = models.CharField(max_length=200, blank=True)
     notes = models.TextField(blank=True)
 
+    VOUCHER_LOOKUP = 'itinerary__service_voucher_id'
+    objects = VoucherChildQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.time.strftime('%H:%M')} - {self.get_activity_type_display()}"
 
+    def voucher_id(self):
+        if type(self).itinerary.is_cached(self):
+            return self.itinerary.service_voucher_id
+        return Itinerary.objects.values_list('service_voucher_id', flat=True).get(pk=self.itinerary_id)
+
     class Meta:
-        ordering = ['time']
+        ordering = ['time', 'id']
         verbose_name_plural = 'Itinerary Activities'
+        indexes = [
+            models.Index(fields=['itinerary', 'time'], name='activity_itinerary_time_idx'),
+        ]
 
 
 class HotelVoucher(models.Model):
@@ -122,3 +276,101 @@ class HotelVoucher(models.Model):
     check_out_date = models.DateField()
     number_of_nights = models.IntegerField()
     confirmation_number = models.CharField(max_length=100)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['check_in_date', 'check_out_date'], name='hv_check_in_out_idx'),
+            models.Index(fields=['check_out_date'], name='hv_check_out_idx'),
+            models.Index(fields=['hotel_name', 'check_in_date'], name='hv_hotel_check_in_idx'),
+        ]
+
+
+class HotelOccupancy(models.Model):
+    """
+    Rooms held by service vouchers at a hotel on a night, by room type.
+
+    Derived data, maintained by ``operations.occupancy`` from the vouchers'
+    dates and room allocations; rows with no rooms are removed.
+    """
+    hotel_name = models.CharField(max_length=200)
+    night = models.DateField()
+    room_type = models.CharField(max_length=3, choices=RoomAllocation.ROOM_TYPES)
+    rooms = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Hotel occupancy'
+        constraints = [
+            models.UniqueConstraint(fields=['hotel_name', 'night', 'room_type'], name='occupancy_cell_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['night'], name='occupancy_night_idx'),
+        ]
+
+
+class OccupancyLedger(models.Model):
+    """
+    What each voucher currently contributes to ``HotelOccupancy``: one row
+    per room allocation, with the voucher's hotel and dates as counted. A
+    change is applied as the difference between these rows and the
+    voucher's current ones. ``service_voucher_id`` is a plain column so the
+    rows outlive a deleted voucher until its nights are subtracted.
+    """
+    service_voucher_id = models.BigIntegerField(db_index=True)
+    hotel_name = models.CharField(max_length=200)
+    check_in = models.DateField()
+    check_out = models.DateField(null=True)
+    room_type = models.CharField(max_length=3)
+    quantity = models.PositiveIntegerField()
+
+
+class Job(models.Model):
+    """
+    A piece of background work (an import, an export, a PDF batch), run by
+    the ``run_jobs`` workers; see ``operations.jobs``.
+
+    ``progress`` counts the units done out of ``total`` (when known).
+    ``heartbeat_at`` is refreshed while a worker holds the job. A running job
+    whose heartbeat stops is taken to be orphaned and retried.
+    """
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    SUCCEEDED = 'SUCCEEDED'
+    FAILED = 'FAILED'
+    CANCELLED = 'CANCELLED'
+    STATUSES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=1)
+    run_after = models.DateTimeField(default=timezone.now)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    message = models.CharField(max_length=200, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming the next ready job and finding orphaned running ones.
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+            models.Index(fields=['created_by', 'id'], name='job_created_by_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.get_status_display()})"
@@ -0,0 +1,154 @@
+"""
+Rooms held per hotel, night and room type.
+
+``HotelOccupancy`` holds one row per (hotel, night, room type) with rooms
+booked; a voucher from ``travel_start_date`` to ``travel_end_date`` holds
+its rooms on every night in between (none without an end date). Reading a
+date range is an index range scan: O(nights queried), whatever the number
+of bookings.
+
+The table is kept current incrementally. ``OccupancyLedger`` records what
+each voucher is counted with; ``refresh`` compares that with the voucher's
+current hotel, dates and rooms and adds the difference to the affected
+cells only, with an atomic ``rooms = rooms + delta`` upsert. ``signals``
+calls it whenever a voucher or room allocation is written.
+``QuerySet.update()`` and raw SQL bypass that, and ``rebuild_occupancy``
+recomputes everything.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connection, transaction
+
+from .models import ServiceVoucher, RoomAllocation, HotelOccupancy, OccupancyLedger
+
+MAX_DAYS = 366
+LEDGER_FIELDS = ['service_voucher_id', 'hotel_name', 'check_in', 'check_out', 'room_type', 'quantity']
+SOURCE_FIELDS = [
+    'service_voucher_id', 'service_voucher__hotel_name', 'service_voucher__travel_start_date',
+    'service_voucher__travel_end_date', 'room_type', 'quantity',
+]
+UPSERT_BATCH = 500
+
+
+def _nights(check_in, check_out):
+    if check_out is None:
+        return
+    for offset in range((check_out - check_in).days):
+        yield check_in + timedelta(days=offset)
+
+
+def _cells(entries, sign=1, cells=None):
+    """Add ``sign * quantity`` for every night of ledger ``entries`` to ``cells``."""
+    cells = Counter() if cells is None else cells
+    for _, hotel_name, check_in, check_out, room_type, quantity in entries:
+        for night in _nights(check_in, check_out):
+            cells[hotel_name, night, room_type] += sign * quantity
+    return cells
+
+
+def _add(cells):
+    """Add the non-zero ``cells`` deltas to ``HotelOccupancy``; returns whether any were negative."""
+    table = HotelOccupancy._meta.db_table
+    items = [(key, delta) for key, delta in cells.items() if delta]
+    with connection.cursor() as cursor:
+        for offset in range(0, len(items), UPSERT_BATCH):
+            batch = items[offset:offset + UPSERT_BATCH]
+            cursor.execute(
+                f'INSERT INTO {table} (hotel_name, night, room_type, rooms) '
+                f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(batch))} '
+                'ON CONFLICT (hotel_name, night, room_type) DO UPDATE SET rooms = '
+                f'{table}.rooms + excluded.rooms',
+                [value for (hotel_name, night, room_type), delta in batch
+                 for value in (hotel_name, night, room_type, delta)],
+            )
+    return any(delta < 0 for _, delta in items)
+
+
+def refresh(voucher_ids, created=False):
+    """
+    Bring the occupancy of ``voucher_ids`` (created, changed or deleted) up
+    to date. ``created`` vouchers have no ledger rows yet, which saves a read.
+    """
+    voucher_ids = list(voucher_ids)
+    if voucher_ids:
+        with transaction.atomic(savepoint=False):
+            _refresh(voucher_ids, created)
+
+
+def _refresh(voucher_ids, created):
+    # Lock the vouchers (in id order, against deadlocks) and their ledger
+    # rows before reading the ledger: under READ COMMITTED two concurrent
+    # refreshes of one voucher would otherwise both read the same old
+    # ledger and both apply the same difference. The second one waits for
+    # the first to commit and then reads its ledger. Deleted vouchers only
+    # have ledger rows left to lock. SQLite has no row locks; its IMMEDIATE
+    # transactions (see settings) already hold the database write lock.
+    if connection.features.has_select_for_update:
+        list(ServiceVoucher.objects.select_for_update().filter(pk__in=voucher_ids).order_by('pk').values_list('pk'))
+        if not created:
+            list(OccupancyLedger.objects.select_for_update().filter(
+                service_voucher_id__in=voucher_ids).order_by('pk').values_list('pk'))
+    old = set() if created else set(
+        OccupancyLedger.objects.filter(service_voucher_id__in=voucher_ids).values_list(*LEDGER_FIELDS))
+    new = set(RoomAllocation.objects.filter(service_voucher_id__in=voucher_ids).values_list(*SOURCE_FIELDS))
+    if old == new:
+        return
+
+    cells = _cells(new, cells=_cells(old, sign=-1))
+    if _add(cells):
+        nights = [night for _, night, _ in cells]
+        HotelOccupancy.objects.filter(
+            hotel_name__in={hotel_name for hotel_name, _, _ in cells},
+            night__range=(min(nights), max(nights)), rooms__lte=0,
+        ).delete()
+    if old:
+        OccupancyLedger.objects.filter(service_voucher_id__in=voucher_ids).delete()
+    OccupancyLedger.objects.bulk_create(
+        OccupancyLedger(**dict(zip(LEDGER_FIELDS, entry))) for entry in new
+    )
+
+
+def rebuild(batch_size=5000):
+    """Recompute the ledger and the occupancy table from scratch; returns the number of cells."""
+    OccupancyLedger.objects.all().delete()
+    HotelOccupancy.objects.all().delete()
+    ledger = OccupancyLedger._meta.db_table
+    select, params = RoomAllocation.objects.order_by().values_list(*SOURCE_FIELDS).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {ledger} ({", ".join(LEDGER_FIELDS)}) {select}', params)
+
+    cells = _cells(OccupancyLedger.objects.values_list(*LEDGER_FIELDS).iterator(chunk_size=batch_size))
+    rows = [(hotel_name, night, room_type, rooms) for (hotel_name, night, room_type), rooms in cells.items() if rooms]
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), batch_size):
+            cursor.executemany(
+                f'INSERT INTO {HotelOccupancy._meta.db_table} (hotel_name, night, room_type, rooms) '
+                'VALUES (%s, %s, %s, %s)',
+                rows[offset:offset + batch_size],
+            )
+    return len(rows)
+
+
+def occupancy(start, end, hotel_name=None, room_type=None):
+    """
+    Rooms held on the nights ``start``..``end`` (inclusive), as a list of
+    ``{'hotel_name', 'nights': [{'night', 'rooms': {room_type: n}, 'total'}]}``
+    ordered by hotel and night. Nights without rooms are left out.
+    """
+    queryset = HotelOccupancy.objects.filter(night__range=(start, end))
+    if hotel_name:
+        queryset = queryset.filter(hotel_name=hotel_name)
+    if room_type:
+        queryset = queryset.filter(room_type__in=room_type.split(','))
+    hotels = []
+    for hotel, night, room, rooms in queryset.order_by('hotel_name', 'night', 'room_type').values_list(
+            'hotel_name', 'night', 'room_type', 'rooms'):
+        if not hotels or hotels[-1]['hotel_name'] != hotel:
+            hotels.append({'hotel_name': hotel, 'nights': []})
+        nights = hotels[-1]['nights']
+        if not nights or nights[-1]['night'] != night:
+            nights.append({'night': night, 'rooms': {}, 'total': 0})
+        nights[-1]['rooms'][room] = rooms
+        nights[-1]['total'] += rooms
+    return hotels
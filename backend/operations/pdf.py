@@ -0,0 +1,285 @@
+"""
+Server-side vector PDF rendering of vouchers, with a content-addressed disk cache.
+
+A voucher's PDF is stored under the SHA-256 of its serialized payload (nested
+rows included) and ``TEMPLATE_VERSION``. Any change to the voucher, its rooms
+or its itinerary produces a new key, so stale files are never served; they
+simply stop being read and fall out of the cache, which is bounded by size
+and evicts the least recently used files first.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+# Bump when the layout changes so previously cached files are not reused.
+TEMPLATE_VERSION = 1
+
+STYLES = getSampleStyleSheet()
+TABLE_STYLE = TableStyle([
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e8eef7')),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+])
+DETAIL_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#555555')),
+])
+
+
+def content_hash(kind, data):
+    """Cache key for a voucher of ``kind`` serialized as ``data``."""
+    payload = json.dumps(
+        {'kind': kind, 'template': TEMPLATE_VERSION, 'data': data},
+        cls=DjangoJSONEncoder, sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _text(value):
+    return Paragraph(escape(str(value if value not in (None, '') else '-')).replace('\n', '<br/>'), STYLES['BodyText'])
+
+
+def _details(rows):
+    table = Table([[label, _text(value)] for label, value in rows], colWidths=[45 * mm, None])
+    table.setStyle(DETAIL_STYLE)
+    return table
+
+
+def _grid(header, rows, col_widths=None):
+    table = Table([header] + rows, colWidths=col_widths, repeatRows=1)
+    table.setStyle(TABLE_STYLE)
+    return table
+
+
+def _build(title, story):
+    buffer = BytesIO()
+    document = SimpleDocTemplate(
+        buffer, pagesize=A4, title=title, invariant=True,
+        leftMargin=18 * mm, rightMargin=18 * mm, topMargin=18 * mm, bottomMargin=18 * mm,
+    )
+    document.build([Paragraph(escape(title), STYLES['Title'])] + story)
+    return buffer.getvalue()
+
+
+def render_service_voucher(data):
+    """Render ``ServiceVoucherSerializer`` output as a PDF document."""
+    traveler = data.get('traveler') or {}
+    story = [
+        _details([
+            ('Reservation number', data['reservation_number']),
+            ('Hotel confirmation', data['hotel_confirmation_number']),
+            ('Guest', traveler.get('name')),
+            ('Passengers', f"{traveler.get('num_adults', 0)} adults, {traveler.get('num_infants', 0)} infants"),
+            ('Travel dates', f"{data['travel_start_date']} to {data['travel_end_date'] or '-'}"),
+            ('Hotel', data['hotel_name']),
+            ('Transfer', data['transfer_type_display']),
+            ('Meal plan', data['meal_plan_display']),
+            ('Meeting point', data['meeting_point']),
+        ]),
+        Spacer(1, 6 * mm),
+    ]
+    if data['room_allocations']:
+        story += [
+            Paragraph('Rooms', STYLES['Heading3']),
+            _grid(['Room type', 'Quantity'], [
+                [room['room_type_display'], room['quantity']] for room in data['room_allocations']
+            ] + [['Total', data['total_rooms']]], col_widths=[60 * mm, 30 * mm]),
+            Spacer(1, 6 * mm),
+        ]
+    if data['itinerary_items']:
+        rows = []
+        for item in data['itinerary_items']:
+            for activity in item['activities'] or [{}]:
+                rows.append([
+                    item['day'], item['date'], (activity.get('time') or '')[:5],
+                    activity.get('activity_type_display', ''), _text(activity.get('description')),
+                    _text(activity.get('location')),
+                ])
+        story += [
+            Paragraph('Itinerary', STYLES['Heading3']),
+            _grid(['Day', 'Date', 'Time', 'Type', 'Description', 'Location'], rows,
+                  col_widths=[12 * mm, 24 * mm, 14 * mm, 28 * mm, None, 35 * mm]),
+            Spacer(1, 6 * mm),
+        ]
+    story.append(_details([
+        ('Inclusions', data['inclusions']),
+        ('Arrival', data['arrival_details']),
+        ('Departure', data['departure_details']),
+    ]))
+    return _build(f"Service Voucher {data['reservation_number']}", story)
+
+
+def render_hotel_voucher(data):
+    """Render ``HotelVoucherSerializer`` output as a PDF document."""
+    return _build(f"Hotel Voucher {data['confirmation_number']}", [_details([
+        ('Confirmation number', data['confirmation_number']),
+        ('Guest', data['guest_name']),
+        ('Hotel', data['hotel_name']),
+        ('Address', data['hotel_address']),
+        ('Check-in', data['check_in_date']),
+        ('Check-out', data['check_out_date']),
+        ('Nights', data['number_of_nights']),
+        ('Rooms', data['number_of_rooms']),
+    ])])
+
+
+def render_manifest(data):
+    """Render ``manifest.build`` output as a PDF document, one table per activity type."""
+    totals = data['totals']
+    story = [
+        _details([
+            ('Activities', totals['activities']),
+            ('Vouchers', totals['vouchers']),
+            ('Passengers', f"{totals['adults']} adults, {totals['infants']} infants"),
+        ]),
+        Spacer(1, 6 * mm),
+    ]
+    for group in data['groups']:
+        rows = [
+            [
+                activity['time'][:5], activity['reservation_number'], _text(activity['guest']),
+                f"{activity['adults']}+{activity['infants']}", _text(activity['hotel_name']),
+                _text(activity['meeting_point']), activity['transfer_type_display'], _text(activity['description']),
+            ]
+            for slot in group['slots'] for activity in slot['activities']
+        ]
+        story += [
+            Paragraph(f"{escape(group['activity_type_display'])} ({group['activities']})", STYLES['Heading3']),
+            _grid(['Time', 'Reservation', 'Guest', 'Pax', 'Hotel', 'Meeting point', 'Transfer', 'Description'],
+                  rows, col_widths=[12 * mm, 24 * mm, 24 * mm, 10 * mm, 24 * mm, 24 * mm, 18 * mm, None]),
+            Spacer(1, 6 * mm),
+        ]
+    return _build(f"Operations Manifest {data['date']}", story)
+
+
+def render_transfer_runs(data):
+    """Render ``transfers.run_sheets`` output as a PDF document, one run sheet per vehicle."""
+    totals = data['totals']
+    story = [
+        _details([
+            ('Dates', f"{data['start']} to {data['end']}"),
+            ('Runs', totals['runs']),
+            ('Transfers', totals['transfers']),
+            ('Passengers', totals['pax']),
+        ]),
+        Spacer(1, 6 * mm),
+    ]
+    for run in data['runs']:
+        seats = f"{run['pax']}/{run['capacity']}" if run['capacity'] else str(run['pax'])
+        heading = (
+            f"Run {run['run']}: {run['date']} {run['first_pickup'][:5]}, {run['pickup']} "
+            f"({run['transfer_type_display']}, {seats} pax{', over capacity' if run['over_capacity'] else ''})"
+        )
+        story += [
+            Paragraph(escape(heading), STYLES['Heading4']),
+            _grid(['Time', 'Reservation', 'Guest', 'Pax', 'Hotel', 'Details'], [
+                [
+                    stop['time'][:5], stop['reservation_number'], _text(stop['guest']),
+                    f"{stop['adults']}+{stop['infants']}", _text(stop['hotel_name']), _text(stop['description']),
+                ]
+                for stop in run['stops']
+            ], col_widths=[12 * mm, 26 * mm, 30 * mm, 12 * mm, 35 * mm, None]),
+            Spacer(1, 4 * mm),
+        ]
+    return _build(f"Transfer Run Sheets {data['start']} to {data['end']}", story)
+
+
+RENDERERS = {
+    'service-voucher': render_service_voucher,
+    'hotel-voucher': render_hotel_voucher,
+    'manifest': render_manifest,
+    'transfer-runs': render_transfer_runs,
+}
+
+
+class PdfCache:
+    """
+    Directory of ``<sha256>.pdf`` files bounded to ``max_bytes``.
+
+    A file's mtime is its last use: hits refresh it, and when the directory
+    grows past the limit the least recently used files are removed.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return self.directory / f'{key}.pdf'
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, content):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file and rename, so readers in other workers
+        # never see a partially written PDF.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(content)
+        path = self.path(key)
+        os.replace(temp_path, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def open_or_render(self, key, kind, data):
+        """
+        A binary file object holding the PDF of ``data`` (cached under
+        ``key``), rendered on a miss.
+
+        The cached file is opened before its use is recorded, so eviction by
+        another worker cannot remove it between the lookup and the read; a
+        fresh render is served from memory, however soon it is evicted.
+        """
+        try:
+            handle = open(self.path(key), 'rb')
+        except FileNotFoundError:
+            content = RENDERERS[kind](data)
+            self.put(key, content)
+            return BytesIO(content)
+        self.get(key)
+        return handle
+
+
+def get_cache():
+    return PdfCache(
+        getattr(settings, 'VOUCHER_PDF_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'voucher-pdfs'),
+        getattr(settings, 'VOUCHER_PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024),
+    )
@@ -0,0 +1,224 @@
+"""
+Read-only fast path for the list endpoints.
+
+Instead of instantiating a serializer (and its nested serializers and
+fields) per row, a reader selects plain column tuples and assembles the
+response dicts directly, with choice labels looked up in precomputed tables.
+The output is the same, key for key and byte for byte once rendered, as the
+matching serializer's; ``tests.FastReadPathTests`` holds the two together,
+so a serializer change must be mirrored here.
+
+Fetching and building are separate steps: ``related(ids)`` returns the
+querysets a page needs and ``build(rows, related)`` is pure Python, so the
+same reader serves both sync and async views.
+"""
+from collections import defaultdict
+
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from core.instrumentation import timed
+
+from .models import ServiceVoucher, RoomAllocation, Itinerary, ItineraryActivity, HotelVoucher
+
+TRANSFER_TYPE_LABELS = dict(ServiceVoucher.TRANSFER_TYPES)
+MEAL_PLAN_LABELS = dict(ServiceVoucher.MEAL_PLANS)
+ROOM_TYPE_LABELS = dict(RoomAllocation.ROOM_TYPES)
+ACTIVITY_TYPE_LABELS = dict(ItineraryActivity.ACTIVITY_TYPES)
+
+_datetime = serializers.DateTimeField().to_representation
+
+
+def _iso(value):
+    return None if value is None else value.isoformat()
+
+
+class Reader:
+    """Base reader: ``columns`` are selected with ``values()``, one dict per row."""
+    columns = ()
+
+    def rows(self, queryset):
+        """``queryset`` (filtered and ordered) as dicts of ``columns``; paginators accept it as is."""
+        return queryset.select_related(None).prefetch_related(None).values(*self.columns)
+
+    def related(self, ids):
+        """Querysets for the nested rows of the vouchers/rows ``ids``, by name."""
+        return {}
+
+    def build(self, rows, related):
+        return [self.row(row) for row in rows]
+
+    def read(self, rows):
+        """Build the response list for ``rows``, running the ``related`` queries."""
+        rows = list(rows)
+        related = {name: list(queryset) for name, queryset in self.related([row['id'] for row in rows]).items()}
+        with timed('serialize'):
+            return self.build(rows, related)
+
+    async def aread(self, rows):
+        """``read`` for async views: ``rows`` (a list or a queryset) and ``related`` go through the async ORM."""
+        if not isinstance(rows, list):
+            rows = [row async for row in rows]
+        related = {}
+        for name, queryset in self.related([row['id'] for row in rows]).items():
+            related[name] = [row async for row in queryset]
+        with timed('serialize'):
+            return self.build(rows, related)
+
+
+class TravelerReader(Reader):
+    columns = ('id', 'name', 'num_adults', 'num_infants', 'contact_email', 'contact_phone')
+
+    def row(self, row):
+        return row
+
+
+def _activity(row):
+    pk, itinerary, time, activity_type, description, location, notes = row
+    return {
+        'id': pk,
+        'itinerary': itinerary,
+        'time': _iso(time),
+        'activity_type': activity_type,
+        'activity_type_display': ACTIVITY_TYPE_LABELS.get(activity_type, activity_type),
+        'description': description,
+        'location': location,
+        'notes': notes,
+    }
+
+
+ACTIVITY_COLUMNS = ('id', 'itinerary_id', 'time', 'activity_type', 'description', 'location', 'notes')
+
+
+def _activities_by_itinerary(activity_rows):
+    activities = defaultdict(list)
+    for row in activity_rows:
+        activities[row[1]].append(_activity(row))
+    return activities
+
+
+class ItineraryActivityReader(Reader):
+    columns = ACTIVITY_COLUMNS
+
+    def row(self, row):
+        return _activity([row[column] for column in self.columns])
+
+
+class ItineraryReader(Reader):
+    columns = ('id', 'day', 'date', 'service_voucher_id')
+
+    def related(self, ids):
+        return {'activities': ItineraryActivity.objects.filter(itinerary_id__in=ids).values_list(*ACTIVITY_COLUMNS)}
+
+    def build(self, rows, related):
+        activities = _activities_by_itinerary(related['activities'])
+        return [
+            {
+                'id': row['id'],
+                'day': row['day'],
+                'date': _iso(row['date']),
+                'service_voucher': row['service_voucher_id'],
+                'activities': activities.get(row['id'], []),
+            }
+            for row in rows
+        ]
+
+
+class ServiceVoucherReader(Reader):
+    columns = (
+        'id', 'total_rooms', 'reservation_number', 'hotel_confirmation_number', 'travel_start_date',
+        'travel_end_date', 'hotel_name', 'transfer_type', 'meal_plan', 'inclusions', 'arrival_details',
+        'departure_details', 'meeting_point', 'version', 'updated_at',
+    ) + tuple(f'traveler__{column}' for column in TravelerReader.columns)
+
+    def rows(self, queryset):
+        # total_rooms comes from ServiceVoucherQuerySet.with_total_rooms().
+        return super().rows(queryset.with_total_rooms() if 'total_rooms' not in queryset.query.annotations
+                            else queryset)
+
+    def related(self, ids):
+        return {
+            'rooms': RoomAllocation.objects.filter(service_voucher_id__in=ids).values_list(
+                'id', 'service_voucher_id', 'room_type', 'quantity'),
+            'days': Itinerary.objects.filter(service_voucher_id__in=ids).values_list(
+                'id', 'day', 'date', 'service_voucher_id'),
+            'activities': ItineraryActivity.objects.filter(itinerary__service_voucher_id__in=ids).values_list(
+                *ACTIVITY_COLUMNS),
+        }
+
+    def build(self, rows, related):
+        rooms = defaultdict(list)
+        for pk, voucher, room_type, quantity in related['rooms']:
+            rooms[voucher].append({
+                'id': pk,
+                'service_voucher': voucher,
+                'room_type': room_type,
+                'room_type_display': ROOM_TYPE_LABELS.get(room_type, room_type),
+                'quantity': quantity,
+            })
+        activities = _activities_by_itinerary(related['activities'])
+        days = defaultdict(list)
+        for pk, day, date, voucher in related['days']:
+            days[voucher].append({
+                'id': pk,
+                'day': day,
+                'date': _iso(date),
+                'service_voucher': voucher,
+                'activities': activities.get(pk, []),
+            })
+
+        results = []
+        for row in rows:
+            pk = row['id']
+            results.append({
+                'id': pk,
+                'traveler': {column: row[f'traveler__{column}'] for column in TravelerReader.columns},
+                'room_allocations': rooms.get(pk, []),
+                'itinerary_items': days.get(pk, []),
+                'total_rooms': row['total_rooms'],
+                'transfer_type_display': TRANSFER_TYPE_LABELS.get(row['transfer_type'], row['transfer_type']),
+                'meal_plan_display': MEAL_PLAN_LABELS.get(row['meal_plan'], row['meal_plan']),
+                'reservation_number': row['reservation_number'],
+                'hotel_confirmation_number': row['hotel_confirmation_number'],
+                'travel_start_date': _iso(row['travel_start_date']),
+                'travel_end_date': _iso(row['travel_end_date']),
+                'hotel_name': row['hotel_name'],
+                'transfer_type': row['transfer_type'],
+                'meal_plan': row['meal_plan'],
+                'inclusions': row['inclusions'],
+                'arrival_details': row['arrival_details'],
+                'departure_details': row['departure_details'],
+                'meeting_point': row['meeting_point'],
+                'version': row['version'],
+                'updated_at': _datetime(row['updated_at']),
+            })
+        return results
+
+
+class HotelVoucherReader(Reader):
+    columns = tuple(field.attname for field in HotelVoucher._meta.concrete_fields)
+
+    def row(self, row):
+        row['check_in_date'] = _iso(row['check_in_date'])
+        row['check_out_date'] = _iso(row['check_out_date'])
+        return row
+
+
+class ReaderListMixin:
+    """
+    Serves ``list`` through ``reader`` (a ``Reader`` instance) instead of the
+    serializer. Requests selecting fields with ``?fields=`` keep using the
+    serializer, which handles the pruning.
+    """
+    reader = None
+
+    def list(self, request, *args, **kwargs):
+        selection = getattr(self, 'field_selection', None)
+        if self.reader is None or (selection is not None and not selection.is_full):
+            return super().list(request, *args, **kwargs)
+
+        rows = self.reader.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.reader.read(page))
+        return Response(self.reader.read(rows))
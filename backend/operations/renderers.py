@@ -0,0 +1,67 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from core.instrumentation import timed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+class PassthroughRenderer(BaseRenderer):
+    """
+    Lets a file-download action negotiate its media type. The action returns
+    a ready-made (usually streaming) HttpResponse, so nothing is rendered.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class CSVRenderer(PassthroughRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(PassthroughRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class PDFRenderer(PassthroughRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class ZipRenderer(PassthroughRenderer):
+    media_type = 'application/zip'
+    format = 'zip'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` encoding with orjson when it is installed.
+
+    The output is byte-for-byte what ``JSONRenderer`` produces with the
+    default compact, unicode settings: dates and times still go through the
+    DRF encoder, and U+2028/U+2029 are escaped the same way. The one
+    difference is floats in exponent notation (``1e16`` for ``1e+16``),
+    which are equal JSON and do not occur in these endpoints. Indented
+    output (the browsable API), non-default settings and anything orjson
+    rejects (non-string keys, integers past 64 bits) fall back to
+    ``JSONRenderer``.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
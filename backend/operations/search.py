@@ -0,0 +1,231 @@
+"""
+Substring search over reservations, guests and hotels.
+
+Service vouchers and hotel vouchers are mirrored into one search table,
+indexed on trigrams so a partial reservation number, guest name or hotel
+matches without scanning the voucher tables:
+
+* SQLite: an FTS5 virtual table with the ``trigram`` tokenizer.
+* PostgreSQL: a plain table with a ``pg_trgm`` GIN index.
+
+Rows are keyed by ``rowid`` (``2 * id`` for service vouchers, ``2 * id + 1``
+for hotel vouchers) so a voucher's row is replaced with one indexed delete
+and an ``INSERT ... SELECT`` from the voucher tables. ``signals`` reindex
+vouchers as they are written; ``QuerySet.update()`` and raw SQL bypass that,
+and ``rebuild_search_index`` repopulates the table.
+"""
+from django.db import connection
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Concat
+
+from .models import ServiceVoucher, HotelVoucher
+
+TABLE = 'operations_search'
+KINDS = ('service-voucher', 'hotel-voucher')
+MIN_TERM_LENGTH = 3
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# Relative weight of a match in the reference, guest and hotel columns.
+WEIGHTS = (10.0, 5.0, 1.0)
+# Matches fetched from the index and ranked per query.
+CANDIDATES = 200
+COLUMNS = ['rowid', 'kind', 'object_id', 'date', 'reference', 'guest', 'hotel']
+
+
+class SqliteBackend:
+    install_sql = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+        "kind UNINDEXED, object_id UNINDEXED, date UNINDEXED, reference, guest, hotel, "
+        "tokenize='trigram')",
+    ]
+    uninstall_sql = [f'DROP TABLE IF EXISTS {TABLE}']
+
+    def candidates(self, cursor, terms, kind, limit):
+        # Each term is a quoted FTS5 string (implicitly AND-ed), so user
+        # input is never parsed as query syntax.
+        match = ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        sql = f'SELECT {", ".join(COLUMNS[1:])} FROM {TABLE} WHERE {TABLE} MATCH %s'
+        params = [match]
+        if kind:
+            sql += ' AND kind = %s'
+            params.append(kind)
+        cursor.execute(sql + ' ORDER BY rowid DESC LIMIT %s', params + [limit])
+        return cursor.fetchall()
+
+
+class PostgresBackend:
+    install_sql = [
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+        "rowid bigint PRIMARY KEY, kind varchar(20) NOT NULL, object_id bigint NOT NULL, date date, "
+        "reference text NOT NULL, guest text NOT NULL, hotel text NOT NULL, "
+        "document text GENERATED ALWAYS AS (reference || ' ' || guest || ' ' || hotel) STORED)",
+        f'CREATE INDEX IF NOT EXISTS {TABLE}_trgm ON {TABLE} USING gin (document gin_trgm_ops)',
+    ]
+    uninstall_sql = [f'DROP TABLE IF EXISTS {TABLE}']
+
+    def candidates(self, cursor, terms, kind, limit):
+        # ILIKE patterns are answered from the trigram GIN index.
+        sql = f'SELECT {", ".join(COLUMNS[1:])} FROM {TABLE} WHERE document ILIKE ALL(%s)'
+        params = [[f'%{_escape_like(term)}%' for term in terms]]
+        if kind:
+            sql += ' AND kind = %s'
+            params.append(kind)
+        cursor.execute(sql + ' ORDER BY rowid DESC LIMIT %s', params + [limit])
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SqliteBackend(),
+    'postgresql': PostgresBackend(),
+}
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def backend(using=None):
+    """The backend for ``using`` (default connection), or None if search is unsupported there."""
+    return BACKENDS.get((using or connection).vendor)
+
+
+def install(using):
+    """Create the search table on ``using``; a no-op on unsupported databases."""
+    engine = backend(using)
+    if engine:
+        with using.cursor() as cursor:
+            for sql in engine.install_sql:
+                cursor.execute(sql)
+
+
+def uninstall(using):
+    engine = backend(using)
+    if engine:
+        with using.cursor() as cursor:
+            for sql in engine.uninstall_sql:
+                cursor.execute(sql)
+
+
+def _service_voucher_rows(queryset):
+    return queryset.order_by().annotate(
+        search_rowid=F('id') * 2,
+        search_kind=Value(KINDS[0]),
+        search_object_id=F('id'),
+        search_date=F('travel_start_date'),
+        search_reference=Concat('reservation_number', Value(' '), 'hotel_confirmation_number',
+                                output_field=CharField()),
+        search_guest=F('traveler__name'),
+        search_hotel=F('hotel_name'),
+    ).values_list(*[f'search_{column}' for column in COLUMNS])
+
+
+def _hotel_voucher_rows(queryset):
+    return queryset.order_by().annotate(
+        search_rowid=F('id') * 2 + 1,
+        search_kind=Value(KINDS[1]),
+        search_object_id=F('id'),
+        search_date=F('check_in_date'),
+        search_reference=F('confirmation_number'),
+        search_guest=F('guest_name'),
+        search_hotel=F('hotel_name'),
+    ).values_list(*[f'search_{column}' for column in COLUMNS])
+
+
+def _write(rowids, rows):
+    """
+    Delete ``rowids`` and insert ``rows`` (a ``_*_rows`` queryset), copying
+    straight from the voucher tables with ``INSERT ... SELECT``.
+    """
+    select, params = rows.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if rowids is not None:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({", ".join(["%s"] * len(rowids))})', rowids)
+        cursor.execute(f'INSERT INTO {TABLE} ({", ".join(COLUMNS)}) {select}', params)
+        return cursor.rowcount
+
+
+def reindex_service_vouchers(ids):
+    """Refresh (or drop, if deleted) the search rows of the given service vouchers."""
+    ids = list(ids)
+    if ids and backend():
+        _write([2 * pk for pk in ids], _service_voucher_rows(ServiceVoucher.objects.filter(pk__in=ids)))
+
+
+def reindex_hotel_vouchers(ids):
+    """Refresh (or drop, if deleted) the search rows of the given hotel vouchers."""
+    ids = list(ids)
+    if ids and backend():
+        _write([2 * pk + 1 for pk in ids], _hotel_voucher_rows(HotelVoucher.objects.filter(pk__in=ids)))
+
+
+def rebuild():
+    """Repopulate the whole search table; returns the number of rows written."""
+    if not backend():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    return (
+        _write(None, _service_voucher_rows(ServiceVoucher.objects.all()))
+        + _write(None, _hotel_voucher_rows(HotelVoucher.objects.all()))
+    )
+
+
+def terms(query):
+    """The searchable terms of ``query``: words of at least MIN_TERM_LENGTH characters."""
+    return [term for term in query.split() if len(term) >= MIN_TERM_LENGTH]
+
+
+def score(terms, reference, guest, hotel):
+    """
+    Sum over ``terms`` of the best weighted column match. A match that starts
+    a word scores higher, and one that also ends it higher still, so "hart"
+    ranks Hartley above Everhart and "4217" ranks RES-4217 above RES-42179.
+    """
+    total = 0.0
+    for term in terms:
+        term = term.lower()
+        best = 0.0
+        for weight, text in zip(WEIGHTS, (reference, guest, hotel)):
+            text = text.lower()
+            at = text.find(term)
+            if at != -1:
+                end = at + len(term)
+                boundaries = 2 * (at == 0 or not text[at - 1].isalnum()) + (end == len(text) or not text[end].isalnum())
+                best = max(best, weight * (1 + boundaries))
+        total += best
+    return total
+
+
+def search(query, kind=None, limit=DEFAULT_LIMIT):
+    """
+    Best matches for ``query``, most relevant first.
+
+    Up to CANDIDATES matching rows, newest first, are read from the index
+    and ranked with ``score``. Corpus-wide ranking (bm25 and the like) has to read every
+    posting of common trigrams such as "hot" or "res", which costs hundreds
+    of milliseconds at a million rows; a query matching more than
+    CANDIDATES rows is too broad for the ranking among them to matter, and
+    ordering on ``rowid`` keeps which ones are read stable.
+    """
+    engine = backend()
+    words = terms(query)
+    if not engine or not words:
+        return []
+    with connection.cursor() as cursor:
+        rows = engine.candidates(cursor, words, kind, CANDIDATES)
+    results = [
+        {
+            'kind': row_kind,
+            'id': object_id,
+            'date': date,
+            'reference': reference,
+            'guest': guest,
+            'hotel': hotel,
+            'score': score(words, reference, guest, hotel),
+        }
+        for row_kind, object_id, date, reference, guest, hotel in rows
+    ]
+    # Newer vouchers first among equal scores.
+    results.sort(key=lambda result: (-result['score'], -result['id']))
+    return results[:limit]
@@ -0,0 +1,134 @@
+"""
+Sparse fieldsets (``?fields=``) and opt-in expansion (``?expand=``).
+
+Without ``fields`` (or with it empty) a response keeps its full shape, nested relations
+included. With ``fields``, only the listed fields are returned, and a nested
+relation among them is collapsed to its primary key(s) unless it is also
+listed in ``expand``; expanded relations are included implicitly. Both take
+comma-separated names, dotted to reach into a nested relation::
+
+    ?fields=id,reservation_number,traveler&expand=traveler
+    ?fields=id,itinerary_items.day,itinerary_items.activities&expand=itinerary_items
+
+Views build their querysets from the same ``FieldSelection``, so relations
+that are not rendered are not fetched either.
+"""
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from core.instrumentation import timed
+
+
+def _names(value):
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class FieldSelection:
+    """The parsed ``fields`` / ``expand`` of one request, or of one nesting level."""
+
+    def __init__(self, fields=None, expand=()):
+        # ``fields`` is None when every field is wanted.
+        self.fields = None if fields is None else set(fields)
+        self.expand = set(expand)
+
+    @classmethod
+    def from_request(cls, request):
+        params = request.query_params
+        # An empty ``?fields=`` selects nothing in particular: every field.
+        fields = _names(params.get('fields')) or None
+        # ``expand`` only means something alongside ``fields``.
+        return cls(fields, _names(params.get('expand')) if fields else ())
+
+    @property
+    def is_full(self):
+        return self.fields is None
+
+    def _top(self, paths):
+        return {path.split('.', 1)[0] for path in paths}
+
+    def includes(self, name):
+        return self.fields is None or name in self._top(self.fields | self.expand)
+
+    def expands(self, name):
+        return self.fields is None or name in self._top(self.expand)
+
+    def requested(self):
+        """Top-level names asked for (None when every field is wanted)."""
+        return None if self.fields is None else self._top(self.fields | self.expand)
+
+    def child(self, name):
+        """The selection inside the nested relation ``name``."""
+        prefix = f'{name}.'
+        fields = {path[len(prefix):] for path in self.fields or () if path.startswith(prefix)}
+        expand = {path[len(prefix):] for path in self.expand if path.startswith(prefix)}
+        return FieldSelection(fields or None, expand)
+
+    def cache_key(self):
+        if self.fields is None:
+            return 'all'
+        return f"{','.join(sorted(self.fields))}|{','.join(sorted(self.expand))}"
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin applying a ``FieldSelection``.
+
+    The root serializer takes it from ``context['field_selection']`` (set by
+    ``SparseFieldsViewMixin``); nested serializers listed in
+    ``Meta.expandable`` receive their part of it from their parent.
+    """
+    selection = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.selection or self.context.get('field_selection')
+        if selection is None or selection.is_full and not selection.expand:
+            return fields
+
+        # A full selection with ``expand`` is a relation listed without
+        # sub-fields: all of its fields, and its expand paths still checked.
+        requested = set(fields) if selection.is_full else selection.requested()
+        unknown = (requested | selection._top(selection.expand)) - set(fields)
+        if unknown:
+            raise ValidationError({'fields': [f"Unknown field(s): {', '.join(sorted(unknown))}"]})
+        expandable = getattr(self.Meta, 'expandable', ())
+        for name in list(fields):
+            if name not in requested:
+                del fields[name]
+            elif name in expandable:
+                if selection.expands(name):
+                    nested = getattr(fields[name], 'child', fields[name])
+                    nested.selection = selection.child(name)
+                else:
+                    fields[name] = serializers.PrimaryKeyRelatedField(
+                        many=hasattr(fields[name], 'child'), read_only=True,
+                    )
+        return fields
+
+    def to_representation(self, instance):
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+
+class SparseFieldsViewMixin:
+    """
+    Passes the request's ``FieldSelection`` to the serializer for
+    ``sparse_actions``; ``get_queryset`` can read ``field_selection`` to
+    fetch only what will be rendered.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    @property
+    def field_selection(self):
+        if not hasattr(self, '_field_selection'):
+            request = getattr(self, 'request', None)
+            if request is not None and getattr(self, 'action', None) in self.sparse_actions:
+                self._field_selection = FieldSelection.from_request(request)
+            else:
+                self._field_selection = FieldSelection()
+        return self._field_selection
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['field_selection'] = self.field_selection
+        return context
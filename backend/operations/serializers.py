@@ -1,33 +1,37 @@
 from rest_framework import serializers
-from .models import Traveler, ServiceVoucher, RoomAllocation, Itinerary, ItineraryActivity, HotelVoucher
+from rest_framework.reverse import reverse
+from .models import Traveler, ServiceVoucher, RoomAllocation, Itinerary, ItineraryActivity, HotelVoucher, Job
+from .selection import SparseFieldsMixin
+from .services import create_service_vouchers, plan_voucher_update
 
-class ItineraryActivitySerializer(serializers.ModelSerializer):
+class ItineraryActivitySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     activity_type_display = serializers.CharField(source='get_activity_type_display', read_only=True)
     
     class Meta:
         model = ItineraryActivity
         fields = ['id', 'itinerary', 'time', 'activity_type', 'activity_type_display', 'description', 'location', 'notes']
 
-class ItinerarySerializer(serializers.ModelSerializer):
+class ItinerarySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     activities = ItineraryActivitySerializer(many=True, read_only=True)
     
     class Meta:
         model = Itinerary
         fields = ['id', 'day', 'date', 'service_voucher', 'activities']
+        expandable = ['activities']
 
-class RoomAllocationSerializer(serializers.ModelSerializer):
+class RoomAllocationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     room_type_display = serializers.CharField(source='get_room_type_display', read_only=True)
     
     class Meta:
         model = RoomAllocation
         fields = ['id', 'service_voucher', 'room_type', 'room_type_display', 'quantity']
 
-class TravelerSerializer(serializers.ModelSerializer):
+class TravelerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Traveler
         fields = '__all__'
 
-class ServiceVoucherSerializer(serializers.ModelSerializer):
+class ServiceVoucherSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     traveler = TravelerSerializer(read_only=True)
     traveler_id = serializers.PrimaryKeyRelatedField(
         queryset=Traveler.objects.all(),
@@ -43,11 +47,127 @@ class ServiceVoucherSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceVoucher
         fields = '__all__'
+        expandable = ['traveler', 'room_allocations', 'itinerary_items']
         extra_kwargs = {
             'traveler': {'read_only': True}
         }
 
-class HotelVoucherSerializer(serializers.ModelSerializer):
+class HotelVoucherSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = HotelVoucher
         fields = '__all__'
+
+
+class JobSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'status', 'status_display', 'progress', 'total', 'message', 'attempts',
+            'max_attempts', 'run_after', 'result', 'error', 'created_at', 'started_at', 'finished_at',
+            'download_url',
+        ]
+        read_only_fields = fields
+
+    def get_download_url(self, job):
+        if job.status != Job.SUCCEEDED or not (job.result or {}).get('file'):
+            return None
+        return reverse('job-download', args=[job.pk], request=self.context.get('request'))
+
+
+# The nested write serializers accept an optional ``id`` so that updates can
+# match incoming rows to existing ones; it is ignored on create.
+
+class RoomAllocationWriteSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = RoomAllocation
+        fields = ['id', 'room_type', 'quantity']
+
+class ItineraryActivityWriteSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = ItineraryActivity
+        fields = ['id', 'time', 'activity_type', 'description', 'location', 'notes']
+
+class ItineraryWriteSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+    activities = ItineraryActivityWriteSerializer(many=True, required=False)
+
+    class Meta:
+        model = Itinerary
+        fields = ['id', 'day', 'date', 'activities']
+
+class ServiceVoucherWriteSerializer(serializers.ModelSerializer):
+    """
+    Validates a complete nested voucher payload in one pass.
+
+    Errors from the traveler, every room allocation, itinerary day and
+    activity are collected together; nothing is written until the whole
+    payload is valid, and the nested rows are then bulk inserted.
+
+    On update, nested rows are matched to the voucher's existing rows and
+    only the differences are written (see ``plan_voucher_update``). The
+    resulting row counts are available as ``update_plan.changes``. The plan
+    is made in ``is_valid()``: validate and save in one transaction, with
+    the instance locked, or a concurrent update can be overwritten.
+    """
+    traveler = TravelerSerializer()
+    room_allocations = RoomAllocationWriteSerializer(many=True, required=False)
+    itinerary_items = ItineraryWriteSerializer(many=True, required=False)
+
+    class Meta:
+        model = ServiceVoucher
+        fields = [
+            'id', 'traveler', 'reservation_number', 'hotel_confirmation_number',
+            'travel_start_date', 'travel_end_date', 'hotel_name', 'transfer_type',
+            'meal_plan', 'inclusions', 'arrival_details', 'departure_details',
+            'meeting_point', 'room_allocations', 'itinerary_items',
+        ]
+
+    def validate_room_allocations(self, value):
+        _reject_duplicates(value, 'room_type', 'Duplicate room type.')
+        return value
+
+    def validate_itinerary_items(self, value):
+        _reject_duplicates(value, 'day', 'Duplicate itinerary day.')
+        return value
+
+    def validate(self, attrs):
+        if self.instance is not None:
+            self.update_plan = plan_voucher_update(self.instance, attrs)
+        return attrs
+
+    def create(self, validated_data):
+        return create_service_vouchers([validated_data])[0]
+
+    def update(self, instance, validated_data):
+        self.update_plan.apply()
+        return instance
+
+
+def _reject_duplicates(items, key, message):
+    """Mirror the model's unique_together checks before anything is inserted."""
+    seen = set()
+    errors = []
+    for item in items:
+        value = item.get(key)
+        errors.append({key: [message]} if value is not None and value in seen else {})
+        seen.add(value)
+    if any(errors):
+        raise serializers.ValidationError(errors)
+
+class ServiceVoucherImportSerializer(ServiceVoucherWriteSerializer):
+    """
+    Row serializer for bulk imports.
+
+    ``reservation_number`` uniqueness is checked by the importer with one
+    query per chunk rather than one query per row.
+    """
+
+    class Meta(ServiceVoucherWriteSerializer.Meta):
+        extra_kwargs = {'reservation_number': {'validators': []}}
@@ -0,0 +1,263 @@
+from collections import defaultdict
+
+from django.db import connection
+from rest_framework import serializers
+
+from .models import Traveler, ServiceVoucher, RoomAllocation, Itinerary, ItineraryActivity
+from .signals import vouchers_changed
+
+
+def create_service_vouchers(payloads):
+    """
+    Insert validated voucher payloads together with their nested rows.
+
+    ``payloads`` are ``ServiceVoucherWriteSerializer.validated_data`` dicts.
+    Each table gets a single bulk INSERT however many vouchers, rooms, days
+    and activities are involved, so the cost of a write no longer grows in
+    round trips with the size of the itinerary. Call inside a transaction.
+    """
+    payloads = [dict(payload) for payload in payloads]
+    travelers = insert_returning_pks(
+        Traveler,
+        [Traveler(**payload.pop('traveler')) for payload in payloads],
+    )
+
+    children = []
+    vouchers = []
+    for traveler, payload in zip(travelers, payloads):
+        children.append((
+            payload.pop('room_allocations', []),
+            payload.pop('itinerary_items', []),
+        ))
+        vouchers.append(ServiceVoucher(traveler=traveler, **payload))
+    insert_returning_pks(ServiceVoucher, vouchers, key_fields=['reservation_number'])
+
+    rooms = []
+    itineraries = []
+    activities = []
+    for voucher, (room_data, itinerary_data) in zip(vouchers, children):
+        rooms.extend(RoomAllocation(service_voucher=voucher, **_values(room)) for room in room_data)
+        for item in itinerary_data:
+            itinerary = Itinerary(service_voucher=voucher, **_values(item))
+            itineraries.append(itinerary)
+            activities.extend((itinerary, activity) for activity in item.get('activities', []))
+
+    RoomAllocation.objects.bulk_create(rooms)
+    insert_returning_pks(Itinerary, itineraries, key_fields=['service_voucher_id', 'day'])
+    ItineraryActivity.objects.bulk_create(
+        ItineraryActivity(itinerary=itinerary, **_values(activity)) for itinerary, activity in activities
+    )
+    vouchers_changed.send(sender=ServiceVoucher, voucher_ids=[voucher.pk for voucher in vouchers], created=True)
+    return vouchers
+
+
+def plan_voucher_update(voucher, data):
+    """
+    Work out the smallest set of writes that brings ``voucher`` in line with
+    validated (partial) update ``data``, without writing anything yet.
+
+    Incoming rooms, days and activities are matched to existing rows by
+    ``id`` when given, otherwise by natural key: ``room_type`` for rooms,
+    ``day`` for itinerary days and ``(time, activity_type)`` for activities.
+    Matched rows are updated only if a value differs, unmatched incoming rows
+    are inserted and unmatched existing rows are deleted. A nested list that
+    is left out of ``data`` is not touched at all.
+
+    ``voucher`` should come from ``ServiceVoucher.objects.for_api()`` so its
+    nested rows are already prefetched. Raises ``ValidationError`` when an
+    id does not belong to the voucher or a new row lacks required fields.
+    """
+    data = dict(data)
+    traveler_data = data.pop('traveler', None)
+    room_data = data.pop('room_allocations', None)
+    itinerary_data = data.pop('itinerary_items', None)
+
+    plan = VoucherUpdatePlan(voucher)
+    errors = {}
+    if traveler_data:
+        plan.change(voucher.traveler, traveler_data)
+    plan.change(voucher, data)
+
+    if room_data is not None:
+        _, room_errors = plan.sync(
+            RoomAllocation, voucher.room_allocations.all(), room_data,
+            key_fields=('room_type',), required=('room_type',),
+            build=lambda values: RoomAllocation(service_voucher=voucher, **values),
+        )
+        if any(room_errors):
+            errors['room_allocations'] = room_errors
+
+    if itinerary_data is not None:
+        days, day_errors = plan.sync(
+            Itinerary, voucher.itinerary_items.all(), itinerary_data,
+            key_fields=('day',), required=('day', 'date'),
+            build=lambda values: Itinerary(service_voucher=voucher, **values),
+        )
+        for index, (itinerary, item) in enumerate(zip(days, itinerary_data)):
+            if itinerary is None or 'activities' not in item:
+                continue
+            existing = itinerary.activities.all() if itinerary.pk else []
+            _, activity_errors = plan.sync(
+                ItineraryActivity, existing, item['activities'],
+                key_fields=('time', 'activity_type'), required=('time', 'description'),
+                build=lambda values, itinerary=itinerary: ItineraryActivity(itinerary=itinerary, **values),
+            )
+            if any(activity_errors):
+                day_errors[index] = {**day_errors[index], 'activities': activity_errors}
+        if any(day_errors):
+            errors['itinerary_items'] = day_errors
+
+    if errors:
+        raise serializers.ValidationError(errors)
+    return plan
+
+
+class VoucherUpdatePlan:
+    """Pending inserts, updates and deletes for one nested voucher update."""
+
+    # Reported names, and the order parents are inserted before children.
+    LABELS = {
+        Traveler: 'traveler',
+        ServiceVoucher: 'service_voucher',
+        Itinerary: 'itinerary_items',
+        RoomAllocation: 'room_allocations',
+        ItineraryActivity: 'activities',
+    }
+
+    def __init__(self, voucher):
+        self.voucher = voucher
+        self.to_create = defaultdict(list)
+        self.to_update = defaultdict(dict)
+        self.to_delete = defaultdict(list)
+        self.changes = {}
+
+    def change(self, obj, values):
+        """Assign ``values`` to ``obj`` and schedule an UPDATE if anything differs."""
+        changed = self.to_update[type(obj)].setdefault(obj, set())
+        for field, value in _values(values).items():
+            if getattr(obj, field) != value:
+                setattr(obj, field, value)
+                changed.add(field)
+        if not changed:
+            del self.to_update[type(obj)][obj]
+
+    def sync(self, model, existing, incoming, key_fields, required, build):
+        """
+        Match ``incoming`` dicts to ``existing`` rows of ``model``.
+
+        Returns the matched or newly built object for every incoming item
+        (None where it failed validation) and a parallel list of errors.
+        """
+        existing = list(existing)
+        by_id = {obj.pk: obj for obj in existing}
+        by_key = defaultdict(list)
+        for obj in existing:
+            by_key[tuple(getattr(obj, field) for field in key_fields)].append(obj)
+
+        matched = set()
+        objects = [None] * len(incoming)
+        errors = [{} for _ in incoming]
+        # Explicit ids claim their rows before any natural-key matching.
+        for index, item in enumerate(incoming):
+            if item.get('id') is None:
+                continue
+            obj = by_id.get(item['id'])
+            if obj is None or obj.pk in matched:
+                errors[index] = {'id': ['Does not belong to this service voucher.']}
+                continue
+            matched.add(obj.pk)
+            objects[index] = obj
+
+        for index, item in enumerate(incoming):
+            if item.get('id') is not None:
+                continue
+            key = tuple(item.get(field) for field in key_fields)
+            candidates = [obj for obj in by_key.get(key, []) if obj.pk not in matched]
+            if candidates:
+                objects[index] = candidates[0]
+                matched.add(candidates[0].pk)
+                continue
+            missing = [field for field in required if item.get(field) in (None, '')]
+            if missing:
+                errors[index] = {field: ['This field is required.'] for field in missing}
+                continue
+            objects[index] = build(_values(item))
+            self.to_create[model].append(objects[index])
+
+        for obj, item in zip(objects, incoming):
+            if obj is not None and obj.pk is not None:
+                self.change(obj, item)
+        self.to_delete[model].extend(obj.pk for obj in existing if obj.pk not in matched)
+        return objects, errors
+
+    def apply(self):
+        """Write the plan with bulk statements; call inside a transaction."""
+        changes = {label: {'created': 0, 'updated': 0, 'deleted': 0} for label in self.LABELS.values()}
+
+        # Deletes first, so freed natural keys can be reused by inserts.
+        for model, pks in self.to_delete.items():
+            if pks:
+                # The plan sends vouchers_changed itself, once, below.
+                _, deleted = model.objects.filter(pk__in=pks).delete(notify=False)
+                for deleted_model in self.LABELS:
+                    changes[self.LABELS[deleted_model]]['deleted'] += deleted.get(deleted_model._meta.label, 0)
+
+        for model, rows in self.to_update.items():
+            if rows:
+                fields = sorted(set().union(*rows.values()))
+                model.objects.bulk_update(list(rows), fields)
+                changes[self.LABELS[model]]['updated'] += len(rows)
+
+        for model in self.LABELS:
+            if self.to_create.get(model):
+                if model is Itinerary:
+                    insert_returning_pks(model, self.to_create[model], key_fields=['service_voucher_id', 'day'])
+                else:
+                    model.objects.bulk_create(self.to_create[model])
+                changes[self.LABELS[model]]['created'] += len(self.to_create[model])
+
+        self.changes = changes
+        if any(sum(counts.values()) for counts in changes.values()):
+            vouchers_changed.send(sender=ServiceVoucher, voucher_ids=[self.voucher.pk])
+        return changes
+
+
+def insert_returning_pks(model, objs, key_fields=None, batch_size=None):
+    """
+    bulk_create ``objs`` and make sure they come back with primary keys.
+
+    SQLite before 3.35 cannot return rows from a bulk INSERT; there the keys
+    are read back through ``key_fields`` (a natural key, unique and indexed
+    across the table), or the rows are saved one by one when the model has
+    none.
+    """
+    if not objs or connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+    if key_fields is None:
+        for obj in objs:
+            obj.save(force_insert=True)
+        return objs
+
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    key = lambda values: tuple(values[field] for field in key_fields)
+    pks = {}
+    # Read back in slices that stay under the database's parameter limit.
+    step = connection.ops.bulk_batch_size(key_fields, objs)
+    for offset in range(0, len(objs), step):
+        lookup = {field + '__in': {getattr(obj, field) for obj in objs[offset:offset + step]} for field in key_fields}
+        pks.update(
+            (key(row), row['pk'])
+            for row in model.objects.filter(**lookup).values('pk', *key_fields)
+        )
+    for obj in objs:
+        obj.pk = pks[key({field: getattr(obj, field) for field in key_fields})]
+        obj._state.adding = False
+    return objs
+
+
+def _values(data):
+    """Column values from a validated nested payload, without id or child lists."""
+    return {
+        field: value for field, value in data.items()
+        if field != 'id' and not isinstance(value, list)
+    }
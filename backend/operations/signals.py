@@ -0,0 +1,100 @@
+"""
+Change notifications for service vouchers.
+
+``vouchers_changed`` is sent with the ids of every voucher whose own row or
+nested rows (traveler, room allocations, itinerary days, activities) were
+written. Per-instance saves, and deletes of travelers and vouchers, send
+it from the model signals below. Rooms, days and activities have no delete
+signals, so Django can delete them in bulk; their querysets and instances
+send it once per delete (``models.VoucherChildQuerySet``). The bulk write
+paths in ``services`` bypass model signals and send it themselves, once per
+batch. ``created`` is true when the vouchers themselves were just inserted.
+
+The same receivers keep the search table (``search``) and the hotel
+occupancy table (``occupancy``) in step with the rows they are derived from.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from . import occupancy, search, stats
+from .models import Traveler, ServiceVoucher, RoomAllocation, Itinerary, ItineraryActivity, HotelVoucher
+
+vouchers_changed = Signal()
+
+
+def _voucher_ids(instance):
+    if isinstance(instance, ServiceVoucher):
+        return [instance.pk]
+    if isinstance(instance, (RoomAllocation, Itinerary)):
+        return [instance.service_voucher_id]
+    if isinstance(instance, ItineraryActivity):
+        return [instance.voucher_id()]
+    return list(instance.bookings.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Traveler)
+@receiver(post_save, sender=ServiceVoucher)
+@receiver(post_save, sender=RoomAllocation)
+@receiver(post_save, sender=Itinerary)
+@receiver(post_save, sender=ItineraryActivity)
+@receiver(post_delete, sender=Traveler)
+@receiver(post_delete, sender=ServiceVoucher)
+def instance_changed(sender, instance, created=False, signal=None, **kwargs):
+    vouchers_changed.send(
+        sender=sender, voucher_ids=_voucher_ids(instance), created=created and sender is ServiceVoucher,
+        deleted=signal is post_delete and sender is ServiceVoucher,
+    )
+
+
+@receiver(vouchers_changed)
+def bump_versions(sender, voucher_ids, created=False, deleted=False, **kwargs):
+    # New vouchers start at version 1 and deleted ones need none. The rest
+    # are collected on the connection and bumped once per transaction, with
+    # one UPDATE when it commits (at once outside a transaction).
+    if created or deleted:
+        return
+    connection = transaction.get_connection()
+    if not hasattr(connection, 'pending_version_bumps'):
+        connection.pending_version_bumps = set()
+    connection.pending_version_bumps.update(voucher_ids)
+    # Registered on every send: a rolled-back (savepoint) block drops its
+    # callbacks, and bumping a leftover id again is harmless.
+    transaction.on_commit(_flush_version_bumps)
+
+
+def _flush_version_bumps():
+    connection = transaction.get_connection()
+    voucher_ids, connection.pending_version_bumps = connection.pending_version_bumps, set()
+    if voucher_ids:
+        # Incrementing in SQL keeps concurrent writers from reusing a version number.
+        ServiceVoucher.objects.filter(pk__in=voucher_ids).update(
+            version=F('version') + 1, updated_at=timezone.now(),
+        )
+
+
+@receiver(vouchers_changed)
+def invalidate_dashboard_stats(sender, voucher_ids, **kwargs):
+    transaction.on_commit(stats.invalidate)
+
+
+@receiver(vouchers_changed)
+def reindex_search(sender, voucher_ids, **kwargs):
+    # Only the voucher and traveler rows carry searchable text.
+    if sender in (ServiceVoucher, Traveler):
+        search.reindex_service_vouchers(voucher_ids)
+
+
+@receiver(vouchers_changed)
+def update_occupancy(sender, voucher_ids, created=False, **kwargs):
+    # Occupancy depends on the voucher's hotel and dates and on its rooms.
+    if sender in (ServiceVoucher, RoomAllocation):
+        occupancy.refresh(voucher_ids, created=created)
+
+
+@receiver(post_save, sender=HotelVoucher)
+@receiver(post_delete, sender=HotelVoucher)
+def hotel_voucher_changed(sender, instance, **kwargs):
+    search.reindex_hotel_vouchers([instance.pk])
@@ -0,0 +1,96 @@
+"""
+Dashboard aggregates, computed in the database and cached briefly.
+
+Cached entries are keyed by a generation number that ``invalidate`` bumps
+whenever vouchers change (see ``signals``), so a write is visible on the next
+dashboard load in the same process. Other processes using a per-process
+cache (the default LocMemCache) catch up within the TTL.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Traveler, ServiceVoucher, RoomAllocation
+
+GENERATION_KEY = 'operations:dashboard-stats:generation'
+DEFAULT_DAYS = 7
+MAX_DAYS = 90
+
+
+def _choice_counts(rows, field, choices):
+    counts = {code: 0 for code, _ in choices}
+    for row in rows:
+        counts[row[field]] = row['count']
+    return counts
+
+
+def compute(days=DEFAULT_DAYS, today=None):
+    """Aggregate the dashboard figures for the ``days`` days starting ``today``."""
+    today = today or timezone.localdate()
+    window = (today, today + timedelta(days=days - 1))
+
+    totals = ServiceVoucher.objects.aggregate(
+        total=Count('id'),
+        arrivals=Count('id', filter=Q(travel_start_date__range=window)),
+        departures=Count('id', filter=Q(travel_end_date__range=window)),
+    )
+    by_transfer_type = ServiceVoucher.objects.order_by().values('transfer_type').annotate(count=Count('id'))
+    by_meal_plan = ServiceVoucher.objects.order_by().values('meal_plan').annotate(count=Count('id'))
+    arrivals_by_day = (
+        ServiceVoucher.objects.filter(travel_start_date__range=window)
+        .order_by('travel_start_date').values('travel_start_date').annotate(count=Count('id'))
+    )
+    departures_by_day = (
+        ServiceVoucher.objects.filter(travel_end_date__range=window)
+        .order_by('travel_end_date').values('travel_end_date').annotate(count=Count('id'))
+    )
+    rooms = RoomAllocation.objects.order_by().values('room_type').annotate(count=Sum('quantity'))
+    pax = Traveler.objects.aggregate(adults=Sum('num_adults'), infants=Sum('num_infants'))
+
+    return {
+        'generated_at': timezone.now(),
+        'window': {'start': window[0], 'end': window[1], 'days': days},
+        'vouchers': {
+            'total': totals['total'],
+            'by_transfer_type': _choice_counts(by_transfer_type, 'transfer_type', ServiceVoucher.TRANSFER_TYPES),
+            'by_meal_plan': _choice_counts(by_meal_plan, 'meal_plan', ServiceVoucher.MEAL_PLANS),
+        },
+        'upcoming': {
+            'arrivals': totals['arrivals'],
+            'departures': totals['departures'],
+            'arrivals_by_day': [
+                {'date': row['travel_start_date'], 'count': row['count']} for row in arrivals_by_day
+            ],
+            'departures_by_day': [
+                {'date': row['travel_end_date'], 'count': row['count']} for row in departures_by_day
+            ],
+        },
+        'rooms_by_type': _choice_counts(rooms, 'room_type', RoomAllocation.ROOM_TYPES),
+        'pax': {
+            'adults': pax['adults'] or 0,
+            'infants': pax['infants'] or 0,
+            'total': (pax['adults'] or 0) + (pax['infants'] or 0),
+        },
+    }
+
+
+def dashboard_stats(days=DEFAULT_DAYS):
+    """``compute(days)``, served from the cache when a fresh copy exists."""
+    today = timezone.localdate()
+    generation = cache.get_or_set(GENERATION_KEY, 0, None)
+    key = f'operations:dashboard-stats:{generation}:{today.isoformat()}:{days}'
+    return cache.get_or_set(
+        key, lambda: compute(days, today),
+        getattr(settings, 'DASHBOARD_STATS_CACHE_TTL', 60),
+    )
+
+
+def invalidate():
+    """Make the next ``dashboard_stats`` call recompute."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
@@ -0,0 +1,48 @@
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class QueryBudgetTestCase(APITestCase):
+    """
+    APITestCase with an authenticated client and query-budget assertions.
+
+    Subclasses declare how many queries an endpoint may run; going over the
+    budget fails the test and prints every captured statement.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username='budget', password='budget', role='STAFF'
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        # Cached responses are keyed by row ids, which restart in every test.
+        cache.clear()
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            statements = '\n'.join(
+                f"{index}. {query['sql']}"
+                for index, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(f"{executed} queries executed, budget is {budget}:\n{statements}")
+
+    def assertEndpointWithinBudget(self, url, budget, method='get', status_code=200, **kwargs):
+        """Request ``url`` and fail if it errors or runs more than ``budget`` queries."""
+        with self.assertMaxQueries(budget):
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertEqual(response.status_code, status_code, getattr(response, 'data', None))
+        return response
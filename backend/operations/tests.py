@@ -0,0 +1,1593 @@
+import io
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import zipfile
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import instrumentation, logs
+from core.sqlite3.base import DatabaseWrapper
+
+from . import jobs, transfers
+from .pdf import PdfCache
+from .readers import ServiceVoucherReader
+from .renderers import FastJSONRenderer
+from .services import plan_voucher_update
+from .views import (
+    TravelerViewSet, ServiceVoucherViewSet, HotelVoucherViewSet, ItineraryViewSet, ItineraryActivityViewSet,
+)
+from .models import (
+    Traveler, ServiceVoucher, RoomAllocation, Itinerary, ItineraryActivity, HotelVoucher, HotelOccupancy,
+    OccupancyLedger, Job,
+)
+from .testing import QueryBudgetTestCase
+
+
+def make_voucher(number, days=2, activities_per_day=2, rooms=(('DBL', 2), ('SGL', 1))):
+    traveler = Traveler.objects.create(name=f'Guest {number}', num_adults=2, num_infants=0)
+    start = date(2025, 1, 1) + timedelta(days=number)
+    voucher = ServiceVoucher.objects.create(
+        traveler=traveler,
+        reservation_number=f'RES-{number:05d}',
+        hotel_confirmation_number=f'CONF-{number:05d}',
+        travel_start_date=start,
+        travel_end_date=start + timedelta(days=days),
+        hotel_name='Grand Hotel',
+        transfer_type='SHARED',
+        meal_plan='BB',
+    )
+    for room_type, quantity in rooms:
+        RoomAllocation.objects.create(service_voucher=voucher, room_type=room_type, quantity=quantity)
+    for day in range(1, days + 1):
+        itinerary = Itinerary.objects.create(
+            service_voucher=voucher, day=day, date=start + timedelta(days=day - 1)
+        )
+        for hour in range(activities_per_day):
+            ItineraryActivity.objects.create(
+                itinerary=itinerary,
+                time=time(8 + hour),
+                activity_type='TOUR',
+                description=f'Activity {hour}',
+            )
+    return voucher
+
+
+class ServiceVoucherQueryBudgetTests(QueryBudgetTestCase):
+    # COUNT, vouchers + traveler + total_rooms, rooms, itineraries, activities
+    LIST_BUDGET = 5
+    # The detail view looks the version up first (see ConditionalDetailTests)
+    DETAIL_BUDGET = 5
+
+    def test_list_is_constant_in_page_size_and_itinerary_depth(self):
+        make_voucher(1)
+        small = self.assertEndpointWithinBudget(reverse('service-voucher-list'), self.LIST_BUDGET)
+        self.assertEqual(len(small.data['results']), 1)
+
+        for number in range(2, 12):
+            make_voucher(number, days=7, activities_per_day=4)
+        large = self.assertEndpointWithinBudget(reverse('service-voucher-list'), self.LIST_BUDGET)
+        self.assertEqual(len(large.data['results']), 10)
+
+    def test_detail(self):
+        voucher = make_voucher(1, days=14, activities_per_day=4)
+        response = self.assertEndpointWithinBudget(
+            reverse('service-voucher-detail', args=[voucher.pk]), self.DETAIL_BUDGET
+        )
+        self.assertEqual(len(response.data['itinerary_items']), 14)
+        self.assertEqual(len(response.data['itinerary_items'][0]['activities']), 4)
+
+    def test_total_rooms_is_computed_in_the_database(self):
+        voucher = make_voucher(1, rooms=(('DBL', 2), ('TWN', 3)))
+        annotated = ServiceVoucher.objects.with_total_rooms().get(pk=voucher.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(annotated.total_rooms, 5)
+        self.assertEqual(ServiceVoucher.objects.get(pk=voucher.pk).total_rooms, 5)
+
+        empty = make_voucher(2, rooms=())
+        self.assertEqual(ServiceVoucher.objects.with_total_rooms().get(pk=empty.pk).total_rooms, 0)
+
+
+class RelatedEndpointQueryBudgetTests(QueryBudgetTestCase):
+    def test_itinerary_list(self):
+        for number in range(1, 6):
+            make_voucher(number, days=3, activities_per_day=3)
+        # COUNT, itineraries, activities
+        self.assertEndpointWithinBudget(reverse('itinerary-list'), 3)
+
+    def test_hotel_voucher_list(self):
+        HotelVoucher.objects.bulk_create(
+            HotelVoucher(
+                hotel_name='Grand Hotel',
+                hotel_address='1 Beach Road',
+                guest_name=f'Guest {number}',
+                number_of_rooms=1,
+                check_in_date=date(2025, 1, 1),
+                check_out_date=date(2025, 1, 3),
+                number_of_nights=2,
+                confirmation_number=f'HV-{number}',
+            )
+            for number in range(20)
+        )
+        self.assertEndpointWithinBudget(reverse('hotel-voucher-list'), 2)
+
+
+def voucher_payload(number, days=2, activities_per_day=2):
+    start = date(2025, 3, 1)
+    return {
+        'traveler': {'name': f'Guest {number}', 'num_adults': 2, 'num_infants': 1},
+        'reservation_number': f'NEW-{number:05d}',
+        'hotel_confirmation_number': f'HC-{number:05d}',
+        'travel_start_date': start.isoformat(),
+        'travel_end_date': (start + timedelta(days=days)).isoformat(),
+        'hotel_name': 'Harbour Hotel',
+        'transfer_type': 'PRIVATE',
+        'meal_plan': 'HB',
+        'room_allocations': [{'room_type': 'DBL', 'quantity': 2}, {'room_type': 'SGL', 'quantity': 1}],
+        'itinerary_items': [
+            {
+                'day': day,
+                'date': (start + timedelta(days=day - 1)).isoformat(),
+                'activities': [
+                    {'time': f'{8 + hour:02d}:00', 'activity_type': 'TOUR', 'description': f'Stop {hour}'}
+                    for hour in range(activities_per_day)
+                ],
+            }
+            for day in range(1, days + 1)
+        ],
+    }
+
+
+class ServiceVoucherCreateTests(QueryBudgetTestCase):
+    # Validation (reservation_number uniqueness), savepoint, one INSERT per
+    # table, the search index refresh (DELETE, INSERT ... SELECT), the
+    # occupancy refresh (rooms read, upsert, ledger INSERT), release, then
+    # the for_api() read-back for the response.
+    CREATE_BUDGET = 17
+
+    def test_create_writes_nested_rows(self):
+        response = self.assertEndpointWithinBudget(
+            reverse('service-voucher-list'), self.CREATE_BUDGET, method='post',
+            status_code=201, data=voucher_payload(1, days=3, activities_per_day=2), format='json',
+        )
+        voucher = ServiceVoucher.objects.get(pk=response.data['id'])
+        self.assertEqual(voucher.traveler.name, 'Guest 1')
+        self.assertEqual(response.data['total_rooms'], 3)
+        self.assertEqual([item['day'] for item in response.data['itinerary_items']], [1, 2, 3])
+        self.assertEqual(ItineraryActivity.objects.filter(itinerary__service_voucher=voucher).count(), 6)
+
+    def test_create_cost_does_not_grow_with_itinerary(self):
+        self.assertEndpointWithinBudget(
+            reverse('service-voucher-list'), self.CREATE_BUDGET, method='post',
+            status_code=201, data=voucher_payload(2, days=14, activities_per_day=4), format='json',
+        )
+
+    def test_all_errors_are_reported_and_nothing_is_written(self):
+        payload = voucher_payload(3)
+        payload['traveler'] = {'num_adults': 'two'}
+        payload['room_allocations'].append({'room_type': 'DBL', 'quantity': 1})
+        payload['itinerary_items'][1]['activities'][0]['activity_type'] = 'SKYDIVE'
+
+        response = self.client.post(reverse('service-voucher-list'), payload, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        details = response.data['details']
+        self.assertEqual(set(details['traveler']), {'name', 'num_adults'})
+        self.assertIn('room_type', details['room_allocations'][2])
+        self.assertIn('activity_type', details['itinerary_items'][1]['activities'][0])
+        self.assertFalse(Traveler.objects.exists())
+        self.assertFalse(ServiceVoucher.objects.exists())
+
+
+class ServiceVoucherUpdateTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.voucher = make_voucher(1, days=3, activities_per_day=2)
+        self.url = reverse('service-voucher-detail', args=[self.voucher.pk])
+        self.payload = self.client.get(self.url).data
+
+    def test_unchanged_payload_touches_nothing(self):
+        before = set(ItineraryActivity.objects.values_list('pk', flat=True))
+        response = self.client.patch(self.url, self.payload, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        touched = sum(sum(counts.values()) for counts in response.data['changes'].values())
+        self.assertEqual(touched, 0)
+        self.assertEqual(set(ItineraryActivity.objects.values_list('pk', flat=True)), before)
+
+    def test_single_activity_change_updates_one_row(self):
+        activity = self.payload['itinerary_items'][1]['activities'][0]
+        activity['time'] = '07:15:00'
+
+        response = self.client.patch(self.url, self.payload, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['changes']['activities'], {'created': 0, 'updated': 1, 'deleted': 0})
+        self.assertEqual(ItineraryActivity.objects.get(pk=activity['id']).time, time(7, 15))
+
+    def test_rows_matched_by_natural_key(self):
+        rooms = [{'room_type': 'DBL', 'quantity': 5}, {'room_type': 'TPL', 'quantity': 1}]
+        days = [{'day': 1, 'date': '2025-01-02'}, {'day': 4, 'date': '2025-01-05', 'activities': [
+            {'time': '09:00', 'activity_type': 'TRANSFER', 'description': 'Airport'},
+        ]}]
+
+        response = self.client.patch(
+            self.url, {'room_allocations': rooms, 'itinerary_items': days}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200, response.data)
+        changes = response.data['changes']
+        self.assertEqual(changes['room_allocations'], {'created': 1, 'updated': 1, 'deleted': 1})
+        # Day 1 keeps its activities; days 2 and 3 go with theirs.
+        self.assertEqual(changes['itinerary_items'], {'created': 1, 'updated': 0, 'deleted': 2})
+        self.assertEqual(changes['activities'], {'created': 1, 'updated': 0, 'deleted': 4})
+        self.assertEqual(response.data['total_rooms'], 6)
+        self.assertEqual([item['day'] for item in response.data['itinerary_items']], [1, 4])
+
+    def test_delete_cost_does_not_grow_with_rows(self):
+        voucher = make_voucher(2, days=14, activities_per_day=4)
+        url = reverse('service-voucher-detail', args=[voucher.pk])
+        days = self.client.get(url).data['itinerary_items'][:1]
+        # Children are deleted in bulk, without a signal (or a lookup) per row.
+        with self.assertMaxQueries(18):
+            response = self.client.patch(url, {'itinerary_items': days}, format='json')
+        self.assertEqual(response.data['changes']['activities']['deleted'], 52)
+
+        with self.assertMaxQueries(14):
+            ServiceVoucher.objects.get(pk=voucher.pk).delete()
+        self.assertFalse(Itinerary.objects.filter(service_voucher_id=voucher.pk).exists())
+
+    def test_plan_is_made_in_the_transaction_that_applies_it(self):
+        depths = []
+
+        def plan(voucher, data):
+            depths.append(len(connection.atomic_blocks))
+            return plan_voucher_update(voucher, data)
+
+        with mock.patch('operations.serializers.plan_voucher_update', plan):
+            response = self.client.patch(self.url, {'room_allocations': [{'room_type': 'DBL', 'quantity': 5}]},
+                                         format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(depths, [len(connection.atomic_blocks) + 1])
+
+    def test_foreign_ids_and_incomplete_new_rows_are_rejected(self):
+        other = make_voucher(2)
+        foreign_room = other.room_allocations.first()
+        response = self.client.patch(self.url, {
+            'room_allocations': [{'id': foreign_room.pk, 'room_type': 'DBL', 'quantity': 1}],
+            'itinerary_items': [{'day': 9}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('id', response.data['details']['room_allocations'][0])
+        self.assertIn('date', response.data['details']['itinerary_items'][0])
+        self.assertEqual(self.voucher.room_allocations.count(), 2)
+
+
+class VoucherImportTests(QueryBudgetTestCase):
+    CSV = (
+        'reservation_number,hotel_confirmation_number,travel_start_date,travel_end_date,hotel_name,'
+        'transfer_type,meal_plan,traveler_name,num_adults,room_allocations\n'
+        'CSV-1,HC-1,2025-05-01,2025-05-04,Palm Hotel,SHARED,BB,Ana,2,DBL:1;SGL:2\n'
+        'CSV-2,HC-2,2025-05-02,,Palm Hotel,GROUP,XX,Ben,1,TWN\n'
+        'CSV-1,HC-3,2025-05-03,,Palm Hotel,GROUP,FB,Cy,1,\n'
+    )
+
+    def upload(self, name, content, **params):
+        url = reverse('service-voucher-import-file')
+        if params:
+            url += '?' + '&'.join(f'{key}={value}' for key, value in params.items())
+        return self.client.post(url, {'file': SimpleUploadedFile(name, content.encode())}, format='multipart')
+
+    def test_csv_upload_reports_counts_and_failed_rows(self):
+        response = self.upload('bookings.csv', self.CSV)
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 2))
+        failures = response.data['failures']
+        self.assertEqual([(result['row'], result['status']) for result in failures], [(2, 'error'), (3, 'error')])
+        self.assertIn('meal_plan', failures[0]['errors'])
+        self.assertIn('reservation_number', failures[1]['errors'])
+        voucher = ServiceVoucher.objects.with_total_rooms().get(reservation_number='CSV-1')
+        self.assertEqual((voucher.traveler.name, voucher.total_rooms), ('Ana', 3))
+
+    def test_ndjson_chunks_use_constant_queries_per_chunk(self):
+        lines = [json.dumps(voucher_payload(number, days=3)) for number in range(1, 41)]
+        lines.insert(5, '{not json')
+        # Per chunk: reservation_number lookup, savepoint, five INSERTs, the
+        # search index refresh (two statements), the occupancy refresh (three
+        # statements), release.
+        with self.assertMaxQueries(5 * 13):
+            response = self.upload('bookings.ndjson', '\n'.join(lines), chunk_size=10)
+
+        self.assertEqual((response.data['created'], response.data['failed']), (40, 1))
+        self.assertEqual([result['row'] for result in response.data['failures']], [6])
+        self.assertEqual(Itinerary.objects.count(), 120)
+
+    @override_settings(IMPORT_MAX_CHUNK_SIZE=100)
+    def test_chunk_size_is_bounded(self):
+        for chunk_size in ('0', '101', 'many'):
+            with self.subTest(chunk_size=chunk_size):
+                for background in ('false', 'true'):
+                    response = self.upload('bookings.csv', self.CSV, chunk_size=chunk_size, background=background)
+                    self.assertEqual(response.status_code, 400)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(self.upload('bookings.csv', self.CSV, chunk_size=100).status_code, 200)
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as source:
+            source.write(self.CSV)
+        self.addCleanup(os.unlink, source.name)
+        with tempfile.NamedTemporaryFile('r', suffix='.ndjson') as report:
+            out = StringIO()
+            call_command('import_vouchers', source.name, report=report.name, chunk_size=2, stdout=out)
+            results = [json.loads(line) for line in report]
+
+        self.assertIn('Imported 1 service vouchers, 2 rows failed', out.getvalue())
+        self.assertEqual([result['status'] for result in results], ['created', 'error', 'error'])
+
+
+class ExportTests(QueryBudgetTestCase):
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_service_voucher_csv_round_trips_through_import(self):
+        for number in range(1, 6):
+            make_voucher(number)
+        url = reverse('service-voucher-export')
+        body = self.read(self.client.get(url, {'start': '2025-01-03', 'end': '2025-01-05'}))
+
+        lines = body.splitlines()
+        self.assertTrue(lines[0].startswith('id,reservation_number,'))
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['RES-00002', 'RES-00003', 'RES-00004'])
+        self.assertIn('Guest 2,2,0,,,DBL:2;SGL:1', lines[1])
+
+        ServiceVoucher.objects.all().delete()
+        response = self.client.post(
+            reverse('service-voucher-import-file'),
+            {'file': SimpleUploadedFile('export.csv', body.encode())}, format='multipart',
+        )
+        self.assertEqual(response.data['created'], 3, response.data)
+
+    def test_service_voucher_ndjson_is_the_nested_payload(self):
+        make_voucher(1, days=2, activities_per_day=3)
+        body = self.read(self.client.get(reverse('service-voucher-export'), {'export_format': 'ndjson'}))
+
+        record = json.loads(body)
+        self.assertEqual(record['traveler']['name'], 'Guest 1')
+        self.assertEqual(len(record['itinerary_items']), 2)
+        self.assertEqual(record['itinerary_items'][0]['activities'][0]['time'], '08:00:00')
+
+    def test_exports_read_in_constant_queries_per_chunk(self):
+        for number in range(1, 4):
+            make_voucher(number, days=2, activities_per_day=2)
+        Itinerary.objects.create(service_voucher=ServiceVoucher.objects.first(), day=9, date=date(2025, 2, 1))
+
+        with self.assertMaxQueries(3):
+            body = self.read(self.client.get(reverse('itinerary-export')))
+        rows = body.splitlines()[1:]
+        self.assertEqual(len(rows), 3 * 2 * 2 + 1)
+        self.assertTrue(rows[-1].endswith(',9,2025-02-01,,,,,,'))
+
+    def test_hotel_voucher_ndjson_and_bad_parameters(self):
+        HotelVoucher.objects.create(
+            hotel_name='Grand Hotel', hotel_address='1 Beach Road', guest_name='Ana',
+            number_of_rooms=1, check_in_date=date(2025, 1, 1), check_out_date=date(2025, 1, 3),
+            number_of_nights=2, confirmation_number='HV-1',
+        )
+        url = reverse('hotel-voucher-export')
+        record = json.loads(self.read(self.client.get(url, {'export_format': 'ndjson'})))
+        self.assertEqual((record['guest_name'], record['check_in_date']), ('Ana', '2025-01-01'))
+
+        self.assertEqual(self.client.get(url, {'export_format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '01/02/2025'}).status_code, 400)
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT='text/csv').status_code, 200)
+
+
+class VoucherPdfTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = cache_dir.name
+        overrides = override_settings(VOUCHER_PDF_CACHE_DIR=self.cache_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def download(self, url, **headers):
+        response = self.client.get(url, **headers)
+        if response.status_code == 200:
+            self.assertEqual(response['Content-Type'], 'application/pdf')
+            self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        return response
+
+    def test_cached_until_the_voucher_changes(self):
+        voucher = make_voucher(1, days=3)
+        url = reverse('service-voucher-pdf', args=[voucher.pk])
+
+        first = self.download(url)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        self.assertEqual(self.download(url)['ETag'], first['ETag'])
+        for header in (first['ETag'], f'"stale", W/{first["ETag"]}', '*'):
+            self.assertEqual(self.download(url, HTTP_IF_NONE_MATCH=header).status_code, 304)
+        self.assertEqual(self.download(url, HTTP_IF_NONE_MATCH=f'"x{first["ETag"][1:]}').status_code, 200)
+
+        ItineraryActivity.objects.filter(itinerary__service_voucher=voucher).update(location='Old Town')
+        changed = self.download(url)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_hotel_voucher(self):
+        voucher = HotelVoucher.objects.create(
+            hotel_name='Grand Hotel', hotel_address='1 Beach Road', guest_name='Ana & <Ben>',
+            number_of_rooms=1, check_in_date=date(2025, 1, 1), check_out_date=date(2025, 1, 3),
+            number_of_nights=2, confirmation_number='HV-1',
+        )
+        response = self.download(reverse('hotel-voucher-pdf', args=[voucher.pk]))
+        self.assertIn('hotel-voucher-HV-1.pdf', response['Content-Disposition'])
+
+    def test_served_when_evicted_as_soon_as_rendered(self):
+        voucher = make_voucher(1)
+        with override_settings(VOUCHER_PDF_CACHE_MAX_BYTES=1):
+            self.assertEqual(self.download(reverse('service-voucher-pdf', args=[voucher.pk])).status_code, 200)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = PdfCache(self.cache_dir, max_bytes=1000)
+        for age, key in enumerate(('a', 'b', 'c')):
+            cache.put(key, b'x' * 100)
+            os.utime(cache.path(key), (age, age))
+        cache.max_bytes = 250
+        cache.get('a')
+        cache.put('d', b'x' * 100)
+
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['a.pdf', 'd.pdf'])
+
+
+class PaginationTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Traveler.objects.bulk_create(Traveler(name=f'Guest {number}') for number in range(25))
+
+    def test_page_number_pagination_honours_bounded_page_size(self):
+        url = reverse('traveler-list')
+        self.assertEqual(len(self.client.get(url, {'page_size': 4}).data['results']), 4)
+        self.assertEqual(len(self.client.get(url).data['results']), 10)
+        response = self.client.get(url, {'page_size': 1000})
+        self.assertEqual((response.data['count'], len(response.data['results'])), (25, 25))
+
+    def test_cursor_pages_walk_the_table_without_counting(self):
+        url = reverse('traveler-list') + '?pagination=cursor&page_size=10'
+        seen = []
+        while url:
+            with self.assertMaxQueries(1):
+                response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, sorted(Traveler.objects.values_list('id', flat=True), reverse=True))
+
+    def test_cursor_count_is_opt_in(self):
+        response = self.client.get(reverse('traveler-list'), {'pagination': 'cursor', 'include_count': 'true'})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_voucher_endpoints_support_cursor_mode(self):
+        make_voucher(1)
+        make_voucher(2)
+        for name in ('service-voucher-list', 'hotel-voucher-list'):
+            response = self.client.get(reverse(name), {'pagination': 'cursor', 'page_size': 1})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+        response = self.client.get(reverse('service-voucher-list'), {'pagination': 'cursor', 'page_size': 1})
+        self.assertEqual(response.data['results'][0]['reservation_number'], 'RES-00002')
+        self.assertIn('cursor=', response.data['next'])
+
+        # A cursor on a non-unique column would skip or repeat rows between pages.
+        response = self.client.get(reverse('service-voucher-list'), {'pagination': 'cursor', 'ordering': 'hotel_name'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+        response = self.client.get(reverse('service-voucher-list'), {'pagination': 'cursor', 'ordering': 'id'})
+        self.assertEqual([row['reservation_number'] for row in response.data['results']], ['RES-00001', 'RES-00002'])
+
+
+class DashboardStatsTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = reverse('dashboard-stats-list')
+
+    def test_aggregates(self):
+        today = date.today()
+        make_voucher(1)
+        arriving = make_voucher(2, rooms=(('TWN', 4),))
+        ServiceVoucher.objects.filter(pk=arriving.pk).update(
+            travel_start_date=today + timedelta(days=1), travel_end_date=today + timedelta(days=3),
+            meal_plan='AI',
+        )
+
+        response = self.assertEndpointWithinBudget(self.url, 8, data={'days': 7})
+
+        data = response.data
+        self.assertEqual(data['vouchers']['total'], 2)
+        self.assertEqual(data['vouchers']['by_transfer_type'], {'PRIVATE': 0, 'SHARED': 2, 'GROUP': 0})
+        self.assertEqual(data['vouchers']['by_meal_plan'], {'BB': 1, 'HB': 0, 'FB': 0, 'AI': 1})
+        self.assertEqual((data['upcoming']['arrivals'], data['upcoming']['departures']), (1, 1))
+        self.assertEqual(data['upcoming']['arrivals_by_day'], [{'date': today + timedelta(days=1), 'count': 1}])
+        self.assertEqual(data['rooms_by_type'], {'SGL': 1, 'DBL': 2, 'TWN': 4, 'TPL': 0})
+        self.assertEqual(data['pax'], {'adults': 4, 'infants': 0, 'total': 4})
+
+    def test_cached_until_a_write(self):
+        make_voucher(1)
+        self.client.get(self.url)
+        # Served from the cache without touching the database.
+        self.assertEndpointWithinBudget(self.url, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('service-voucher-list'), voucher_payload(2), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.get(self.url).data['vouchers']['total'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Traveler.objects.filter(name='Guest 1').get().bookings.get().delete()
+        self.assertEqual(self.client.get(self.url).data['vouchers']['total'], 1)
+
+    def test_days_is_bounded(self):
+        self.assertEqual(self.client.get(self.url, {'days': 0}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'days': 'week'}).status_code, 400)
+
+
+class ListFilterTests(QueryBudgetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for number, hotel, transfer_type, meal_plan in [
+                (1, 'Grand Hotel', 'SHARED', 'BB'), (2, 'Sea View', 'PRIVATE', 'HB'),
+                (3, 'Sea View', 'GROUP', 'AI'), (4, 'Grand Hotel', 'PRIVATE', 'AI')]:
+            voucher = make_voucher(number, days=1, activities_per_day=0)
+            ServiceVoucher.objects.filter(pk=voucher.pk).update(
+                hotel_name=hotel, transfer_type=transfer_type, meal_plan=meal_plan)
+            HotelVoucher.objects.create(
+                hotel_name=hotel, hotel_address='Main St', guest_name=f'Guest {number}', number_of_rooms=1,
+                check_in_date=voucher.travel_start_date, check_out_date=voucher.travel_end_date,
+                number_of_nights=1, confirmation_number=f'H-{number}',
+            )
+
+    def numbers(self, name, key, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return [row[key] for row in response.data['results']]
+
+    def test_service_voucher_filters(self):
+        numbers = lambda **params: self.numbers('service-voucher-list', 'reservation_number', **params)
+        self.assertEqual(numbers(travel_start_date_after='2025-01-03', travel_start_date_before='2025-01-04'),
+                         ['RES-00003', 'RES-00002'])
+        self.assertEqual(numbers(travel_end_date_before='2025-01-04'), ['RES-00002', 'RES-00001'])
+        self.assertEqual(numbers(hotel_name='Sea View', transfer_type='GROUP'), ['RES-00003'])
+        self.assertEqual(numbers(meal_plan='AI,HB', ordering='travel_start_date'),
+                         ['RES-00002', 'RES-00003', 'RES-00004'])
+
+    def test_hotel_voucher_filters_and_ordering(self):
+        numbers = lambda **params: self.numbers('hotel-voucher-list', 'confirmation_number', **params)
+        self.assertEqual(numbers(check_in_date_after='2025-01-04'), ['H-4', 'H-3'])
+        self.assertEqual(numbers(check_out_date_before='2025-01-03', hotel_name='Grand Hotel'), ['H-1'])
+        self.assertEqual(numbers(ordering='hotel_name'), ['H-4', 'H-1', 'H-3', 'H-2'])
+
+    def test_filtered_list_stays_within_budget(self):
+        self.assertEndpointWithinBudget(
+            reverse('service-voucher-list'), ServiceVoucherQueryBudgetTests.LIST_BUDGET,
+            data={'hotel_name': 'Sea View', 'travel_start_date_after': '2025-01-01'},
+        )
+
+    def test_bad_values_are_rejected(self):
+        response = self.client.get(reverse('service-voucher-list'), {
+            'travel_start_date_after': 'soon', 'meal_plan': 'BB,XX',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'travel_start_date_after', 'meal_plan'})
+        self.assertEqual(
+            self.client.get(reverse('hotel-voucher-list'), {'check_out_date_before': '2025-13-01'}).status_code, 400)
+
+    def test_filters_use_the_indexes(self):
+        queries = {
+            'sv_start_date_idx': ServiceVoucher.objects.filter(travel_start_date__gte=date(2025, 1, 2)),
+            'sv_hotel_start_idx': ServiceVoucher.objects.filter(
+                hotel_name='Sea View', travel_start_date__gte=date(2025, 1, 2)),
+            'sv_transfer_start_idx': ServiceVoucher.objects.filter(
+                transfer_type='PRIVATE', travel_start_date__lte=date(2025, 1, 5)),
+            'hv_check_out_idx': HotelVoucher.objects.filter(check_out_date__lte=date(2025, 1, 5)),
+        }
+        for index, queryset in queries.items():
+            with self.subTest(index=index):
+                self.assertIn(index, queryset.only('id').explain())
+
+
+class SearchTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('search-list')
+        self.voucher = make_voucher(1)
+        make_voucher(2)
+        Traveler.objects.filter(pk=self.voucher.traveler_id).update(name='Amelia Hartley')
+        self.voucher.traveler.refresh_from_db()
+        self.voucher.traveler.save()
+        HotelVoucher.objects.create(
+            hotel_name='Harbour Lights', hotel_address='Quay 1', guest_name='Tom Everhart', number_of_rooms=1,
+            check_in_date=date(2025, 3, 1), check_out_date=date(2025, 3, 3), number_of_nights=2,
+            confirmation_number='HL-7781',
+        )
+
+    def results(self, **params):
+        response = self.assertEndpointWithinBudget(self.url, 1, data=params)
+        return [(row['kind'], row['reference']) for row in response.data['results']]
+
+    def test_partial_matches_are_ranked(self):
+        self.assertEqual(self.results(q='00001'), [('service-voucher', 'RES-00001 CONF-00001')])
+        # Hartley (word start) ranks above Everhart.
+        self.assertEqual(self.results(q='hart'), [
+            ('service-voucher', 'RES-00001 CONF-00001'), ('hotel-voucher', 'HL-7781'),
+        ])
+        self.assertEqual(self.results(q='everhart harbour'), [('hotel-voucher', 'HL-7781')])
+        self.assertEqual(self.results(q='HART', kind='hotel-voucher'), [('hotel-voucher', 'HL-7781')])
+        self.assertEqual(self.results(q='l-778'), [('hotel-voucher', 'HL-7781')])
+        self.assertEqual(self.results(q='grand hotel', limit=1), [('service-voucher', 'RES-00002 CONF-00002')])
+        self.assertEqual(self.results(q='"OR* hotel'), [])
+
+    def test_index_follows_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('service-voucher-detail', args=[self.voucher.pk]),
+                              {'hotel_name': 'Palm Retreat'}, format='json')
+        self.assertEqual(self.results(q='palm retreat'), [('service-voucher', 'RES-00001 CONF-00001')])
+        self.assertEqual(self.results(q='amelia grand'), [])
+
+        self.voucher.traveler.delete()
+        self.assertEqual(self.results(q='amelia'), [])
+
+        HotelVoucher.objects.get().delete()
+        self.assertEqual(self.results(q='HL-7781'), [])
+
+        ServiceVoucher.objects.update(hotel_name='Desert Camp')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.results(q='desert'), [('service-voucher', 'RES-00002 CONF-00002')])
+
+    def test_broad_queries_rank_the_newest_candidates(self):
+        for number in range(3, 6):
+            make_voucher(number)
+        with mock.patch('operations.search.CANDIDATES', 2):
+            self.assertEqual(self.results(q='grand hotel'), [
+                ('service-voucher', 'RES-00005 CONF-00005'), ('service-voucher', 'RES-00004 CONF-00004'),
+            ])
+
+    def test_bad_parameters(self):
+        for params in ({'q': 'ab'}, {'q': 'hartley', 'kind': 'traveler'}, {'q': 'hartley', 'limit': 500}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+class ConditionalDetailTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.voucher = make_voucher(1)
+        self.url = reverse('service-voucher-detail', args=[self.voucher.pk])
+
+    def version(self):
+        return ServiceVoucher.objects.values_list('version', flat=True).get(pk=self.voucher.pk)
+
+    def test_version_follows_nested_writes(self):
+        # Versions are bumped when the transaction commits.
+        commit = lambda: self.captureOnCommitCallbacks(execute=True)
+        with commit():
+            created = self.client.post(reverse('service-voucher-list'), voucher_payload(2), format='json')
+        self.assertEqual(created.data['version'], 1)
+
+        start = self.version()
+        payload = self.client.get(self.url).data
+        with commit():
+            self.client.patch(self.url, payload, format='json')
+        self.assertEqual(self.version(), start)
+
+        payload['itinerary_items'][0]['activities'][0]['notes'] = 'Bring passports'
+        with commit():
+            self.client.patch(self.url, payload, format='json')
+        self.assertEqual(self.version(), start + 1)
+
+        with commit():
+            RoomAllocation.objects.filter(service_voucher=self.voucher).first().delete()
+        with commit():
+            self.voucher.traveler.save()
+        self.assertEqual(self.version(), start + 3)
+
+        # Saving a stale instance does not write its old version back.
+        self.voucher.meeting_point = 'Lobby'
+        with commit():
+            self.voucher.save()
+        self.assertEqual(self.version(), start + 4)
+
+        # However many writes a transaction makes, the voucher is bumped once.
+        with self.assertMaxQueries(12) as queries, commit():
+            ItineraryActivity.objects.filter(itinerary__service_voucher=self.voucher).delete()
+            Itinerary.objects.filter(service_voucher=self.voucher).delete()
+            self.voucher.save()
+        self.assertEqual(self.version(), start + 5)
+        self.assertEqual(sum('"version"' in query['sql'] for query in queries.captured_queries), 1)
+
+    def test_if_none_match_gets_304_and_hot_bodies_come_from_cache(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first['ETag'], f'"{self.voucher.pk}-{self.version()}"')
+        self.assertIn('Last-Modified', first)
+
+        # One version lookup; nothing is serialized.
+        response = self.assertEndpointWithinBudget(self.url, 1, status_code=304, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response['ETag'], first['ETag'])
+        cached = self.assertEndpointWithinBudget(self.url, 1)
+        self.assertEqual(cached.data, first.data)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ItineraryActivity.objects.filter(itinerary__service_voucher=self.voucher).first().delete()
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed['ETag'], f'"{self.voucher.pk}-{self.version()}"')
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertEqual(sum(len(item['activities']) for item in changed.data['itinerary_items']), 3)
+
+    def test_missing_voucher(self):
+        for pk in (999, 'abc'):
+            self.assertEqual(self.client.get(reverse('service-voucher-detail', args=[pk])).status_code, 404)
+
+
+class SparseFieldsTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.voucher = make_voucher(1, days=3, activities_per_day=2)
+        make_voucher(2)
+        self.list_url = reverse('service-voucher-list')
+
+    def test_without_fields_the_payload_is_unchanged(self):
+        row = self.client.get(self.list_url).data['results'][1]
+        self.assertEqual(row['traveler']['name'], 'Guest 1')
+        self.assertEqual(len(row['itinerary_items'][0]['activities']), 2)
+
+    def test_unrequested_relations_are_neither_serialized_nor_fetched(self):
+        # COUNT and the vouchers; no traveler join, no prefetches.
+        response = self.assertEndpointWithinBudget(
+            self.list_url, 2, data={'fields': 'id,reservation_number,hotel_name'})
+        self.assertEqual(response.data['results'][1], {
+            'id': self.voucher.pk, 'reservation_number': 'RES-00001', 'hotel_name': 'Grand Hotel',
+        })
+
+    def test_relations_collapse_to_ids_unless_expanded(self):
+        days = list(self.voucher.itinerary_items.values_list('pk', flat=True))
+        response = self.assertEndpointWithinBudget(
+            reverse('service-voucher-detail', args=[self.voucher.pk]), 4,
+            data={'fields': 'id,traveler,itinerary_items,total_rooms'},
+        )
+        self.assertEqual(response.data, {
+            'id': self.voucher.pk, 'traveler': self.voucher.traveler_id, 'itinerary_items': days, 'total_rooms': 3,
+        })
+
+        response = self.assertEndpointWithinBudget(self.list_url, 4, data={
+            'fields': 'id,itinerary_items.day,itinerary_items.activities', 'expand': 'traveler,itinerary_items',
+        })
+        row = response.data['results'][1]
+        self.assertEqual(row['traveler']['name'], 'Guest 1')
+        self.assertEqual(row['itinerary_items'][0], {
+            'day': 1, 'activities': list(self.voucher.itinerary_items.get(day=1).activities.values_list('pk', flat=True)),
+        })
+
+    def test_itinerary_and_hotel_voucher_endpoints(self):
+        response = self.assertEndpointWithinBudget(reverse('itinerary-list'), 2, data={'fields': 'id,day'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'day'})
+        response = self.client.get(reverse('itinerary-list'), {'fields': 'day,activities', 'expand': 'activities'})
+        self.assertEqual(response.data['results'][0]['activities'][0]['activity_type'], 'TOUR')
+
+        HotelVoucher.objects.create(
+            hotel_name='Sea View', hotel_address='Main St', guest_name='Guest', number_of_rooms=1,
+            check_in_date=date(2025, 1, 1), check_out_date=date(2025, 1, 2), number_of_nights=1,
+            confirmation_number='H-1',
+        )
+        response = self.client.get(reverse('hotel-voucher-list'), {'fields': 'confirmation_number'})
+        self.assertEqual(response.data['results'], [{'confirmation_number': 'H-1'}])
+
+    def test_empty_fields_mean_every_field(self):
+        full = self.client.get(self.list_url).data['results']
+        self.assertTrue(full[0]['itinerary_items'])
+        for value in ('', ' , '):
+            with self.subTest(fields=value):
+                self.assertEqual(self.client.get(self.list_url, {'fields': value}).data['results'], full)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(self.list_url, {'fields': 'id,secret', 'expand': 'itinerary_items.bogus'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.data['fields'][0])
+
+        # A relation listed without sub-fields still has its expand paths checked.
+        response = self.client.get(self.list_url, {'fields': 'itinerary_items', 'expand': 'itinerary_items.bogus'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bogus', response.data['fields'][0])
+        response = self.client.get(self.list_url, {'fields': 'itinerary_items', 'expand': 'itinerary_items.activities'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results'][1]['itinerary_items'][0]['activities']), 2)
+
+
+class FastReadPathTests(QueryBudgetTestCase):
+    """The list readers must render exactly what the serializers render."""
+
+    def setUp(self):
+        super().setUp()
+        make_voucher(1, days=3, activities_per_day=3, rooms=(('DBL', 2), ('TWN', 1), ('SGL', 4)))
+        make_voucher(2, rooms=())
+        odd = make_voucher(3, days=1, activities_per_day=2)
+        ServiceVoucher.objects.filter(pk=odd.pk).update(
+            travel_end_date=None, transfer_type='', inclusions='Café \u2028 «guide» 🚐', meeting_point='Lobby "A"',
+        )
+        Traveler.objects.filter(pk=odd.traveler_id).update(name='Zoë Ölund', contact_email='zoe@example.com')
+        ItineraryActivity.objects.filter(itinerary__service_voucher=odd).update(time=time(9, 30, 15), notes='\u2029')
+        HotelVoucher.objects.create(
+            hotel_name='Sea View', hotel_address='Rue de l’Église', guest_name='Zoë', number_of_rooms=2,
+            check_in_date=date(2025, 1, 1), check_out_date=date(2025, 1, 4), number_of_nights=3,
+            confirmation_number='H-1',
+        )
+
+    def assertSameAsSerializer(self, viewset, url, **params):
+        fast = self.client.get(url, params)
+        with mock.patch.object(viewset, 'reader', None):
+            slow = self.client.get(url, params)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_list_endpoints_render_identical_bytes(self):
+        cases = [
+            (ServiceVoucherViewSet, 'service-voucher-list', {}),
+            (ServiceVoucherViewSet, 'service-voucher-list', {'pagination': 'cursor', 'ordering': 'id'}),
+            (ServiceVoucherViewSet, 'service-voucher-list', {'transfer_type': 'SHARED', 'page_size': 1}),
+            (HotelVoucherViewSet, 'hotel-voucher-list', {}),
+            (ItineraryViewSet, 'itinerary-list', {'page_size': 100}),
+            (ItineraryActivityViewSet, 'itinerary-activity-list', {'page_size': 100}),
+            (TravelerViewSet, 'traveler-list', {}),
+        ]
+        for viewset, name, params in cases:
+            with self.subTest(name, **params):
+                self.assertSameAsSerializer(viewset, reverse(name), **params)
+
+    def test_sparse_requests_use_the_serializer(self):
+        with mock.patch.object(ServiceVoucherReader, 'read') as read:
+            response = self.client.get(reverse('service-voucher-list'), {'fields': 'id'})
+        read.assert_not_called()
+        self.assertEqual(set(response.data['results'][0]), {'id'})
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'text': 'a\u2028b\u2029c "q" \\ é 🚐', 'date': date(2025, 1, 2), 'time': time(9, 30),
+            'when': timezone.now(), 'amount': Decimal('12.50'), 'big': 2 ** 70, 'nested': [{'x': None}, True],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render({1: 'a'}), JSONRenderer().render({1: 'a'}))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+
+class SqliteBackendTests(SimpleTestCase):
+    """core.sqlite3: per-connection pragmas and IMMEDIATE transactions."""
+
+    def make_wrapper(self, path, **options):
+        settings_dict = {**connection.settings_dict, 'NAME': path}
+        settings_dict['OPTIONS'] = {**settings_dict['OPTIONS'], **options}
+        return DatabaseWrapper(settings_dict)
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+
+    def pragma(self, db, name):
+        with db.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        db = self.make_wrapper(self.path)
+        self.addCleanup(db.close)
+        pragmas = settings.DATABASES['default']['OPTIONS']['pragmas']
+        self.assertEqual(self.pragma(db, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(db, 'busy_timeout'), pragmas['busy_timeout'])
+        self.assertEqual(self.pragma(db, 'cache_size'), pragmas['cache_size'])
+        self.assertEqual(self.pragma(db, 'synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma(db, 'foreign_keys'), 1)
+
+    def test_immediate_transactions_take_the_write_lock_up_front(self):
+        db = self.make_wrapper(self.path, transaction_mode='immediate')
+        self.addCleanup(db.close)
+        db.ensure_connection()
+        db._start_transaction_under_autocommit()
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        # Nothing has been written yet, but the lock is already held.
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+            other.execute('BEGIN IMMEDIATE')
+        db.connection.rollback()
+        other.execute('BEGIN IMMEDIATE')
+
+    def test_unknown_transaction_mode_is_rejected(self):
+        db = self.make_wrapper(self.path, transaction_mode='eventually')
+        with self.assertRaises(ImproperlyConfigured):
+            db.transaction_mode
+
+
+class ManifestTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        # Vouchers 1 and 2 both have a day on 2025-01-03.
+        self.first = make_voucher(1)
+        self.second = make_voucher(2)
+        make_voucher(5)
+        ItineraryActivity.objects.create(
+            itinerary=self.second.itinerary_items.get(day=1), time=time(6, 30), activity_type='TRANSFER',
+            description='Airport pickup',
+        )
+        self.url = reverse('manifest-list')
+
+    def test_groups_the_day_by_activity_type_then_time(self):
+        response = self.assertEndpointWithinBudget(self.url, 1, data={'date': '2025-01-03'})
+        data = response.data
+        # Two vouchers of two adults each, however many activities they have.
+        self.assertEqual(data['totals'], {'activities': 5, 'vouchers': 2, 'adults': 4, 'infants': 0})
+        self.assertEqual([group['activity_type'] for group in data['groups']], ['TRANSFER', 'TOUR'])
+        self.assertEqual([(group['activities'], group['adults']) for group in data['groups']], [(1, 2), (4, 4)])
+        tours = data['groups'][1]
+        self.assertEqual([slot['time'] for slot in tours['slots']], ['08:00:00', '09:00:00'])
+        self.assertEqual(
+            [activity['reservation_number'] for activity in tours['slots'][0]['activities']],
+            ['RES-00001', 'RES-00002'],
+        )
+        transfer = data['groups'][0]['slots'][0]['activities'][0]
+        self.assertEqual(
+            (transfer['guest'], transfer['hotel_name'], transfer['transfer_type_display'], transfer['day']),
+            ('Guest 2', 'Grand Hotel', 'Shared Transfer', 1),
+        )
+
+    def test_empty_day_and_invalid_date(self):
+        response = self.client.get(self.url, {'date': '2030-01-01'})
+        self.assertEqual(response.data['totals']['activities'], 0)
+        self.assertEqual(response.data['groups'], [])
+        self.assertEqual(self.client.get(self.url, {'date': '2025-13-01'}).status_code, 400)
+
+    def test_csv_and_pdf_exports(self):
+        url = reverse('manifest-export')
+        response = self.client.get(url, {'date': '2025-01-03'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['activity_type', 'time', 'reservation_number'])
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[1].startswith('TRANSFER,06:30:00,RES-00002,Guest 2,2,0,'))
+
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        with override_settings(VOUCHER_PDF_CACHE_DIR=cache_dir.name):
+            response = self.client.get(url, {'date': '2025-01-03', 'export_format': 'pdf'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(self.client.get(url, {'export_format': 'xlsx'}).status_code, 400)
+
+
+class TransferRunTests(QueryBudgetTestCase):
+    def transfer(self, number, at, transfer_type='SHARED', adults=2, infants=0, meeting_point='Airport T1'):
+        voucher = make_voucher(number, days=1, activities_per_day=0)
+        ServiceVoucher.objects.filter(pk=voucher.pk).update(transfer_type=transfer_type, meeting_point=meeting_point)
+        Traveler.objects.filter(pk=voucher.traveler_id).update(num_adults=adults, num_infants=infants)
+        # Every voucher's single day is moved to the same date.
+        day = voucher.itinerary_items.get()
+        Itinerary.objects.filter(pk=day.pk).update(date=date(2025, 3, 1))
+        return ItineraryActivity.objects.create(itinerary=day, time=at, activity_type='TRANSFER', description='Pickup')
+
+    def runs(self, **params):
+        response = self.client.get(reverse('transfer-run-list'), {'start': '2025-03-01', **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['runs']
+
+    def test_shared_pickups_are_batched_by_window_point_and_capacity(self):
+        self.transfer(1, time(10, 0), adults=6)
+        self.transfer(2, time(10, 20), adults=6, meeting_point='  airport   t1 ')
+        self.transfer(3, time(10, 25), adults=4)  # 16 pax would exceed 14
+        self.transfer(4, time(10, 40), adults=2)  # outside the first run's window
+        self.transfer(5, time(10, 5), adults=2, meeting_point='Marina')
+        self.transfer(6, time(10, 5), transfer_type='PRIVATE')
+        self.transfer(7, time(10, 10), transfer_type='PRIVATE')
+
+        runs = self.runs()
+        summary = [
+            (run['first_pickup'], run['transfer_type'], [stop['reservation_number'][-1] for stop in run['stops']],
+             run['pax'])
+            for run in runs
+        ]
+        self.assertEqual(summary, [
+            ('10:00:00', 'SHARED', ['1', '2'], 12),
+            ('10:05:00', 'PRIVATE', ['6'], 2),  # Airport T1 sorts before Marina
+            ('10:05:00', 'SHARED', ['5'], 2),
+            ('10:10:00', 'PRIVATE', ['7'], 2),
+            ('10:25:00', 'SHARED', ['3', '4'], 6),
+        ])
+        self.assertEqual([run['run'] for run in runs], [1, 2, 3, 4, 5])
+        self.assertEqual(runs[0]['capacity'], 14)
+
+        # A larger vehicle takes the third booking in the first run.
+        self.assertEqual([len(run['stops']) for run in self.runs(capacity=20)][:1], [3])
+
+    def test_oversized_booking_gets_its_own_run(self):
+        self.transfer(1, time(9, 0), adults=16)
+        self.transfer(2, time(9, 5), adults=1)
+        runs = self.runs()
+        self.assertEqual([(run['pax'], run['over_capacity']) for run in runs], [(16, True), (1, False)])
+
+    def test_sweep_fills_the_earliest_open_run_with_room(self):
+        rng = random.Random(4)
+        records = [
+            {'id': number, 'date': date(2025, 3, 1), 'transfer_type': 'SHARED', 'pickup': 'Airport',
+             'time': time(8 + minute // 60, minute % 60), 'pax': pax, 'adults': pax, 'infants': 0}
+            for number, (minute, pax) in enumerate(sorted(
+                (rng.randrange(600), rng.choice((1, 2, 2, 3, 4, 6, 16))) for _ in range(2000)))
+        ]
+        # Scanning every open run, as the index replaces.
+        expected, open_runs = [], []
+        for record in records:
+            minute = record['time'].hour * 60 + record['time'].minute
+            open_runs = [run for run in open_runs if minute - run[0] <= 30]
+            run = next((run for run in open_runs if run[1] + record['pax'] <= 14), None)
+            if run is None:
+                run = [minute, 0, []]
+                expected.append(run)
+                open_runs.append(run)
+            run[1] += record['pax']
+            run[2].append(record['id'])
+        runs = transfers.sweep(records, 30, 14)
+        self.assertEqual([[stop['id'] for stop in run['stops']] for run in runs], [run[2] for run in expected])
+
+    def test_single_query_and_exports(self):
+        for number in range(1, 6):
+            self.transfer(number, time(8, number))
+        self.assertEndpointWithinBudget(reverse('transfer-run-list'), 1, data={'start': '2025-03-01'})
+
+        url = reverse('transfer-run-export')
+        lines = b''.join(self.client.get(url, {'start': '2025-03-01'}).streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(transfers.CSV_COLUMNS))
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[1].startswith('1,2025-03-01,SHARED,Airport T1,08:01:00,RES-00001,'))
+
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        with override_settings(VOUCHER_PDF_CACHE_DIR=cache_dir.name):
+            response = self.client.get(url, {'start': '2025-03-01', 'export_format': 'pdf'})
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_invalid_parameters(self):
+        url = reverse('transfer-run-list')
+        for params in ({'start': 'soon'}, {'start': '2025-03-01', 'end': '2025-02-01'},
+                       {'start': '2025-01-01', 'end': '2025-03-01'}, {'window': '0'}, {'capacity': 'many'}):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
+
+
+class OccupancyTests(QueryBudgetTestCase):
+    def cells(self):
+        return {
+            (hotel, night.isoformat(), room_type): rooms
+            for hotel, night, room_type, rooms in HotelOccupancy.objects.values_list(
+                'hotel_name', 'night', 'room_type', 'rooms')
+        }
+
+    def test_maintained_as_vouchers_and_rooms_change(self):
+        # Nights 2025-01-02 and 2025-01-03 at Grand Hotel, DBL x2 and SGL x1.
+        voucher = make_voucher(1)
+        make_voucher(2, rooms=(('DBL', 1),))  # nights 2025-01-03 and 2025-01-04
+        self.assertEqual(self.cells(), {
+            ('Grand Hotel', '2025-01-02', 'DBL'): 2, ('Grand Hotel', '2025-01-02', 'SGL'): 1,
+            ('Grand Hotel', '2025-01-03', 'DBL'): 3, ('Grand Hotel', '2025-01-03', 'SGL'): 1,
+            ('Grand Hotel', '2025-01-04', 'DBL'): 1,
+        })
+
+        single = voucher.room_allocations.get(room_type='SGL')
+        single.quantity = 4
+        single.save()
+        voucher.hotel_name = 'Sea View'
+        voucher.travel_end_date = date(2025, 1, 3)
+        voucher.save()
+        self.assertEqual(self.cells(), {
+            ('Sea View', '2025-01-02', 'DBL'): 2, ('Sea View', '2025-01-02', 'SGL'): 4,
+            ('Grand Hotel', '2025-01-03', 'DBL'): 1, ('Grand Hotel', '2025-01-04', 'DBL'): 1,
+        })
+
+        voucher.room_allocations.get(room_type='DBL').delete()
+        self.assertEqual(self.cells()[('Sea View', '2025-01-02', 'SGL')], 4)
+        self.assertNotIn(('Sea View', '2025-01-02', 'DBL'), self.cells())
+        voucher.delete()
+        self.assertEqual(set(self.cells()), {('Grand Hotel', '2025-01-03', 'DBL'), ('Grand Hotel', '2025-01-04', 'DBL')})
+        self.assertFalse(OccupancyLedger.objects.filter(service_voucher_id=voucher.pk).exists())
+
+    def test_api_writes_and_rebuild_agree(self):
+        response = self.client.post(
+            reverse('service-voucher-list'), voucher_payload(1, days=3), format='json')
+        url = reverse('service-voucher-detail', args=[response.data['id']])
+        self.client.patch(url, {
+            'travel_end_date': '2025-03-06', 'room_allocations': [{'room_type': 'TPL', 'quantity': 2}],
+        }, format='json')
+        make_voucher(2)
+        incremental = self.cells()
+        self.assertEqual(incremental[('Harbour Hotel', '2025-03-05', 'TPL')], 2)
+        self.assertEqual({room_type for hotel, _, room_type in incremental if hotel == 'Harbour Hotel'}, {'TPL'})
+
+        # QuerySet.update() bypasses the signals; the command catches up.
+        ServiceVoucher.objects.update(hotel_name='Renamed')
+        out = StringIO()
+        call_command('rebuild_occupancy', stdout=out)
+        self.assertIn(f'Rebuilt {len(incremental)} hotel room-nights', out.getvalue())
+        self.assertEqual(
+            self.cells(), {('Renamed', night, room_type): rooms for (_, night, room_type), rooms in incremental.items()}
+        )
+
+    def test_endpoint_reads_only_the_nights_asked_for(self):
+        make_voucher(1)
+        make_voucher(2, rooms=(('DBL', 1),))
+        url = reverse('occupancy-list')
+        response = self.assertEndpointWithinBudget(url, 1, data={'start': '2025-01-03', 'end': '2025-01-04'})
+        self.assertEqual(response.json(), {
+            'start': '2025-01-03',
+            'end': '2025-01-04',
+            'hotels': [{'hotel_name': 'Grand Hotel', 'nights': [
+                {'night': '2025-01-03', 'rooms': {'DBL': 3, 'SGL': 1}, 'total': 4},
+                {'night': '2025-01-04', 'rooms': {'DBL': 1}, 'total': 1},
+            ]}],
+        })
+        response = self.client.get(url, {'start': '2025-01-02', 'hotel_name': 'Grand Hotel', 'room_type': 'SGL'})
+        self.assertEqual(response.json()['hotels'][0]['nights'], [
+            {'night': '2025-01-02', 'rooms': {'SGL': 1}, 'total': 1},
+        ])
+        self.assertEqual(self.client.get(url, {'room_type': 'SUITE'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start': '2025-01-01', 'end': '2026-06-01'}).status_code, 400)
+
+
+class AsyncReadEndpointTests(QueryBudgetTestCase):
+    """The async endpoints answer every request exactly like their sync counterparts."""
+
+    def setUp(self):
+        super().setUp()
+        self.voucher = make_voucher(1, days=3, activities_per_day=2)
+        make_voucher(2, rooms=())
+        HotelVoucher.objects.create(
+            hotel_name='Sea View', hotel_address='Main St', guest_name='Zoë', number_of_rooms=1,
+            check_in_date=date(2025, 1, 1), check_out_date=date(2025, 1, 2), number_of_nights=1,
+            confirmation_number='H-1',
+        )
+
+    def assertSameAsSync(self, name, budget, args=(), **params):
+        sync = self.client.get(reverse(name, args=args), params)
+        with self.assertMaxQueries(budget):
+            response = self.client.get(reverse(f'async-{name}', args=args), params)
+        self.assertEqual(response.status_code, sync.status_code)
+        self.assertEqual(response.content, sync.content.replace(b'/api/operations/', b'/api/async/operations/'))
+        return response
+
+    def test_lists_and_detail_render_identical_bytes(self):
+        cases = [
+            ('service-voucher-list', 5, (), {}),
+            ('service-voucher-list', 5, (), {'transfer_type': 'SHARED', 'page_size': 1, 'page': 2}),
+            ('service-voucher-list', 5, (), {'ordering': 'travel_start_date', 'hotel_name': 'Grand Hotel'}),
+            ('service-voucher-detail', 5, (self.voucher.pk,), {}),
+            ('hotel-voucher-list', 2, (), {}),
+            ('itinerary-list', 3, (), {'page_size': 2}),
+            # Served by the sync actions in a thread.
+            ('service-voucher-list', 4, (), {'pagination': 'cursor'}),
+            ('service-voucher-list', 2, (), {'fields': 'id,hotel_name'}),
+            ('service-voucher-detail', 4, (self.voucher.pk,), {'fields': 'id,traveler'}),
+            # Errors.
+            ('service-voucher-list', 0, (), {'transfer_type': 'BOAT'}),
+            ('service-voucher-list', 1, (), {'page': 9}),
+            ('service-voucher-detail', 1, (999,), {}),
+            ('service-voucher-detail', 1, ('abc',), {}),
+            ('service-voucher-detail', 1, (self.voucher.pk,), {'transfer_type': 'PRIVATE'}),
+            ('service-voucher-detail', 0, (self.voucher.pk,), {'transfer_type': 'BOAT'}),
+        ]
+        for name, budget, args, params in cases:
+            with self.subTest(name, **params):
+                cache.clear()
+                self.assertSameAsSync(name, budget, args, **params)
+
+    def test_detail_shares_conditional_responses_and_cache(self):
+        url = reverse('async-service-voucher-detail', args=[self.voucher.pk])
+        first = self.client.get(url)
+        self.voucher.refresh_from_db()
+        self.assertEqual(first['ETag'], f'"{self.voucher.pk}-{self.voucher.version}"')
+        self.assertEndpointWithinBudget(url, 1, status_code=304, HTTP_IF_NONE_MATCH=first['ETag'])
+        # The async view filled the cache the sync view reads.
+        cached = self.assertEndpointWithinBudget(reverse('service-voucher-detail', args=[self.voucher.pk]), 1)
+        self.assertEqual(cached.content, first.content)
+
+    def test_jwt_authentication_and_permissions(self):
+        self.client.force_authenticate(None)
+        url = reverse('async-service-voucher-list')
+        for header in ({}, {'HTTP_AUTHORIZATION': 'Bearer not-a-token'}):
+            with self.subTest(**header):
+                sync = self.client.get(reverse('service-voucher-list'), **header)
+                response = self.client.get(url, **header)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response.content, sync.content)
+                self.assertEqual(response['WWW-Authenticate'], sync['WWW-Authenticate'])
+
+        token = AccessToken.for_user(self.user)
+        response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_detail_checks_object_permissions(self):
+        url = reverse('async-service-voucher-detail', args=[self.voucher.pk])
+        with mock.patch.object(ServiceVoucherViewSet, 'check_object_permissions',
+                               side_effect=PermissionDenied) as check:
+            self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(check.call_args.args[1].pk, self.voucher.pk)
+
+    async def test_served_by_the_asgi_handler(self):
+        client = AsyncClient()
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = await client.get(reverse('async-service-voucher-list'), secure=True, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][1]['traveler']['name'], 'Guest 1')
+        response = await client.get(reverse('async-itinerary-list'), {'page_size': 1}, secure=True, headers=headers)
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertTrue(response.json()['next'].startswith('https://testserver/api/async/operations/itinerary/'))
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_SLOW_MS=0, INSTRUMENTATION_TOP_QUERIES=2)
+class InstrumentationTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        instrumentation.reset()
+        make_voucher(1)
+        self.client.force_authenticate(None)
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def server_timing(self, response):
+        return dict(
+            (metric.split(';')[0], metric.split(';', 1)[1]) for metric in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_and_slow_request_log(self):
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            with self.assertMaxQueries(10) as queries:
+                response = self.client.get(reverse('service-voucher-list'), **self.auth)
+        metrics = self.server_timing(response)
+        self.assertEqual(set(metrics), {'db', 'auth', 'serialize', 'render', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', metrics['db'])
+        [message] = logs.output
+        self.assertIn('Slow request GET /api/operations/service-vouchers/ (GET service-voucher-list)', message)
+        self.assertEqual(message.count(' ms: SELECT'), 2)
+
+        # The retrieve path goes through the DRF serializer.
+        with self.assertLogs('core.instrumentation', 'WARNING'):
+            response = self.client.get(
+                reverse('service-voucher-detail', args=[ServiceVoucher.objects.get().pk]), **self.auth)
+        self.assertIn('serialize', self.server_timing(response))
+
+    @override_settings(INSTRUMENTATION_SLOW_MS=60000)
+    def test_metrics_endpoint(self):
+        for _ in range(3):
+            self.client.get(reverse('itinerary-list'), **self.auth)
+        self.client.get(reverse('service-voucher-detail', args=[999]), **self.auth)
+
+        self.assertEqual(self.client.get(reverse('metrics'), **self.auth).status_code, 403)
+        self.user.role = 'ADMIN'
+        self.user.save()
+        endpoints = self.client.get(reverse('metrics'), **self.auth).json()['endpoints']
+        self.assertEqual(endpoints['GET itinerary-list']['count'], 3)
+        self.assertEqual(sum(endpoints['GET itinerary-list']['buckets'].values()), 3)
+        self.assertGreater(endpoints['GET itinerary-list']['mean_queries'], 0)
+        self.assertEqual(endpoints['GET service-voucher-detail']['count'], 1)
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_off_by_default(self):
+        response = self.client.get(reverse('service-voucher-list'), **self.auth)
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(instrumentation.snapshot(), {})
+
+    async def test_async_endpoints(self):
+        headers = {'Authorization': self.auth['HTTP_AUTHORIZATION']}
+        with self.assertLogs('core.instrumentation', 'WARNING'):
+            response = await AsyncClient().get(reverse('async-service-voucher-list'), secure=True, headers=headers)
+        self.assertEqual(set(self.server_timing(response)), {'db', 'auth', 'serialize', 'render', 'total'})
+
+
+class StructuredLoggingTests(QueryBudgetTestCase):
+    def record(self, level=logging.INFO, name='operations.views', **extra):
+        record = logging.makeLogRecord({'name': name, 'levelno': level, 'levelname': logging.getLevelName(level),
+                                        'msg': 'Created service voucher %s', 'args': (1,)})
+        record.__dict__.update(extra)
+        return record
+
+    def test_create_and_update_log_ids_and_timings_not_payloads(self):
+        with self.assertLogs('operations.views', 'INFO') as logs:
+            response = self.client.post(reverse('service-voucher-list'), voucher_payload(1), format='json')
+            changes = self.client.patch(reverse('service-voucher-detail', args=[response.data['id']]),
+                                        {'room_allocations': []}, format='json').data['changes']
+        created, updated = logs.records
+        self.assertEqual((created.event, created.voucher_id), ('service_voucher.created', response.data['id']))
+        self.assertEqual((updated.event, updated.voucher_id), ('service_voucher.updated', response.data['id']))
+        self.assertEqual(updated.changes, changes)
+        for record in logs.records:
+            self.assertGreaterEqual(record.write_ms, 0)
+            self.assertNotIn('Guest 1', record.getMessage())
+
+    def test_json_formatter_caps_fields_and_records(self):
+        formatter = logs.JSONFormatter(max_field_length=30, max_record_bytes=600)
+        line = json.loads(formatter.format(self.record(voucher_id=7, errors={'traveler': ['x' * 50]})))
+        self.assertEqual(line['message'], 'Created service voucher 1')
+        self.assertEqual(line['voucher_id'], 7)
+        self.assertTrue(line['errors'].startswith('{"traveler": ["xxxx'))
+        self.assertIn('more]', line['errors'])
+
+        line = json.loads(formatter.format(self.record(**{f'field{number}': 'y' * 30 for number in range(20)})))
+        self.assertEqual(set(line), {'time', 'level', 'logger', 'message', 'truncated'})
+
+    def test_sampling_keeps_warnings(self):
+        sampler = logs.SamplingFilter({'operations': 0.0, 'operations.jobs': 1.0})
+        self.assertFalse(sampler.filter(self.record()))
+        self.assertTrue(sampler.filter(self.record(logging.WARNING)))
+        self.assertTrue(sampler.filter(self.record(name='operations.jobs')))
+        self.assertTrue(sampler.filter(self.record(name='core.instrumentation')))
+
+        with mock.patch('random.random', return_value=0.2):
+            record = self.record()
+            self.assertTrue(logs.SamplingFilter({'operations': 0.5}).filter(record))
+            self.assertEqual(record.sample_rate, 0.5)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        writing, release = threading.Event(), threading.Event()
+
+        class SlowStream(StringIO):
+            def write(self, text):
+                writing.set()
+                release.wait(5)
+                return super().write(text)
+
+        stream = SlowStream()
+        handler = logs.QueueHandler(queue_size=1, stream=stream)
+        handler.setFormatter(logs.JSONFormatter())
+        try:
+            handler.handle(self.record())
+            writing.wait(5)  # the listener holds the first record
+            for _ in range(3):
+                handler.handle(self.record())
+            self.assertEqual(handler.dropped, 2)
+            release.set()
+            handler.flush()
+            handler.handle(self.record())
+            handler.flush()
+        finally:
+            handler.close()
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([line.get('dropped_records') for line in lines], [None, None, 2])
+
+
+class JobTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        files = tempfile.TemporaryDirectory()
+        self.addCleanup(files.cleanup)
+        overrides = override_settings(JOB_FILES_DIR=files.name, VOUCHER_PDF_CACHE_DIR=os.path.join(files.name, 'pdf'))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def run_jobs(self):
+        out = StringIO()
+        call_command('run_jobs', burst=True, stdout=out)
+        return out.getvalue()
+
+    def flaky(self, failures):
+        """Register a 'flaky' job kind that raises ``failures`` times, then succeeds."""
+        calls = []
+
+        def run(context, value):
+            calls.append(value)
+            if len(calls) <= failures:
+                raise RuntimeError(f'attempt {len(calls)} failed')
+            return {'value': value}
+
+        patcher = mock.patch.dict(jobs.HANDLERS, {'flaky': jobs.Handler(run, 3, None)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return calls
+
+    def test_background_import_returns_a_job_that_a_worker_runs(self):
+        lines = [json.dumps(voucher_payload(number)) for number in range(1, 4)] + ['{not json']
+        response = self.client.post(
+            reverse('service-voucher-import-file') + '?background=true',
+            {'file': SimpleUploadedFile('bookings.ndjson', '\n'.join(lines).encode())}, format='multipart',
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.data['kind'], response.data['status']), ('import', 'QUEUED'))
+        self.assertTrue(response['Location'].endswith(reverse('job-detail', args=[response.data['id']])))
+        self.assertEqual(ServiceVoucher.objects.count(), 0)
+
+        self.assertIn('Ran 1 jobs.', self.run_jobs())
+        job = self.client.get(response['Location']).data
+        self.assertEqual(job['status'], 'SUCCEEDED')
+        self.assertEqual((job['result']['created'], job['result']['failed']), (3, 1))
+        self.assertEqual((job['progress'], job['total']), (4, 4))
+        self.assertEqual(ServiceVoucher.objects.count(), 3)
+
+        report = self.client.get(job['download_url'])
+        self.assertEqual(report['Content-Disposition'], 'attachment; filename="import-report.ndjson"')
+        results = [json.loads(line) for line in b''.join(report.streaming_content).splitlines()]
+        self.assertEqual([result['status'] for result in results], ['created'] * 3 + ['error'])
+        self.assertEqual(os.listdir(settings.JOB_FILES_DIR), [f'{job["id"]}-import-report.ndjson'])
+
+    def test_background_export_and_pdf_batch(self):
+        first, second = make_voucher(1), make_voucher(2)
+        url = reverse('service-voucher-export')
+        streamed = b''.join(self.client.get(url, {'start': '2025-01-01'}).streaming_content)
+        export = self.client.get(url, {'start': '2025-01-01', 'background': 'true'})
+        self.assertEqual(export.status_code, 202)
+
+        batch_url = reverse('service-voucher-pdf-batch')
+        batch = self.client.post(batch_url, {'ids': [second.pk, first.pk, 999]}, format='json')
+        self.assertEqual(batch.status_code, 202)
+        for ids in (None, [], ['x'], list(range(1, settings.JOB_PDF_BATCH_MAX + 2))):
+            with self.subTest(ids=ids):
+                self.assertEqual(self.client.post(batch_url, {'ids': ids}, format='json').status_code, 400)
+
+        self.assertIn('Ran 2 jobs.', self.run_jobs())
+        export = self.client.get(export['Location']).data
+        self.assertEqual(b''.join(self.client.get(export['download_url']).streaming_content), streamed)
+
+        batch = self.client.get(batch['Location']).data
+        self.assertEqual((batch['result']['rendered'], batch['result']['missing']), (2, 1))
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(self.client.get(batch['download_url']).streaming_content)))
+        self.assertEqual(archive.namelist(), ['service-voucher-RES-00001.pdf', 'service-voucher-RES-00002.pdf'])
+
+    @override_settings(JOB_RETRY_DELAY=60)
+    def test_failures_are_retried_with_backoff_until_max_attempts(self):
+        with self.assertLogs('operations.jobs', 'ERROR') as logs:
+            calls = self.flaky(failures=5)
+            job = jobs.enqueue('flaky', {'value': 1})
+            for attempt, delay in ((1, 60), (2, 120)):
+                before = timezone.now()
+                self.assertEqual(jobs.work(burst=True), 1)
+                job.refresh_from_db()
+                self.assertEqual((job.status, job.attempts), (Job.QUEUED, attempt))
+                self.assertIn(f'attempt {attempt} failed', job.error)
+                self.assertGreaterEqual(job.run_after, before + timedelta(seconds=delay / 2))
+                self.assertLessEqual(job.run_after, timezone.now() + timedelta(seconds=delay))
+                # Not ready until the backoff has passed.
+                self.assertEqual(jobs.work(burst=True), 0)
+                Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+            jobs.work(burst=True)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, len(calls)), (Job.FAILED, 3, 3))
+            self.assertIsNotNone(job.finished_at)
+
+            self.flaky(failures=1)
+            job = jobs.enqueue('flaky', {'value': 2})
+            jobs.work(burst=True)
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            jobs.work(burst=True)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.result, job.error), (Job.SUCCEEDED, 2, {'value': 2}, ''))
+        self.assertEqual(len(logs.records), 4)
+
+    @override_settings(JOB_CONCURRENCY={'export': 1}, JOB_LEASE_SECONDS=60)
+    def test_concurrency_limits_and_orphaned_jobs(self):
+        now = timezone.now()
+        Job.objects.create(kind='export', status=Job.RUNNING, worker='other:1', heartbeat_at=now, attempts=1,
+                           max_attempts=3)
+        queued_export = jobs.enqueue('export', {'name': 'hotel-vouchers', 'fmt': 'csv'})
+        queued_batch = jobs.enqueue('pdf-batch', {'ids': [1]})
+
+        # The export cap is taken, so the older export waits and the PDF batch runs.
+        self.assertEqual(jobs.claim('me:1'), queued_batch)
+        self.assertIsNone(jobs.claim('me:1'))
+
+        # The running export's worker goes quiet: its job is retried, freeing the slot.
+        Job.objects.filter(worker='other:1').update(heartbeat_at=now - timedelta(seconds=61))
+        self.assertEqual(jobs.claim('me:1'), queued_export)
+        orphan = Job.objects.get(worker='')
+        self.assertEqual((orphan.status, orphan.error), (Job.QUEUED, 'Worker other:1 stopped responding'))
+
+    def test_cancel_and_visibility(self):
+        job = jobs.enqueue('export', {'name': 'hotel-vouchers', 'fmt': 'csv'}, user=self.user)
+        url = reverse('job-detail', args=[job.pk])
+        self.assertEqual(self.client.get(reverse('job-list')).data['count'], 1)
+
+        other = get_user_model().objects.create_user(username='other', password='other', role='STAFF')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('job-list')).data['count'], 0)
+        other.role = 'ADMIN'
+        other.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        cancel_url = reverse('job-cancel', args=[job.pk])
+        self.assertEqual(self.client.post(cancel_url).data['status'], 'CANCELLED')
+        self.assertEqual(self.client.post(cancel_url).status_code, 400)
+        self.assertEqual(jobs.work(burst=True), 0)
+
+        # A running job stops at its next progress report.
+        jobs.enqueue('export', {'name': 'hotel-vouchers', 'fmt': 'csv'})
+        context = jobs.JobContext(jobs.claim('me:1'))
+        self.assertEqual(self.client.post(reverse('job-cancel', args=[context.job.pk])).status_code, 200)
+        with self.assertRaises(jobs.JobAbandoned):
+            context.report(1, 10)
+        self.assertEqual(Job.objects.get(pk=context.job.pk).status, Job.CANCELLED)
+
+
+class GenerateFakeVouchersTests(QueryBudgetTestCase):
+    def snapshot(self):
+        """Everything generated, keyed by reservation number rather than by id."""
+        return (
+            list(ServiceVoucher.objects.order_by('reservation_number').values_list(
+                'reservation_number', 'traveler__name', 'traveler__contact_email', 'travel_start_date',
+                'travel_end_date', 'hotel_name', 'transfer_type', 'meal_plan', 'meeting_point')),
+            sorted(RoomAllocation.objects.values_list('service_voucher__reservation_number', 'room_type', 'quantity')),
+            sorted(ItineraryActivity.objects.values_list(
+                'itinerary__service_voucher__reservation_number', 'itinerary__day', 'time', 'description')),
+            sorted(HotelVoucher.objects.values_list('guest_name', 'check_in_date', 'confirmation_number')),
+        )
+
+    @mock.patch('operations.management.commands.generate_fake_vouchers.BLOCK', 8)
+    def test_deterministic_and_continues_where_it_stopped(self):
+        options = {'seed': 7, 'days': (2, 2), 'activities': (1, 1), 'hotels': 3, 'stdout': StringIO()}
+        call_command('generate_fake_vouchers', count=20, **options)
+        self.assertEqual(ServiceVoucher.objects.count(), 20)
+        self.assertEqual(Traveler.objects.count(), 20)
+        self.assertEqual(HotelVoucher.objects.count(), 20)
+        self.assertEqual(Itinerary.objects.count(), 40)
+        self.assertEqual(ItineraryActivity.objects.count(), 40)
+        self.assertEqual(ServiceVoucher.objects.values('hotel_name').distinct().count(), 3)
+        whole = self.snapshot()
+
+        # bulk_create sends no signals; the derived tables are rebuilt instead.
+        self.assertEqual(
+            sum(HotelOccupancy.objects.values_list('rooms', flat=True)),
+            sum(2 * quantity for quantity in RoomAllocation.objects.values_list('quantity', flat=True)),
+        )
+        results = self.client.get(reverse('search-list'), {'q': 'GEN7-00000013'}).data['results']
+        self.assertEqual([row['kind'] for row in results], ['service-voucher'])
+
+        # The same data again from two runs, split mid-block.
+        ServiceVoucher.objects.all().delete()
+        Traveler.objects.all().delete()
+        HotelVoucher.objects.all().delete()
+        call_command('generate_fake_vouchers', count=5, **options)
+        out = StringIO()
+        call_command('generate_fake_vouchers', count=15, **{**options, 'stdout': out})
+        self.assertIn('(GEN7-00000005 to GEN7-00000019)', out.getvalue())
+        self.assertEqual(self.snapshot(), whole)
+
+        # SQLite before 3.35 returns no keys from a bulk INSERT; they are read back by natural key.
+        ServiceVoucher.objects.all().delete()
+        Traveler.objects.all().delete()
+        HotelVoucher.objects.all().delete()
+        with mock.patch.object(connection.features, 'can_return_columns_from_insert', False):
+            call_command('generate_fake_vouchers', count=20, **options)
+        self.assertEqual(self.snapshot(), whole)
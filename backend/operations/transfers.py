@@ -0,0 +1,205 @@
+"""
+Vehicle runs for transfer activities.
+
+Every ``TRANSFER`` activity in a date range becomes a pickup of the
+voucher's traveler (adults plus infants). A PRIVATE voucher gets its own
+vehicle. SHARED and GROUP pickups are batched with pickups of the same
+transfer type, on the same date, at the same pickup point. The pickup
+point is the voucher's meeting point, else the activity location, else the
+hotel, compared case- and whitespace-insensitively.
+
+Batching is a sweep over each pickup point's transfers in time order. A
+run stays open for ``window`` minutes from its first pickup. Each transfer
+joins the earliest open run with enough free seats, found through a max
+tree over the open runs' free seats, or opens a new one. Runs whose window
+has passed are closed on the way. That makes the whole schedule O(n log n)
+in the number of transfers. A booking larger than a
+vehicle still gets a run of its own, flagged ``over_capacity``.
+"""
+from collections import defaultdict
+
+from .models import ServiceVoucher, ItineraryActivity
+
+DEFAULT_WINDOW = 30
+MAX_WINDOW = 240
+MAX_DAYS = 31
+MAX_CAPACITY = 100
+# Seats per vehicle, by transfer type.
+CAPACITY = {
+    'SHARED': 14,
+    'GROUP': 50,
+}
+TRANSFER_TYPE_LABELS = dict(ServiceVoucher.TRANSFER_TYPES)
+
+FIELDS = {
+    'id': 'id',
+    'date': 'itinerary__date',
+    'time': 'time',
+    'description': 'description',
+    'location': 'location',
+    'service_voucher': 'itinerary__service_voucher_id',
+    'reservation_number': 'itinerary__service_voucher__reservation_number',
+    'transfer_type': 'itinerary__service_voucher__transfer_type',
+    'hotel_name': 'itinerary__service_voucher__hotel_name',
+    'meeting_point': 'itinerary__service_voucher__meeting_point',
+    'guest': 'itinerary__service_voucher__traveler__name',
+    'adults': 'itinerary__service_voucher__traveler__num_adults',
+    'infants': 'itinerary__service_voucher__traveler__num_infants',
+}
+CSV_COLUMNS = [
+    'run', 'date', 'transfer_type', 'pickup', 'time', 'reservation_number', 'guest', 'adults', 'infants',
+    'hotel_name', 'description', 'service_voucher', 'id',
+]
+
+
+def pickups(start, end):
+    """The TRANSFER activities dated ``start``..``end`` as flat dicts (``FIELDS``) plus pickup point and pax."""
+    rows = ItineraryActivity.objects.filter(
+        activity_type='TRANSFER', itinerary__date__range=(start, end),
+    ).order_by().values_list(*FIELDS.values())
+    records = []
+    for row in rows:
+        record = dict(zip(FIELDS, row))
+        record['pickup'] = record['meeting_point'] or record['location'] or record['hotel_name']
+        record['pax'] = record['adults'] + record['infants']
+        records.append(record)
+    return records
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _run(record, capacity):
+    return {
+        'date': record['date'],
+        'transfer_type': record['transfer_type'],
+        'transfer_type_display': TRANSFER_TYPE_LABELS.get(record['transfer_type'], record['transfer_type']),
+        'pickup': record['pickup'],
+        'first_pickup': record['time'],
+        'last_pickup': record['time'],
+        'capacity': capacity,
+        'pax': 0,
+        'adults': 0,
+        'infants': 0,
+        'over_capacity': False,
+        'stops': [],
+    }
+
+
+def _board(run, record):
+    run['stops'].append(record)
+    run['last_pickup'] = record['time']
+    run['pax'] += record['pax']
+    run['adults'] += record['adults']
+    run['infants'] += record['infants']
+    run['over_capacity'] = run['capacity'] is not None and run['pax'] > run['capacity']
+
+
+class _FreeSeats:
+    """
+    Free seats of a sweep's runs, by the order they opened, in a max tree:
+    the earliest run with room for a booking is found, and a run's seats
+    changed, in O(log n).
+    """
+
+    CLOSED = float('-inf')
+
+    def __init__(self, size):
+        self.leaves = 1
+        while self.leaves < size:
+            self.leaves *= 2
+        self.tree = [self.CLOSED] * (2 * self.leaves)
+
+    def set(self, index, free):
+        node = index + self.leaves
+        self.tree[node] = free
+        while node > 1:
+            node //= 2
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+
+    def first(self, seats):
+        """Index of the earliest run with at least ``seats`` free, or None."""
+        if self.tree[1] < seats:
+            return None
+        node = 1
+        while node < self.leaves:
+            node = 2 * node if self.tree[2 * node] >= seats else 2 * node + 1
+        return node - self.leaves
+
+
+def sweep(records, window, capacity):
+    """
+    Batch ``records`` (one date, type and pickup point, sorted by time) into
+    runs of at most ``capacity`` pax starting within ``window`` minutes.
+    """
+    runs = []
+    # Runs open in time order, so the closed ones are always a prefix.
+    free = _FreeSeats(len(records))
+    oldest = 0
+    for record in records:
+        now = _minutes(record['time'])
+        while oldest < len(runs) and now - _minutes(runs[oldest]['first_pickup']) > window:
+            free.set(oldest, _FreeSeats.CLOSED)
+            oldest += 1
+        index = free.first(record['pax'])
+        if index is None:
+            index = len(runs)
+            runs.append(_run(record, capacity))
+        run = runs[index]
+        _board(run, record)
+        free.set(index, capacity - run['pax'])
+    return runs
+
+
+def schedule(start, end, window=DEFAULT_WINDOW, capacity=None):
+    """
+    Vehicle runs for the TRANSFER activities dated ``start``..``end``, in
+    date and first-pickup order. ``capacity`` overrides ``CAPACITY``.
+    """
+    batches = defaultdict(list)
+    runs = []
+    for record in pickups(start, end):
+        if record['transfer_type'] in CAPACITY:
+            key = (record['date'], record['transfer_type'], ' '.join(record['pickup'].casefold().split()))
+            batches[key].append(record)
+        else:
+            run = _run(record, None)
+            _board(run, record)
+            runs.append(run)
+    for (_, transfer_type, _), records in batches.items():
+        records.sort(key=lambda record: (record['time'], record['id']))
+        runs += sweep(records, window, capacity or CAPACITY[transfer_type])
+
+    runs.sort(key=lambda run: (run['date'], run['first_pickup'], run['pickup'], run['stops'][0]['id']))
+    return [{'run': number, **run} for number, run in enumerate(runs, 1)]
+
+
+def run_sheets(start, end, window=DEFAULT_WINDOW, capacity=None):
+    """``schedule`` as a JSON-ready document with totals."""
+    runs = schedule(start, end, window, capacity)
+    for run in runs:
+        run['date'] = run['date'].isoformat()
+        run['first_pickup'] = run['first_pickup'].isoformat()
+        run['last_pickup'] = run['last_pickup'].isoformat()
+        for stop in run['stops']:
+            stop['date'] = stop['date'].isoformat()
+            stop['time'] = stop['time'].isoformat()
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'window': window,
+        'totals': {
+            'runs': len(runs),
+            'transfers': sum(len(run['stops']) for run in runs),
+            'pax': sum(run['pax'] for run in runs),
+        },
+        'runs': runs,
+    }
+
+
+def csv_records(sheets):
+    """One row per stop of ``run_sheets`` output, tagged with its run number."""
+    for run in sheets['runs']:
+        for stop in run['stops']:
+            yield {**stop, 'run': run['run'], 'pickup': run['pickup']}
@@ -1,253 +1,729 @@
 from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
-from .models import Traveler, ServiceVoucher, RoomAllocation, Itinerary, ItineraryActivity, HotelVoucher
+from django.db.models import Prefetch
+from django.http import FileResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, parse_etags, quote_etag
+from rest_framework.renderers import JSONRenderer
+from .models import Traveler, ServiceVoucher, RoomAllocation, Itinerary, ItineraryActivity, HotelVoucher, Job
 from .serializers import (
     TravelerSerializer, 
     ServiceVoucherSerializer,
     RoomAllocationSerializer,
     ItinerarySerializer,
     ItineraryActivitySerializer,
-    HotelVoucherSerializer
+    HotelVoucherSerializer,
+    ServiceVoucherWriteSerializer,
+    JobSerializer,
 )
+from . import exporters, jobs, manifest, occupancy, pdf, search, stats, transfers
+from .filters import IndexedFilterBackend, StableOrderingFilter
+from .selection import SparseFieldsViewMixin
+from .readers import (
+    ReaderListMixin, TravelerReader, ServiceVoucherReader, HotelVoucherReader, ItineraryReader,
+    ItineraryActivityReader,
+)
+from .renderers import CSVRenderer, NDJSONRenderer, PDFRenderer, ZipRenderer
+from .importers import DEFAULT_CHUNK_SIZE, FORMATS, detect_format, import_vouchers, read_rows, text_stream
+from core.pagination import KeysetPaginationMixin
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 import logging
+import mimetypes
+import os
+import tempfile
+import time
 
 logger = logging.getLogger(__name__)
 
-class TravelerViewSet(viewsets.ModelViewSet):
+# Failed rows listed in a synchronous import response; the rest are counted.
+IMPORT_REPORTED_FAILURES = 1000
+
+
+def _timings(started, validated):
+    """``validate_ms`` and ``write_ms`` log fields for a write that was validated at ``validated``."""
+    now = time.perf_counter()
+    return {'validate_ms': round((validated - started) * 1000, 2), 'write_ms': round((now - validated) * 1000, 2)}
+
+
+def wants_background(request):
+    """Whether the client asked for the work to be queued as a job (``?background=true``)."""
+    return request.query_params.get('background', '').lower() in ('1', 'true', 'yes')
+
+
+def job_accepted(request, job):
+    """``202 Accepted`` with the queued ``job``, pointing at its status endpoint."""
+    return Response(
+        JobSerializer(job, context={'request': request}).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': reverse('job-detail', args=[job.pk], request=request)},
+    )
+
+
+def export_response(request, name):
+    """
+    Stream the ``name`` export as CSV or NDJSON.
+
+    Query parameters: ``export_format`` (csv, the default, or ndjson) and an
+    inclusive ``start``/``end`` date range (YYYY-MM-DD). With
+    ``background=true`` the file is written by a job instead, and the
+    response is the job (``202``).
+    """
+    fmt = request.query_params.get('export_format', 'csv')
+    if fmt not in exporters.FORMATS:
+        return Response(
+            {"error": f"export_format must be one of: {', '.join(exporters.FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    bounds = {}
+    for param in ('start', 'end'):
+        value = request.query_params.get(param)
+        if value:
+            try:
+                bounds[param] = parse_date(value)
+            except ValueError:
+                bounds[param] = None
+            if bounds[param] is None:
+                return Response(
+                    {"error": f"{param} must be a date in YYYY-MM-DD format"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+    if wants_background(request):
+        params = {'name': name, 'fmt': fmt, **{param: value.isoformat() for param, value in bounds.items()}}
+        return job_accepted(request, jobs.enqueue('export', params, user=request.user))
+
+    response = StreamingHttpResponse(
+        exporters.export_stream(name, fmt, **bounds),
+        content_type=exporters.CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+
+EXPORT_RENDERERS = [JSONRenderer, CSVRenderer, NDJSONRenderer]
+
+
+def date_range_params(params, max_days, unit):
+    """
+    ``({'start', 'end'}, None)`` from the ``start``/``end`` query parameters
+    (end defaults to start, start to today), or ``(None, error response)``
+    when they are invalid or span more than ``max_days``.
+    """
+    bounds = {}
+    for param in ('start', 'end'):
+        try:
+            bounds[param] = parse_date(params[param]) if params.get(param) else bounds.get(
+                'start', timezone.localdate())
+        except ValueError:
+            bounds[param] = None
+        if bounds[param] is None:
+            return None, Response(
+                {"error": f"{param} must be a date in YYYY-MM-DD format"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    if not 0 <= (bounds['end'] - bounds['start']).days < max_days:
+        return None, Response(
+            {"error": f"end must be on or after start and span at most {max_days} {unit}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return bounds, None
+
+
+def pdf_response(request, kind, data, filename):
+    """
+    Serve the PDF for serialized voucher ``data`` from the content-addressed
+    cache, rendering it only on a miss. The cache key doubles as the ETag.
+    """
+    key = pdf.content_hash(kind, data)
+    etag = quote_etag(key)
+    # Weak comparison, as If-None-Match calls for.
+    if {tag.replace('W/', '', 1) for tag in parse_etags(request.headers.get('If-None-Match', ''))} & {etag, '*'}:
+        response = HttpResponseNotModified()
+    else:
+        handle = pdf.get_cache().open_or_render(key, kind, data)
+        response = FileResponse(handle, content_type='application/pdf', filename=filename)
+    response['ETag'] = etag
+    return response
+
+class TravelerViewSet(ReaderListMixin, KeysetPaginationMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing travelers.
     """
-    queryset = Traveler.objects.all()
+    queryset = Traveler.objects.all().order_by('-id')
     serializer_class = TravelerSerializer
+    reader = TravelerReader()
 
-class ServiceVoucherViewSet(viewsets.ModelViewSet):
+class ServiceVoucherViewSet(ReaderListMixin, SparseFieldsViewMixin, KeysetPaginationMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing service vouchers.
     Includes room allocations and itinerary items.
+
+    List and detail accept ``?fields=`` and ``?expand=`` (see
+    ``operations.selection``); only the relations they render are fetched.
     """
-    queryset = ServiceVoucher.objects.all().order_by('-id')  # Order by id descending
+    queryset = ServiceVoucher.objects.for_api().order_by('-id')  # Order by id descending
     serializer_class = ServiceVoucherSerializer
+    reader = ServiceVoucherReader()
     ordering = ['-id']  # Add default ordering
+    filter_backends = [IndexedFilterBackend, StableOrderingFilter]
+    filter_fields = {
+        'travel_start_date': 'date',
+        'travel_end_date': 'date',
+        'hotel_name': 'exact',
+        'transfer_type': 'choice',
+        'meal_plan': 'choice',
+    }
+    ordering_fields = ['id', 'travel_start_date', 'travel_end_date', 'hotel_name']
+
+    def get_queryset(self):
+        return ServiceVoucher.objects.for_api(self.field_selection).order_by('-id')
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Return a service voucher, honouring conditional GETs.
+
+        The response carries an ``ETag`` built from the voucher's version and
+        a ``Last-Modified`` date. A matching ``If-None-Match`` (or a current
+        ``If-Modified-Since``) gets a ``304`` after a single version lookup,
+        and the serialized body of each version is cached for
+        VOUCHER_DETAIL_CACHE_TTL seconds.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        stamp = get_object_or_404(
+            queryset.values('id', 'version', 'updated_at'),
+            **{self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]},
+        )
+        # Object permissions get the voucher with just the stamp fields loaded.
+        self.check_object_permissions(request, ServiceVoucher.from_db(queryset.db, list(stamp), list(stamp.values())))
+        not_modified = get_conditional_response(
+            request, etag=self.version_etag(stamp), last_modified=int(stamp['updated_at'].timestamp()),
+        )
+        if not_modified is not None:
+            return self.with_version_headers(not_modified, stamp)
+
+        data = cache.get(self.detail_cache_key(stamp))
+        if data is None:
+            voucher = self.get_object()
+            data = self.get_serializer(voucher).data
+            # Key by the version actually serialized, in case a write landed in between.
+            stamp = {'id': voucher.pk, 'version': voucher.version, 'updated_at': voucher.updated_at}
+            cache.set(self.detail_cache_key(stamp), data, settings.VOUCHER_DETAIL_CACHE_TTL)
+        return self.with_version_headers(Response(data), stamp)
+
+    def detail_cache_key(self, stamp):
+        return f"operations:service-voucher:{stamp['id']}:{stamp['version']}:{self.field_selection.cache_key()}"
+
+    @staticmethod
+    def version_etag(stamp):
+        return quote_etag(f"{stamp['id']}-{stamp['version']}")
+
+    def with_version_headers(self, response, stamp):
+        response['ETag'] = self.version_etag(stamp)
+        response['Last-Modified'] = http_date(stamp['updated_at'].timestamp())
+        # Let browsers keep the body but revalidate it on every visit.
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
-    @transaction.atomic
     def update(self, request, *args, **kwargs):
-        """Update a service voucher with related data."""
-        logger.info("Updating service voucher with ID: %s", kwargs.get('pk'))
-        logger.debug("Update data received: %s", request.data)
-        
-        try:
-            instance = self.get_object()
-            
-            # 1. Update or create traveler
-            traveler_data = request.data.get('traveler')
-            if not traveler_data:
-                logger.error("No traveler data provided in update")
-                return Response(
-                    {"error": "Traveler data is required"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        """
+        Update a service voucher with related data.
 
-            # Update existing traveler
-            traveler_serializer = TravelerSerializer(
-                instance.traveler,
-                data=traveler_data,
-                partial=True
+        Nested rooms, days and activities are diffed against the stored rows,
+        read with the voucher locked (``SELECT ... FOR UPDATE``) in the
+        transaction that writes the diff, and only what changed is written,
+        with bulk statements. The response
+        carries the usual voucher payload plus ``changes``, the number of rows
+        created, updated and deleted per table.
+        """
+        started = time.perf_counter()
+        with transaction.atomic():
+            # Lock the voucher and plan the diff from rows read under that lock,
+            # so a concurrent update cannot land between the plan and its writes.
+            instance = get_object_or_404(
+                self.filter_queryset(self.get_queryset()).select_for_update(of=('self',)),
+                **{self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]},
             )
-            if not traveler_serializer.is_valid():
-                logger.error("Invalid traveler data in update: %s", traveler_serializer.errors)
+            self.check_object_permissions(request, instance)
+            serializer = ServiceVoucherWriteSerializer(instance, data=request.data, partial=True)
+            if not serializer.is_valid():
+                logger.error("Invalid voucher data in update", extra={
+                    'event': 'service_voucher.invalid', 'voucher_id': instance.id, 'errors': serializer.errors,
+                })
                 return Response(
-                    {"error": "Invalid traveler data", "details": traveler_serializer.errors},
+                    {"error": "Invalid voucher data", "details": serializer.errors},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            traveler = traveler_serializer.save()
-
-            # 2. Update voucher data
-            request_data = request.data.copy()
-            request_data['traveler_id'] = traveler.id
-            
-            # Update service voucher
-            voucher_serializer = self.get_serializer(instance, data=request_data, partial=True)
-            if not voucher_serializer.is_valid():
-                logger.error("Invalid voucher data in update: %s", voucher_serializer.errors)
+
+            validated = time.perf_counter()
+            try:
+                serializer.save()
+            except Exception as e:
+                transaction.set_rollback(True)
+                logger.exception("Error updating service voucher", extra={
+                    'event': 'service_voucher.update_failed', 'voucher_id': instance.id,
+                })
                 return Response(
-                    {"error": "Invalid voucher data", "details": voucher_serializer.errors},
+                    {"error": "Failed to update service voucher", "details": str(e)},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            voucher = voucher_serializer.save()
-
-            # 3. Update room allocations
-            if 'room_allocations' in request_data:
-                # Delete existing room allocations
-                instance.room_allocations.all().delete()
-                
-                # Create new room allocations
-                room_allocations = request_data.get('room_allocations', [])
-                for room_data in room_allocations:
-                    room_data['service_voucher'] = voucher.id
-                    room_serializer = RoomAllocationSerializer(data=room_data)
-                    if not room_serializer.is_valid():
-                        logger.error("Invalid room allocation data in update: %s", room_serializer.errors)
-                        return Response(
-                            {"error": "Invalid room allocation data", "details": room_serializer.errors},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    room_serializer.save()
-
-            # 4. Update itinerary items and activities
-            if 'itinerary_items' in request_data:
-                # Delete existing itinerary items (this will cascade delete activities)
-                instance.itinerary_items.all().delete()
-                
-                # Create new itinerary items and activities
-                itinerary_items = request_data.get('itinerary_items', [])
-                for item_data in itinerary_items:
-                    item_data['service_voucher'] = voucher.id
-                    activities = item_data.pop('activities', [])
-                    
-                    itinerary_serializer = ItinerarySerializer(data=item_data)
-                    if not itinerary_serializer.is_valid():
-                        logger.error("Invalid itinerary data in update: %s", itinerary_serializer.errors)
-                        return Response(
-                            {"error": "Invalid itinerary data", "details": itinerary_serializer.errors},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    itinerary = itinerary_serializer.save()
-                    
-                    # Create activities for this itinerary item
-                    for activity_data in activities:
-                        activity_data['itinerary'] = itinerary.id
-                        activity_serializer = ItineraryActivitySerializer(data=activity_data)
-                        if not activity_serializer.is_valid():
-                            logger.error("Invalid activity data in update: %s", activity_serializer.errors)
-                            return Response(
-                                {"error": "Invalid activity data", "details": activity_serializer.errors},
-                                status=status.HTTP_400_BAD_REQUEST
-                            )
-                        activity_serializer.save()
-
-            logger.info("Successfully updated service voucher ID: %s", voucher.id)
-            return Response(voucher_serializer.data)
 
+        logger.info("Updated service voucher %s", instance.id, extra={
+            'event': 'service_voucher.updated', 'voucher_id': instance.id,
+            'changes': serializer.update_plan.changes, **_timings(started, validated),
+        })
+        # The instance was loaded with its nested rows prefetched, so re-read
+        # it to serialize what was just written.
+        voucher = self.get_queryset().get(pk=instance.pk)
+        data = self.get_serializer(voucher).data
+        data['changes'] = serializer.update_plan.changes
+        return Response(data)
+
+    def create(self, request, *args, **kwargs):
+        """
+        Create a service voucher with its traveler, room allocations and itinerary.
+
+        The whole nested payload is validated before anything is written, so
+        every error comes back in one response; the nested rows are then
+        inserted with one bulk INSERT per table.
+        """
+        started = time.perf_counter()
+        serializer = ServiceVoucherWriteSerializer(data=request.data)
+        if not serializer.is_valid():
+            logger.error("Invalid voucher data", extra={
+                'event': 'service_voucher.invalid', 'errors': serializer.errors,
+            })
+            return Response(
+                {"error": "Invalid voucher data", "details": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        validated = time.perf_counter()
+        try:
+            with transaction.atomic():
+                voucher = serializer.save()
         except Exception as e:
-            logger.exception("Error updating service voucher: %s", str(e))
+            logger.exception("Error creating service voucher", extra={'event': 'service_voucher.create_failed'})
             return Response(
-                {"error": "Failed to update service voucher", "details": str(e)},
+                {"error": "Failed to create service voucher", "details": str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-    @transaction.atomic
-    def create(self, request, *args, **kwargs):
-        """Create a service voucher with related data."""
-        logger.info("Creating new service voucher with data: %s", request.data)
-        
+        logger.info("Created service voucher %s", voucher.id, extra={
+            'event': 'service_voucher.created', 'voucher_id': voucher.id,
+            'reservation_number': voucher.reservation_number, **_timings(started, validated),
+        })
+        voucher = self.get_queryset().get(pk=voucher.pk)
+        return Response(self.get_serializer(voucher).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, PDFRenderer])
+    def pdf(self, request, pk=None):
+        """Download the voucher as a vector PDF."""
+        voucher = self.get_object()
+        return pdf_response(
+            request, 'service-voucher', self.get_serializer(voucher).data,
+            f'service-voucher-{voucher.reservation_number}.pdf',
+        )
+
+    @action(detail=False, methods=['get'], renderer_classes=EXPORT_RENDERERS)
+    def export(self, request):
+        """Stream all vouchers with travel_start_date in range as CSV or NDJSON."""
+        return export_response(request, 'service-vouchers')
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_file(self, request):
+        """
+        Bulk import vouchers from an uploaded CSV or NDJSON ``file``.
+
+        Optional query parameters: ``import_format`` (csv or ndjson, otherwise
+        taken from the file name) and ``chunk_size`` (at most
+        IMPORT_MAX_CHUNK_SIZE). Valid rows are created
+        even when others fail. Rows are read and written a chunk at a time
+        and only the counts and the failed rows (the first
+        IMPORT_REPORTED_FAILURES of them) are kept, so memory stays flat
+        however large the file.
+
+        For large files use ``background=true``: the file is imported by a
+        job and the response is the job (``202``); its result holds the
+        counts and a download of the per-row results.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {"error": "A 'file' upload is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        fmt = request.query_params.get('import_format') or detect_format(upload.name)
+        if fmt not in FORMATS:
+            return Response(
+                {"error": f"import_format must be one of: {', '.join(FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         try:
-            # 1. Create or get traveler
-            traveler_data = request.data.get('traveler')
-            if not traveler_data:
-                logger.error("No traveler data provided")
-                return Response(
-                    {"error": "Traveler data is required"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            chunk_size = int(request.query_params.get('chunk_size', DEFAULT_CHUNK_SIZE))
+        except ValueError:
+            chunk_size = 0
+        if not 1 <= chunk_size <= settings.IMPORT_MAX_CHUNK_SIZE:
+            return Response(
+                {"error": f"chunk_size must be an integer from 1 to {settings.IMPORT_MAX_CHUNK_SIZE}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            # First create/update the traveler
-            traveler_serializer = TravelerSerializer(data=traveler_data)
-            if not traveler_serializer.is_valid():
-                logger.error("Invalid traveler data: %s", traveler_serializer.errors)
-                return Response(
-                    {"error": "Invalid traveler data", "details": traveler_serializer.errors},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            traveler = traveler_serializer.save()
-
-            # 2. Prepare voucher data with traveler_id
-            request_data = request.data.copy()  # Make a mutable copy
-            request_data['traveler_id'] = traveler.id  # Add traveler_id
-            
-            # Create service voucher using the serializer
-            voucher_serializer = self.get_serializer(data=request_data)
-            if not voucher_serializer.is_valid():
-                logger.error("Invalid voucher data: %s", voucher_serializer.errors)
-                return Response(
-                    {"error": "Invalid voucher data", "details": voucher_serializer.errors},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            voucher = voucher_serializer.save()
-
-            # 3. Create room allocations
-            room_allocations = request.data.get('room_allocations', [])
-            for room_data in room_allocations:
-                room_allocation_data = room_data.copy()  # Create a copy to avoid modifying original
-                room_allocation_data['service_voucher'] = voucher.id  # Use service_voucher instead of service_voucher_id
-                room_serializer = RoomAllocationSerializer(data=room_allocation_data)
-                if not room_serializer.is_valid():
-                    logger.error("Invalid room allocation data: %s", room_serializer.errors)
-                    return Response(
-                        {"error": "Invalid room allocation data", "details": room_serializer.errors},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                room_serializer.save()
-
-            # 4. Create itinerary items and activities
-            itinerary_items = request.data.get('itinerary_items', [])
-            for item_data in itinerary_items:
-                itinerary_data = item_data.copy()  # Create a copy
-                itinerary_data['service_voucher'] = voucher.id  # Use service_voucher_id
-                activities = itinerary_data.pop('activities', [])
-                
-                itinerary_serializer = ItinerarySerializer(data=itinerary_data)
-                if not itinerary_serializer.is_valid():
-                    logger.error("Invalid itinerary data: %s", itinerary_serializer.errors)
-                    return Response(
-                        {"error": "Invalid itinerary data", "details": itinerary_serializer.errors},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                itinerary = itinerary_serializer.save()
-                
-                # Create activities for this itinerary item
-                for activity_data in activities:
-                    activity_data['itinerary'] = itinerary.id
-                    activity_serializer = ItineraryActivitySerializer(data=activity_data)
-                    if not activity_serializer.is_valid():
-                        logger.error("Invalid activity data: %s", activity_serializer.errors)
-                        return Response(
-                            {"error": "Invalid activity data", "details": activity_serializer.errors},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    activity_serializer.save()
-
-            logger.info("Successfully created service voucher with ID: %s", voucher.id)
-            return Response(voucher_serializer.data, status=status.HTTP_201_CREATED)
+        if wants_background(request):
+            directory = jobs.files_dir()
+            directory.mkdir(parents=True, exist_ok=True)
+            fd, path = tempfile.mkstemp(dir=directory, prefix='upload-', suffix=f'.{fmt}')
+            with os.fdopen(fd, 'wb') as saved:
+                for chunk in upload.chunks():
+                    saved.write(chunk)
+            params = {'path': path, 'fmt': fmt, 'chunk_size': chunk_size, 'name': upload.name}
+            return job_accepted(request, jobs.enqueue('import', params, user=request.user))
 
-        except Exception as e:
-            logger.exception("Error creating service voucher: %s", str(e))
+        created = failed = 0
+        failures = []
+        for result in import_vouchers(read_rows(text_stream(upload.file), fmt), chunk_size):
+            if result['status'] == 'created':
+                created += 1
+                continue
+            failed += 1
+            if len(failures) < IMPORT_REPORTED_FAILURES:
+                failures.append(result)
+        logger.info("Imported %s service vouchers from %s (%s failed)", created, upload.name, failed)
+        return Response({'created': created, 'failed': failed, 'failures': failures})
+
+    @action(detail=False, methods=['post'], url_path='pdf-batch')
+    def pdf_batch(self, request):
+        """
+        Queue a job rendering the vouchers listed in ``ids`` as PDFs, zipped
+        together (at most JOB_PDF_BATCH_MAX per job). Returns the job (``202``).
+        """
+        field = serializers.ListField(
+            child=serializers.IntegerField(min_value=1), min_length=1, max_length=settings.JOB_PDF_BATCH_MAX,
+        )
+        try:
+            ids = field.run_validation(request.data.get('ids') if isinstance(request.data, dict) else None)
+        except serializers.ValidationError as exc:
             return Response(
-                {"error": "Failed to create service voucher", "details": str(e)},
+                {"error": "ids must be a list of service voucher ids", "details": exc.detail},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        return job_accepted(request, jobs.enqueue('pdf-batch', {'ids': ids}, user=request.user))
 
-class HotelVoucherViewSet(viewsets.ModelViewSet):
+class HotelVoucherViewSet(ReaderListMixin, SparseFieldsViewMixin, KeysetPaginationMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing hotel vouchers.
+
+    List and detail accept ``?fields=``.
     """
     queryset = HotelVoucher.objects.all().order_by('-id')
     serializer_class = HotelVoucherSerializer
+    reader = HotelVoucherReader()
     ordering = ['-id']
+    filter_backends = [IndexedFilterBackend, StableOrderingFilter]
+    filter_fields = {
+        'check_in_date': 'date',
+        'check_out_date': 'date',
+        'hotel_name': 'exact',
+    }
+    ordering_fields = ['id', 'check_in_date', 'check_out_date', 'hotel_name']
+
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, PDFRenderer])
+    def pdf(self, request, pk=None):
+        """Download the hotel voucher as a vector PDF."""
+        voucher = self.get_object()
+        return pdf_response(
+            request, 'hotel-voucher', self.get_serializer(voucher).data,
+            f'hotel-voucher-{voucher.confirmation_number}.pdf',
+        )
+
+    @action(detail=False, methods=['get'], renderer_classes=EXPORT_RENDERERS)
+    def export(self, request):
+        """Stream all hotel vouchers with check_in_date in range as CSV or NDJSON."""
+        return export_response(request, 'hotel-vouchers')
 
-class ItineraryViewSet(viewsets.ModelViewSet):
+class ItineraryViewSet(ReaderListMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing itinerary items.
+
+    List and detail accept ``?fields=`` and ``?expand=``; activities are only
+    fetched when they are rendered.
     """
     queryset = Itinerary.objects.all().prefetch_related('activities')
     serializer_class = ItinerarySerializer
+    reader = ItineraryReader()
+
+    def get_queryset(self):
+        selection = self.field_selection
+        if selection.expands('activities'):
+            return Itinerary.objects.prefetch_related('activities')
+        if selection.includes('activities'):
+            return Itinerary.objects.prefetch_related(
+                Prefetch('activities', queryset=ItineraryActivity.objects.only('id', 'itinerary'))
+            )
+        return Itinerary.objects.all()
+
+    @action(detail=False, methods=['get'], renderer_classes=EXPORT_RENDERERS)
+    def export(self, request):
+        """Stream one row per activity for itinerary days dated in range, as CSV or NDJSON."""
+        return export_response(request, 'itinerary')
 
-class ItineraryActivityViewSet(viewsets.ModelViewSet):
+class ItineraryActivityViewSet(ReaderListMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing itinerary activities.
     """
     queryset = ItineraryActivity.objects.all()
     serializer_class = ItineraryActivitySerializer
+    reader = ItineraryActivityReader()
+
+class DashboardStatsViewSet(viewsets.ViewSet):
+    """
+    Dashboard figures aggregated over all vouchers.
+
+    ``days`` (default 7, at most 90) sets the upcoming arrivals/departures
+    window starting today. Results are cached for DASHBOARD_STATS_CACHE_TTL
+    seconds and refreshed as soon as vouchers change.
+    """
+
+    def list(self, request):
+        try:
+            days = int(request.query_params.get('days', stats.DEFAULT_DAYS))
+        except ValueError:
+            days = 0
+        if not 1 <= days <= stats.MAX_DAYS:
+            return Response(
+                {"error": f"days must be between 1 and {stats.MAX_DAYS}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(stats.dashboard_stats(days))
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """
+    Ranked substring search over service vouchers (reservation and hotel
+    confirmation numbers, guest name, hotel) and hotel vouchers.
+
+    ``q`` needs at least one word of three or more characters; every such
+    word must match. ``kind`` (service-voucher or hotel-voucher) restricts
+    the results and ``limit`` (default 20, at most 100) caps them.
+    """
+
+    def list(self, request):
+        query = request.query_params.get('q', '')
+        if not search.terms(query):
+            return Response(
+                {"error": f"q must contain a word of at least {search.MIN_TERM_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        kind = request.query_params.get('kind') or None
+        if kind and kind not in search.KINDS:
+            return Response(
+                {"error": f"kind must be one of: {', '.join(search.KINDS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', search.DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= search.MAX_LIMIT:
+            return Response(
+                {"error": f"limit must be between 1 and {search.MAX_LIMIT}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({"query": query, "results": search.search(query, kind, limit)})
+
+
+class ManifestViewSet(viewsets.ViewSet):
+    """
+    Daily operations manifest: every itinerary activity on ``date``
+    (YYYY-MM-DD, default today) across all vouchers, with the voucher's
+    hotel, meeting point, transfer and traveler pax, grouped by activity
+    type and time. ``export`` serves the same as CSV (default) or PDF
+    (``export_format=pdf``).
+    """
+
+    def _date(self, request):
+        value = request.query_params.get('date')
+        if not value:
+            return timezone.localdate()
+        try:
+            return parse_date(value)
+        except ValueError:
+            return None
+
+    def list(self, request):
+        day = self._date(request)
+        if day is None:
+            return Response(
+                {"error": "date must be a date in YYYY-MM-DD format"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(manifest.build(day))
+
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer, CSVRenderer, PDFRenderer])
+    def export(self, request):
+        day = self._date(request)
+        if day is None:
+            return Response(
+                {"error": "date must be a date in YYYY-MM-DD format"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        fmt = request.query_params.get('export_format', 'csv')
+        if fmt == 'pdf':
+            return pdf_response(request, 'manifest', manifest.build(day), f'manifest-{day.isoformat()}.pdf')
+        if fmt != 'csv':
+            return Response(
+                {"error": "export_format must be one of: csv, pdf"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        response = StreamingHttpResponse(
+            exporters.buffered(exporters.encode_csv(manifest.activities(day), manifest.CSV_COLUMNS)),
+            content_type=exporters.CONTENT_TYPES['csv'],
+        )
+        response['Content-Disposition'] = f'attachment; filename="manifest-{day.isoformat()}.csv"'
+        return response
+
+
+class TransferRunViewSet(viewsets.ViewSet):
+    """
+    Vehicle run sheets for the TRANSFER activities dated ``start``..``end``
+    (YYYY-MM-DD, default today; at most 31 days). PRIVATE transfers get a
+    vehicle each; SHARED and GROUP pickups at the same pickup point are
+    batched into runs starting within ``window`` minutes (default 30) and
+    holding at most ``capacity`` pax (default per transfer type). See
+    ``operations.transfers``. ``export`` serves the run sheets as CSV
+    (default) or PDF (``export_format=pdf``).
+    """
+
+    def _sheets(self, request):
+        """``(run_sheets, None)`` for the request's parameters, or ``(None, error response)``."""
+        params = request.query_params
+        bounds, error = date_range_params(params, transfers.MAX_DAYS, 'days')
+        if error:
+            return None, error
+        limits = {
+            'window': (transfers.DEFAULT_WINDOW, transfers.MAX_WINDOW),
+            'capacity': (None, transfers.MAX_CAPACITY),
+        }
+        values = {}
+        for param, (default, maximum) in limits.items():
+            try:
+                values[param] = int(params[param]) if params.get(param) else default
+            except ValueError:
+                values[param] = 0
+            if values[param] is not None and not 1 <= values[param] <= maximum:
+                return None, Response(
+                    {"error": f"{param} must be between 1 and {maximum}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        return transfers.run_sheets(bounds['start'], bounds['end'], **values), None
+
+    def list(self, request):
+        sheets, error = self._sheets(request)
+        return error or Response(sheets)
+
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer, CSVRenderer, PDFRenderer])
+    def export(self, request):
+        fmt = request.query_params.get('export_format', 'csv')
+        if fmt not in ('csv', 'pdf'):
+            return Response(
+                {"error": "export_format must be one of: csv, pdf"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        sheets, error = self._sheets(request)
+        if error:
+            return error
+        filename = f"transfer-runs-{sheets['start']}-{sheets['end']}"
+        if fmt == 'pdf':
+            return pdf_response(request, 'transfer-runs', sheets, f'{filename}.pdf')
+        response = StreamingHttpResponse(
+            exporters.buffered(exporters.encode_csv(transfers.csv_records(sheets), transfers.CSV_COLUMNS)),
+            content_type=exporters.CONTENT_TYPES['csv'],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+        return response
+
+
+class OccupancyViewSet(viewsets.ViewSet):
+    """
+    Rooms held by service vouchers per hotel and night, by room type, for
+    the nights ``start``..``end`` (YYYY-MM-DD, default today; at most 366
+    nights). ``hotel_name`` and ``room_type`` (comma-separated) narrow the
+    result. Served from the incrementally maintained occupancy table (see
+    ``operations.occupancy``).
+    """
+
+    def list(self, request):
+        params = request.query_params
+        bounds, error = date_range_params(params, occupancy.MAX_DAYS, 'nights')
+        if error:
+            return error
+        room_type = params.get('room_type')
+        valid = {code for code, _ in RoomAllocation.ROOM_TYPES}
+        if room_type and not set(room_type.split(',')) <= valid:
+            return Response(
+                {"error": f"room_type must be one of: {', '.join(sorted(valid))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({
+            'start': bounds['start'],
+            'end': bounds['end'],
+            'hotels': occupancy.occupancy(bounds['start'], bounds['end'], params.get('hotel_name'), room_type),
+        })
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Background jobs (see ``operations.jobs``): status, progress and result.
+
+    Users see the jobs they started; administrators see every job.
+    ``?status=`` filters by status (comma-separated).
+    """
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        queryset = Job.objects.order_by('-id')
+        user = self.request.user
+        if not (user.is_staff or getattr(user, 'role', None) == 'ADMIN'):
+            queryset = queryset.filter(created_by=user)
+        statuses = self.request.query_params.get('status')
+        if statuses:
+            queryset = queryset.filter(status__in=statuses.upper().split(','))
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel a queued or running job; a running one stops at its next progress report."""
+        job = self.get_object()
+        cancelled = Job.objects.filter(pk=job.pk, status__in=[Job.QUEUED, Job.RUNNING]).update(
+            status=Job.CANCELLED, finished_at=timezone.now(),
+        )
+        if not cancelled:
+            return Response(
+                {"error": f"Job is already {job.get_status_display().lower()}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
+    @action(detail=True, methods=['get'], renderer_classes=EXPORT_RENDERERS + [ZipRenderer])
+    def download(self, request, pk=None):
+        """Download the file a succeeded job produced."""
+        job = self.get_object()
+        name = (job.result or {}).get('file') if job.status == Job.SUCCEEDED else None
+        path = jobs.files_dir() / name if name else None
+        if path is None or not path.is_file():
+            return Response({"error": "This job has no file to download"}, status=status.HTTP_404_NOT_FOUND)
+        filename = name.split('-', 1)[1]
+        return FileResponse(
+            open(path, 'rb'), as_attachment=True, filename=filename,
+            content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        )
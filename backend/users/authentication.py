@@ -0,0 +1,66 @@
+"""
+JWT authentication with the token's user cached.
+
+simplejwt loads the user from the database on every request. Here the
+loaded ``User`` (role and department included) is kept in the default
+cache for ``AUTH_USER_CACHE_TTL`` seconds, so a page that makes several
+API calls looks its user up once. ``signals`` drops the entry whenever the
+user is saved or deleted, deactivation and password changes included. The
+cache is per process unless a shared backend is configured; other workers
+then catch up within the TTL. ``QuerySet.update()`` on users bypasses the
+signals, like everywhere else. A TTL of 0 turns the cache off.
+
+Tokens revoked by logout (``users.revocation``) are rejected.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from core.instrumentation import timed
+
+from . import revocation
+
+
+def user_cache_key(user_id):
+    return f'users:user:{user_id}'
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """
+    simplejwt's ``JWTAuthentication``, with the user cached, revoked tokens
+    rejected and the work timed as the ``auth`` phase.
+    """
+
+    def authenticate(self, request):
+        with timed('auth'):
+            return super().authenticate(request)
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if revocation.is_revoked(token):
+            raise InvalidToken(_("Token has been revoked"))
+        return token
+
+    def get_user(self, validated_token):
+        ttl = getattr(settings, 'AUTH_USER_CACHE_TTL', 0)
+        if not ttl:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # Only active users get this far; inactive ones raise.
+            user = super().get_user(validated_token)
+            cache.set(key, user, ttl)
+        elif api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
@@ -21,3 +21,16 @@ class User(AbstractUser):
         
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
+
+
+class RevokedToken(models.Model):
+    """A JWT revoked before its expiry (see ``users.revocation``); pruned once it expires."""
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'revoked_tokens'
+
+    def __str__(self):
+        return self.jti
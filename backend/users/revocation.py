@@ -0,0 +1,128 @@
+"""
+Revoked JWTs, by ``jti``: logged-out tokens and rotated refresh tokens.
+
+``get_store()`` returns the store named by ``TOKEN_REVOCATION_STORE``. The
+default, ``DatabaseRevocationStore``, records revocations in the
+``RevokedToken`` table, which every process reads. Each process also keeps
+an in-memory prefilter: a dict from a 64-bit hash of each revoked ``jti`` to
+its expiry. A check is one dict lookup. The prefilter is brought up to date
+at most every ``TOKEN_REVOCATION_SYNC_SECONDS`` by reading the rows revoked
+since the last sync, so another process's revocation takes effect within
+that time. The revoking process sees its own at once. A revoked token only
+matters until it expires. Expired entries are dropped from the prefilter,
+and deleted from the table, every ``TOKEN_REVOCATION_PRUNE_SECONDS``. Memory
+and table size therefore follow the number of revoked tokens still live,
+not the number ever revoked.
+
+A store implements ``revoke(jti, expires_at)`` (True if newly revoked,
+False if it already was) and ``is_revoked(jti)``.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+# Rows are re-read this far back on each sync, so one whose transaction
+# committed after a later one's is still picked up.
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def _key(jti):
+    return int.from_bytes(hashlib.blake2b(jti.encode(), digest_size=8).digest(), 'big')
+
+
+class RevocationStore:
+    def revoke(self, jti, expires_at):
+        raise NotImplementedError
+
+    def is_revoked(self, jti):
+        raise NotImplementedError
+
+
+class DatabaseRevocationStore(RevocationStore):
+    def __init__(self, sync_seconds=1.0, prune_seconds=300):
+        self.sync_seconds = sync_seconds
+        self.prune_seconds = prune_seconds
+        self._lock = threading.Lock()
+        self._revoked = {}  # hash of jti -> expiry (POSIX timestamp)
+        self._synced_at = None  # database time of the last sync
+        self._next_sync = 0.0
+        self._next_prune = time.monotonic() + prune_seconds
+
+    def revoke(self, jti, expires_at):
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        with self._lock:
+            self._revoked[_key(jti)] = expires_at.timestamp()
+        self._maintain()
+        return True
+
+    def is_revoked(self, jti):
+        self._maintain()
+        return _key(jti) in self._revoked
+
+    def _maintain(self):
+        now = time.monotonic()
+        if now >= self._next_sync:
+            self.sync()
+        if now >= self._next_prune:
+            self.prune()
+
+    def sync(self):
+        """Add the tokens revoked (by any process) since the last sync."""
+        started = timezone.now()
+        with self._lock:
+            self._next_sync = time.monotonic() + self.sync_seconds
+            rows = RevokedToken.objects.filter(expires_at__gt=started)
+            if self._synced_at is not None:
+                rows = rows.filter(revoked_at__gte=self._synced_at - SYNC_OVERLAP)
+            for jti, expires_at in rows.values_list('jti', 'expires_at').iterator():
+                self._revoked[_key(jti)] = expires_at.timestamp()
+            self._synced_at = started
+
+    def prune(self):
+        """Forget expired tokens, here and in the table."""
+        with self._lock:
+            self._next_prune = time.monotonic() + self.prune_seconds
+            now = time.time()
+            self._revoked = {key: expiry for key, expiry in self._revoked.items() if expiry > now}
+        RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = import_string(getattr(
+                    settings, 'TOKEN_REVOCATION_STORE', 'users.revocation.DatabaseRevocationStore'))(
+                    sync_seconds=getattr(settings, 'TOKEN_REVOCATION_SYNC_SECONDS', 1.0),
+                    prune_seconds=getattr(settings, 'TOKEN_REVOCATION_PRUNE_SECONDS', 300),
+                )
+    return _store
+
+
+def revoke(token):
+    """Revoke a validated simplejwt ``token`` until it expires; False if it already was."""
+    expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    return get_store().revoke(token[api_settings.JTI_CLAIM], expires_at)
+
+
+def is_revoked(token):
+    jti = token.get(api_settings.JTI_CLAIM)
+    return jti is not None and get_store().is_revoked(jti)
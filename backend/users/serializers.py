@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from . import revocation
 
 User = get_user_model()
 
@@ -25,3 +29,27 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         data = super().validate(attrs)
         data['user'] = UserSerializer(self.user).data
         return data
+
+
+class RevokingTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    ``TokenRefreshSerializer`` checking the revocation store: a revoked
+    refresh token is refused, and with ``BLACKLIST_AFTER_ROTATION`` each one
+    is revoked as it is used, so it works exactly once.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if revocation.is_revoked(refresh):
+            raise InvalidToken('Token has been revoked')
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            # Revoking is the check that matters when two requests race with the same token.
+            if api_settings.BLACKLIST_AFTER_ROTATION and not revocation.revoke(refresh):
+                raise InvalidToken('Token has been revoked')
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
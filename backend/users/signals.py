@@ -0,0 +1,16 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import user_cache_key
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    key = user_cache_key(instance.pk)
+    cache.delete(key)
+    # Again once committed: a request may have cached the old row in between.
+    transaction.on_commit(lambda: cache.delete(key))
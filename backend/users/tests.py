@@ -1,3 +1,100 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from operations.testing import QueryBudgetTestCase
+
+from . import revocation
+from .models import RevokedToken
+from .revocation import DatabaseRevocationStore
+
+
+@override_settings(AUTH_USER_CACHE_TTL=30)
+class CachedJWTUserTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.url = reverse('job-list')
+        # Sync the revocation store now so its once-a-second query does not land in the counts.
+        revocation.get_store().sync()
+
+    def test_user_looked_up_once(self):
+        with self.assertMaxQueries(3) as first:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertMaxQueries(len(first) - 1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_saving_the_user_takes_effect_at_once(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.user.role = 'ADMIN'
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.client.get(self.url)
+        get_user_model().objects.filter(pk=self.user.pk).get().delete()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    @override_settings(AUTH_USER_CACHE_TTL=0)
+    def test_cache_can_be_turned_off(self):
+        self.client.get(self.url)
+        with self.assertMaxQueries(3) as queries:
+            self.client.get(self.url)
+        self.assertIn('"users"', queries.captured_queries[0]['sql'])
+
+
+class TokenRevocationTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def test_logout_revokes_refresh_and_access_tokens(self):
+        self.assertEqual(self.client.get(reverse('job-list')).status_code, 200)
+        response = self.client.post(reverse('users:logout'), {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 205)
+
+        self.assertEqual(self.client.get(reverse('job-list')).status_code, 401)
+        self.client.credentials()
+        response = self.client.post(reverse('users:token_refresh'), {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_logout_needs_a_valid_refresh_token(self):
+        self.assertEqual(self.client.post(reverse('users:logout'), {}).status_code, 400)
+        self.assertEqual(self.client.post(reverse('users:logout'), {'refresh': 'junk'}).status_code, 400)
+
+    def test_rotated_refresh_token_works_once(self):
+        self.client.credentials()
+        url = reverse('users:token_refresh')
+        response = self.client.post(url, {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post(url, {'refresh': str(self.refresh)}).status_code, 401)
+        self.assertEqual(self.client.post(url, {'refresh': response.data['refresh']}).status_code, 200)
+
+    def test_other_processes_revocations_picked_up_on_sync(self):
+        store = DatabaseRevocationStore(sync_seconds=3600)
+        self.assertFalse(store.is_revoked('elsewhere'))
+        DatabaseRevocationStore().revoke('elsewhere', timezone.now() + timedelta(hours=1))
+        self.assertFalse(store.is_revoked('elsewhere'))
+        store.sync()
+        self.assertTrue(store.is_revoked('elsewhere'))
+
+    def test_expired_tokens_pruned(self):
+        store = DatabaseRevocationStore()
+        self.assertTrue(store.revoke('live', timezone.now() + timedelta(hours=1)))
+        self.assertFalse(store.revoke('live', timezone.now() + timedelta(hours=1)))
+        store.revoke('expired', timezone.now() - timedelta(seconds=1))
+        store.prune()
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['live'])
+        self.assertEqual(len(store._revoked), 1)
+        self.assertTrue(store.is_revoked('live'))
@@ -1,12 +1,11 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
 from . import views
 
 app_name = 'users'
 
 urlpatterns = [
     path('login/', views.CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', views.RevokingTokenRefreshView.as_view(), name='token_refresh'),
     path('register/', views.register_user, name='register'),
     path('logout/', views.logout, name='logout'),
 ]
@@ -3,16 +3,21 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
-from .serializers import UserSerializer, CustomTokenObtainPairSerializer
+from . import revocation
+from .serializers import UserSerializer, CustomTokenObtainPairSerializer, RevokingTokenRefreshSerializer
 
 User = get_user_model()
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
+class RevokingTokenRefreshView(TokenRefreshView):
+    serializer_class = RevokingTokenRefreshSerializer
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_user(request):
@@ -30,9 +35,12 @@ def register_user(request):
 @api_view(['POST'])
 def logout(request):
     try:
-        refresh_token = request.data["refresh"]
-        token = RefreshToken(refresh_token)
-        token.blacklist()
-        return Response(status=status.HTTP_205_RESET_CONTENT)
-    except Exception:
+        token = RefreshToken(request.data["refresh"])
+    except (KeyError, TokenError):
         return Response(status=status.HTTP_400_BAD_REQUEST)
+    # Revoke the access token of this request too, so it stops working now
+    # rather than when it expires.
+    revocation.revoke(token)
+    if request.auth is not None:
+        revocation.revoke(request.auth)
+    return Response(status=status.HTTP_205_RESET_CONTENT)